@@ -0,0 +1,161 @@
+"""
+Admission control for upstream AI calls
+Bounds the number of concurrent upstream calls per provider and queues the
+rest in FIFO order. A request that cannot start before its deadline is shed
+so workers are not exhausted waiting on a slow upstream.
+Threads and asyncio tasks share the same slots and queue.
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed; maps to a fast 503"""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ('event', 'deadline', 'granted', 'loop')
+
+    def __init__(self, deadline, loop=None):
+        self.loop = loop  # Set for asyncio waiters
+        self.event = asyncio.Event() if loop else threading.Event()
+        self.deadline = deadline
+        self.granted = False
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self.event.set)
+
+
+class AdmissionController:
+    def __init__(self, name, max_concurrent, max_queue):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiters = deque()
+        self._wait_ms = deque(maxlen=1000)  # Recent queue wait times
+        self._counters = {'admitted': 0, 'shed_queue_full': 0, 'shed_deadline': 0, 'max_queue_depth': 0}
+
+    def check_capacity(self):
+        """Shed immediately, before any other work, when the queue is already full"""
+        with self._lock:
+            if self._active >= self.max_concurrent and len(self._waiters) >= self.max_queue:
+                self._counters['shed_queue_full'] += 1
+                raise AdmissionRejected(f"{self.name} is overloaded, please retry shortly")
+
+    def acquire(self, deadline):
+        """Wait for a slot until `deadline` (time.monotonic()); raise AdmissionRejected if none frees up"""
+        started = time.monotonic()
+        waiter = self._enqueue(deadline, started)
+        if waiter is None:
+            return
+        waiter.event.wait(max(0.0, deadline - time.monotonic()))
+        self._settle(waiter, started)
+
+    async def acquire_async(self, deadline):
+        """Like acquire(), but waits without blocking the event loop"""
+        started = time.monotonic()
+        waiter = self._enqueue(deadline, started, asyncio.get_running_loop())
+        if waiter is None:
+            return
+        try:
+            await asyncio.wait_for(waiter.event.wait(), max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+        self._settle(waiter, started)
+
+    def _enqueue(self, deadline, started, loop=None):
+        """Take a free slot (returns None) or queue a waiter for one"""
+        with self._lock:
+            if self._active < self.max_concurrent and not self._waiters:
+                self._active += 1
+                self._admitted(started)
+                return None
+            if len(self._waiters) >= self.max_queue:
+                self._counters['shed_queue_full'] += 1
+                raise AdmissionRejected(f"{self.name} is overloaded, please retry shortly")
+            if deadline <= started:
+                self._counters['shed_deadline'] += 1
+                raise AdmissionRejected(f"{self.name} is busy and the request deadline has passed")
+            waiter = _Waiter(deadline, loop)
+            self._waiters.append(waiter)
+            self._counters['max_queue_depth'] = max(self._counters['max_queue_depth'], len(self._waiters))
+            return waiter
+
+    def _settle(self, waiter, started):
+        """Keep a granted slot, or leave the queue and shed"""
+        with self._lock:
+            if waiter.granted:
+                self._admitted(started)
+                return
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                pass
+            self._counters['shed_deadline'] += 1
+        raise AdmissionRejected(f"{self.name} is busy; request could not start before its deadline")
+
+    def _abandon(self, waiter):
+        """Leave the queue of a cancelled task, passing on a slot already handed to it"""
+        with self._lock:
+            if not waiter.granted:
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+                return
+        self.release()
+
+    def release(self):
+        with self._lock:
+            now = time.monotonic()
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if waiter.deadline > now:
+                    # Hand the slot straight to the next waiter
+                    waiter.granted = True
+                    waiter.wake()
+                    return
+                waiter.wake()  # Expired; it will shed itself
+            self._active -= 1
+
+    @contextmanager
+    def slot(self, deadline):
+        self.acquire(deadline)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def _admitted(self, started):
+        self._counters['admitted'] += 1
+        self._wait_ms.append((time.monotonic() - started) * 1000)
+
+    def stats(self):
+        with self._lock:
+            waits = sorted(self._wait_ms)
+            data = {
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'active': self._active,
+                'queue_depth': len(self._waiters),
+                'wait_ms_avg': round(sum(waits) / len(waits), 1) if waits else 0.0,
+                'wait_ms_p95': round(waits[int(len(waits) * 0.95) - 1], 1) if waits else 0.0,
+            }
+            data.update(self._counters)
+            return data
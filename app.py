@@ -1,17 +1,36 @@
 import os
+import asyncio
 import requests
 import json
 import time
 import threading
 import uuid
-from flask import Flask, render_template, request, jsonify, session
+import hashlib
+from flask import Flask, render_template, request, jsonify, session, g, Response, stream_with_context
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 import pytz
 from dotenv import load_dotenv
+from sqlalchemy import func, select
 from config import *
-from models import db, ChatSession, ChatMessage, UserPreference
+from models import (
+    db, ChatSession, ChatMessage, ArchivedSession, UserPreference, InflightRequest, RateLimitBucket, DocumentEmbedding,
+    ChangeCounter, SESSIONS_REMOVED, bump_change_counter, create_missing_indexes, add_missing_columns
+)
 from training_routes import training_bp
-from training_system import TrainingDataManager, SimpleRAGSystem
+from training_system import TrainingDataManager, SimpleRAGSystem, ExampleMatcher, TrainingExample
+from request_timing import start_timer, stop_timer, span, log_slow_request, StackSampler
+from singleflight import SingleFlight, DatabaseSingleFlight, SingleFlightTimeout, coalesce_key
+from rate_limiter import MemoryRateLimiter, DatabaseRateLimiter
+from admission import AdmissionController, AdmissionRejected
+from deadline import request_deadline, current_deadline
+from jobs import JobRunner
+from retrieval_cache import VersionedLRUCache
+from dataset_snapshot import load_snapshot
+from history_search import install_search_index, search_sessions, SearchIndexMissing
+from embeddings import HashedEmbedder, EmbeddingStore
+from retention import restore_session
+from database import engine_options, tune_sqlite, ReadRouter
 import random
 
 # Load environment variables from .env file
@@ -23,33 +42,126 @@ app.secret_key = os.environ.get('SECRET_KEY') or os.urandom(24).hex()
 # Database configuration - Use PostgreSQL for production, SQLite for development
 database_url = os.environ.get('DATABASE_URL', 'sqlite:///chatbot.db')
 
+# Optional read replica for history reads (writes always go to DATABASE_URL)
+replica_url = os.environ.get('DATABASE_REPLICA_URL')
+
 # Handle PostgreSQL URL format for newer SQLAlchemy versions
 if database_url and database_url.startswith('postgres://'):
     database_url = database_url.replace('postgres://', 'postgresql://', 1)
+if replica_url and replica_url.startswith('postgres://'):
+    replica_url = replica_url.replace('postgres://', 'postgresql://', 1)
+
+def database_engine_options(url):
+    return engine_options(url, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_RECYCLE,
+                          DB_STATEMENT_TIMEOUT_MS, SQLITE_BUSY_TIMEOUT_MS)
 
 app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = database_engine_options(database_url)
+if replica_url:
+    app.config['SQLALCHEMY_BINDS'] = {'replica': dict(database_engine_options(replica_url), url=replica_url)}
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['ARCHIVE_AFTER_DAYS'] = ARCHIVE_AFTER_DAYS  # Defaults of archive_sessions jobs
+app.config['ARCHIVE_BATCH_SIZE'] = ARCHIVE_BATCH_SIZE
 
 # Initialize database
 db.init_app(app)
 
+with app.app_context():
+    for engine in db.engines.values():
+        tune_sqlite(engine, SQLITE_BUSY_TIMEOUT_MS)
+    # History reads go to the replica, if configured (see read_session)
+    read_router = ReadRouter(db.session, db.engines.get('replica'), DATABASE_REPLICA_STICKY_SECONDS)
+    if read_router.enabled:
+        print("✅ History reads routed to the read replica")
+
+# Long messages are stored compressed on SQLite (reads decode any stored form)
+ChatMessage.__table__.c.content.type.configure(MESSAGE_COMPRESSION, MESSAGE_COMPRESSION_MIN_BYTES,
+                                               MESSAGE_COMPRESSION_LEVEL)
+
 # Register training blueprint
 app.register_blueprint(training_bp)
 
 # Initialize training system
 training_manager = TrainingDataManager()
-rag_system = SimpleRAGSystem(training_manager)
+retrieval_cache = VersionedLRUCache(RETRIEVAL_CACHE_SIZE, RETRIEVAL_CACHE_MAX_BYTES) if RETRIEVAL_CACHE_SIZE > 0 else None
+rag_system = SimpleRAGSystem(training_manager, cache=retrieval_cache, retrieval_mode=RAG_RETRIEVAL_MODE,
+                             ann_lists=RAG_ANN_LISTS or None, ann_probes=RAG_ANN_PROBES or None,
+                             shard_probes=RAG_SHARD_PROBES, shard_threads=RAG_SHARD_THREADS)
+
+if DATASET_SNAPSHOT_PATH:
+    try:
+        dataset_snapshot = load_snapshot(DATASET_SNAPSHOT_PATH)
+        dataset_snapshot.seed(training_manager, rag_system)
+        print(f"✅ Seeded {dataset_snapshot.meta['examples']} examples and "
+              f"{dataset_snapshot.meta['documents']} documents from {DATASET_SNAPSHOT_PATH}")
+    except Exception as e:
+        print(f"⚠️ Could not load dataset snapshot {DATASET_SNAPSHOT_PATH}: {e}")
+
+if KNOWLEDGE_BASE_PATH:
+    try:
+        rag_system.load_index(KNOWLEDGE_BASE_PATH)
+        print(f"✅ Knowledge base loaded from {KNOWLEDGE_BASE_PATH} ({len(rag_system.documents)} documents)")
+    except Exception as e:
+        print(f"⚠️ Could not load knowledge base from {KNOWLEDGE_BASE_PATH}: {e}")
+
+# FAQ short-circuit: questions matching a training example are answered from it
+faq_matcher = ExampleMatcher(training_manager)
+faq_stats = {'lookups': 0, 'hits': 0}  # Every hit is an upstream call avoided
+faq_stats_lock = threading.Lock()
+
+def job_engine():
+    with app.app_context():
+        return db.engine
+
+# Knowledge-base builds, imports and exports run in background processes
+job_runner = JobRunner(job_engine, JOB_WORKERS, JOB_ARTIFACT_DIR, JOB_PROGRESS_INTERVAL, JOB_SYNC_INTERVAL)
+
+# Document embeddings, computed by embed_documents jobs and searched in memory
+embedding_store = EmbeddingStore(job_engine, DocumentEmbedding.__table__,
+                                 HashedEmbedder(EMBEDDING_DIMENSIONS), EMBEDDING_BATCH_SIZE)
+
+def apply_imported_examples(job):
+    with open(job.artifact_path, encoding='utf-8') as f:
+        training_manager.add_examples(TrainingExample(**item) for item in json.load(f))
+
+# Jobs submitted by another worker install their results there; this worker picks them up
+job_runner.publish('build_knowledge_base', lambda job: rag_system.load_index(job.artifact_path))
+job_runner.publish('embed_documents', lambda job: embedding_store.load())
+job_runner.publish('import_examples', apply_imported_examples, latest_only=False)
+
+# Shared with the training blueprint
+app.extensions['training_manager'] = training_manager
+app.extensions['rag_system'] = rag_system
+app.extensions['job_runner'] = job_runner
+app.extensions['embedding_store'] = embedding_store
 
 # Create tables - Only in development or when explicitly needed
 if not os.environ.get('DATABASE_URL') or os.environ.get('FLASK_ENV') == 'development':
     with app.app_context():
         try:
             db.create_all()
+            add_missing_columns(db.engine)
+            create_missing_indexes(db.engine)
+            if install_search_index(db.engine):
+                print("✅ Chat history search index created")
             print("✅ Database tables created successfully!")
         except Exception as e:
             print(f"⚠️ Database initialization error: {e}")
             # In production, this might be handled by a separate migration script
 
+try:
+    reaped = job_runner.reap_orphans()
+    if reaped:
+        print(f"🛠️ Marked {reaped} jobs of exited workers as failed")
+except Exception as e:
+    print(f"⚠️ Could not check for interrupted jobs: {e}")
+
+try:
+    if embedding_store.load():
+        print(f"✅ Loaded {len(embedding_store)} document embeddings")
+except Exception as e:
+    print(f"⚠️ Could not load document embeddings: {e}")
+
 # API Configuration based on provider
 API_PROVIDER = os.environ.get('API_PROVIDER', 'openrouter').lower()
 
@@ -70,6 +182,10 @@ else:
     API_URL = "https://api.openai.com/v1/chat/completions"
     AVAILABLE_MODELS_LIST = AVAILABLE_MODELS.get('openai', [])
 
+# Override the endpoint for any OpenAI-compatible server (e.g. benchmarks/mock_llm_server.py)
+if os.environ.get('API_URL'):
+    API_URL = os.environ['API_URL']
+
 # Security check
 if not API_KEY:
     print(f"⚠️  WARNING: {API_PROVIDER.upper()}_API_KEY not found in environment variables!")
@@ -77,6 +193,62 @@ if not API_KEY:
 elif API_KEY.startswith('your_'):
     print(f"⚠️  WARNING: Please replace the placeholder API key for {API_PROVIDER.upper()} in .env file")
 
+# Per-client rate limiting of chat requests; batches have their own budget, charged per prompt
+if RATE_LIMIT_BACKEND == 'database':
+    rate_limiter = DatabaseRateLimiter(lambda: db.engine, RateLimitBucket.__table__,
+                                       RATE_LIMIT_REQUESTS, RATE_LIMIT_WINDOW, MIN_REQUEST_INTERVAL)
+    batch_rate_limiter = DatabaseRateLimiter(lambda: db.engine, RateLimitBucket.__table__,
+                                             BATCH_RATE_LIMIT_PROMPTS, RATE_LIMIT_WINDOW)
+elif RATE_LIMIT_BACKEND == 'memory':
+    rate_limiter = MemoryRateLimiter(RATE_LIMIT_REQUESTS, RATE_LIMIT_WINDOW, MIN_REQUEST_INTERVAL)
+    batch_rate_limiter = MemoryRateLimiter(BATCH_RATE_LIMIT_PROMPTS, RATE_LIMIT_WINDOW)
+else:
+    rate_limiter = batch_rate_limiter = None
+
+# Coalesce identical in-flight upstream requests (optionally across workers)
+upstream_flight = SingleFlight(
+    DatabaseSingleFlight(lambda: db.engine, InflightRequest.__table__, lease=SINGLE_FLIGHT_TIMEOUT)
+    if SINGLE_FLIGHT_DATABASE else None
+)
+
+class ProviderBackoff:
+    """Provider-wide cooldown after a 429 so every concurrent caller backs off together"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._until = 0.0
+    
+    def trip(self, delay):
+        with self._lock:
+            self._until = max(self._until, time.monotonic() + delay)
+    
+    def remaining(self):
+        return max(0.0, self._until - time.monotonic())
+    
+    def wait(self):
+        remaining = self.remaining()
+        if remaining > 0:
+            with span('retry_wait'):
+                time.sleep(remaining)
+    
+    async def wait_async(self):
+        remaining = self.remaining()
+        if remaining > 0:
+            with span('retry_wait'):
+                await asyncio.sleep(remaining)
+
+provider_backoff = ProviderBackoff()
+
+# Admission control: bounded concurrent upstream calls with a deadline-aware queue
+upstream_admission = AdmissionController(
+    f"{API_PROVIDER} upstream",
+    UPSTREAM_MAX_CONCURRENT or ADMISSION_MAX_CONCURRENT.get(API_PROVIDER, 8),
+    ADMISSION_MAX_QUEUE
+)
+
+# Bounded concurrency for batch jobs, shared by all batches in this worker
+batch_slots = threading.BoundedSemaphore(BATCH_CONCURRENCY.get(API_PROVIDER, 4))
+
 class ChatBot:
     def __init__(self):
         # Remove in-memory storage as we're using database now
@@ -90,21 +262,125 @@ class ChatBot:
 Today is {now.strftime('%A, %B %d, %Y')}
 Current time: {now.strftime('%I:%M %p')} ({TIMEZONE})"""
     
-    def get_ai_response(self, message, session_id, model=None):
-        """Get response from AI API with retry logic and RAG enhancement"""
+    def get_ai_response(self, message, session_id, model=None, persist=True):
+        """Get response from AI API with retry logic and RAG enhancement
+        
+        With persist=False the exchange is answered without history and is not
+        stored as a chat session (used by batch jobs).
+        """
+        return self.get_ai_response_and_source(message, session_id, model, persist)[0]
+    
+    def get_ai_response_and_source(self, message, session_id, model=None, persist=True):
+        """Like get_ai_response, returning (response, model_used) where model_used is
+        the label stored with the answer (FAQ_MODEL_LABEL for curated answers)"""
+        # Curated answers need no upstream call (nor an API key or an upstream slot)
+        faq_answer = self._faq_exchange(message, session_id, persist)
+        if faq_answer is not None:
+            return faq_answer, FAQ_MODEL_LABEL
+        
+        requested_model = model or (AVAILABLE_MODELS_LIST[0] if AVAILABLE_MODELS_LIST else AI_MODEL)
         if not API_KEY:
-            return f"Error: {API_PROVIDER.upper()} API key not configured. Please set it in .env file."
+            return f"Error: {API_PROVIDER.upper()} API key not configured. Please set it in .env file.", requested_model
         
-        # Get or create chat session
-        chat_session = db.session.get(ChatSession, session_id)
-        if not chat_session:
-            chat_session = ChatSession(id=session_id, title=self._generate_title(message))
-            db.session.add(chat_session)
-            db.session.commit()
+        # Shed before touching the database when the upstream queue is already full
+        upstream_admission.check_capacity()
+        
+        # Every phase below spends from the request budget set by the caller (if any)
+        deadline = current_deadline()
+        admission_deadline = self._admission_deadline(deadline)
+        
+        prepared = self._prepare_exchange(message, session_id, model, persist)
+        if isinstance(prepared, str):
+            return prepared, requested_model
+        messages, model_name = prepared
         
-        # Get conversation history from database
-        messages_query = ChatMessage.query.filter_by(session_id=session_id).order_by(ChatMessage.timestamp).limit(MAX_CONVERSATION_HISTORY)
-        conversation_history = [{'role': msg.role, 'content': msg.content} for msg in messages_query]
+        # Identical concurrent requests share one upstream call. The system prompt
+        # carries the current time, so only the conversation is part of the key.
+        try:
+            ai_response, error = upstream_flight.do(
+                coalesce_key(model_name, messages[1:]),
+                lambda: self._admitted_post(messages, model_name, admission_deadline),
+                timeout=deadline.cap(SINGLE_FLIGHT_TIMEOUT) if deadline else SINGLE_FLIGHT_TIMEOUT
+            )
+        except SingleFlightTimeout:
+            return "Error: Request timed out after multiple attempts. Please try again.", model_name
+        except AdmissionRejected:
+            raise
+        except Exception as e:
+            return f"❌ **Unexpected Error**: {str(e)}", model_name
+        
+        if error:
+            return error, model_name
+        
+        if persist:
+            return self._store_exchange(session_id, message, ai_response, model_name) or ai_response, model_name
+        return ai_response, model_name
+    
+    def _admission_deadline(self, deadline):
+        """Latest time an upstream call may start"""
+        admission_deadline = time.monotonic() + ADMISSION_QUEUE_TIMEOUT
+        if deadline:
+            admission_deadline = min(admission_deadline, deadline.expires_at - UPSTREAM_MIN_ATTEMPT_TIMEOUT)
+        return admission_deadline
+    
+    def _faq_answer(self, message):
+        """Output of the training example matching the message closely enough, or None"""
+        if not FAQ_SHORT_CIRCUIT:
+            return None
+        with span('faq'):
+            example, score = faq_matcher.match(message)
+        hit = example is not None and score >= FAQ_MATCH_THRESHOLD
+        with faq_stats_lock:
+            faq_stats['lookups'] += 1
+            if hit:
+                faq_stats['hits'] += 1
+        return example.output_text if hit else None
+    
+    def _faq_exchange(self, message, session_id, persist):
+        """Answer from a training example and store the exchange; returns None if none matches
+        
+        Only a conversation's opening message is matched: a follow-up relies on earlier
+        turns that the example's canned answer knows nothing about.
+        """
+        if persist and self._has_history(session_id):
+            return None
+        answer = self._faq_answer(message)
+        if answer is None or not persist:
+            return answer
+        self._get_or_create_session(session_id, message)
+        return self._store_exchange(session_id, message, answer, FAQ_MODEL_LABEL) or answer
+    
+    def _has_history(self, session_id):
+        with span('history'):
+            return db.session.query(ChatMessage.id).filter_by(session_id=session_id).first() is not None or \
+                db.session.get(ArchivedSession, session_id) is not None
+    
+    def _get_or_create_session(self, session_id, message):
+        with span('db_session'):
+            chat_session = db.session.get(ChatSession, session_id) or restore_archived_session(session_id)
+            if not chat_session:
+                chat_session = ChatSession(id=session_id, title=self._generate_title(message))
+                db.session.add(chat_session)
+                db.session.commit()
+        return chat_session
+    
+    def _prepare_exchange(self, message, session_id, model, persist):
+        """Load the session and history and build the upstream messages
+        
+        Returns (messages, model_name), or an error message for the user.
+        """
+        deadline = current_deadline()
+        conversation_history = []
+        if persist:
+            self._get_or_create_session(session_id, message)
+            
+            # Get conversation history from database
+            with span('history'):
+                messages_query = ChatMessage.query.filter_by(session_id=session_id).order_by(ChatMessage.timestamp).limit(MAX_CONVERSATION_HISTORY)
+                conversation_history = [{'role': msg.role, 'content': msg.content} for msg in messages_query]
+        
+        if deadline and deadline.expired():
+            return "Error: Request timed out after multiple attempts. Please try again."
         
         real_time_context = self.get_real_time_context()
         api_used = f"{API_PROVIDER.upper()} API"
@@ -112,8 +388,11 @@ Current time: {now.strftime('%I:%M %p')} ({TIMEZONE})"""
         # Try to enhance message with RAG if knowledge base is available
         enhanced_message = message
         try:
-            if rag_system.is_trained:
-                enhanced_message = rag_system.generate_context_prompt(message, max_context_length=800)
+            if rag_system.is_trained and deadline and not deadline.allows(RAG_MIN_REMAINING):
+                print("RAG Enhancement Skipped: request budget is running out")
+            elif rag_system.is_trained:
+                with span('rag'):
+                    enhanced_message = rag_system.generate_context_prompt(message, max_context_length=800)
                 if enhanced_message != message:
                     print(f"RAG Enhancement Applied: Original query enhanced with relevant context")
         except Exception as e:
@@ -142,103 +421,188 @@ but always make your answers natural and conversational. Don't explicitly mentio
         messages.extend(conversation_history)
         messages.append({"role": "user", "content": enhanced_message})
         
-        # Retry logic for rate limiting
+        model_name = model if model else (AVAILABLE_MODELS_LIST[0] if AVAILABLE_MODELS_LIST else AI_MODEL)
+        return messages, model_name
+    
+    def _store_exchange(self, session_id, message, ai_response, model_name):
+        """Save the exchange and bump the session; returns an error message on failure"""
+        # Save messages to database (save original message, not enhanced one)
+        user_message = ChatMessage(
+            session_id=session_id,
+            role='user',
+            content=message,  # Store original message
+            model_used=model_name
+        )
+        
+        assistant_message = ChatMessage(
+            session_id=session_id,
+            role='assistant',
+            content=ai_response,
+            model_used=model_name
+        )
+        
+        try:
+            with span('commit'):
+                db.session.add(user_message)
+                db.session.add(assistant_message)
+                
+                # Update session timestamp
+                ChatSession.query.filter_by(id=session_id).update({'updated_at': datetime.now()})
+                
+                db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            return f"❌ **Unexpected Error**: {str(e)}"
+        return None
+    
+    def _admitted_post(self, messages, model_name, deadline):
+        """Wait for an upstream slot (or be shed at the deadline), then call upstream"""
+        with span('queue'):
+            upstream_admission.acquire(deadline)
+        try:
+            return self._post_with_retries(messages, model_name)
+        finally:
+            upstream_admission.release()
+    
+    def _post_with_retries(self, messages, model_name):
+        """Call the upstream API with retry logic; returns (response text, error message)"""
         max_retries = 3
         base_delay = 1  # Base delay in seconds
         
+        deadline = current_deadline()
+        
         for attempt in range(max_retries):
+            # Stop once the request budget cannot cover the cooldown plus another attempt
+            if deadline and not deadline.allows(provider_backoff.remaining() + UPSTREAM_MIN_ATTEMPT_TIMEOUT):
+                return None, "Error: Request timed out after multiple attempts. Please try again."
+            
+            # Honour a cooldown set by any caller that was rate limited
+            provider_backoff.wait()
             try:
-                headers = {
-                    "Authorization": f"Bearer {API_KEY}",
-                    "Content-Type": "application/json"
-                }
-                
-                # Add OpenRouter specific headers
-                if API_PROVIDER == 'openrouter':
-                    headers["HTTP-Referer"] = "http://localhost:5000"
-                    headers["X-Title"] = "Roseew AI Assistant"
+                headers, data = self._build_request(messages, model_name)
                 
-                data = {
-                    "model": model if model else (AVAILABLE_MODELS_LIST[0] if AVAILABLE_MODELS_LIST else AI_MODEL),
-                    "messages": messages,
-                    "temperature": TEMPERATURE,
-                    "max_tokens": MAX_TOKENS
-                }
-                
-                response = requests.post(API_URL, headers=headers, json=data, timeout=30)
+                with span('upstream'):
+                    upstream_timeout = deadline.cap(UPSTREAM_TIMEOUT) if deadline else UPSTREAM_TIMEOUT
+                    response = requests.post(API_URL, headers=headers, json=data, timeout=upstream_timeout)
                 
                 # Handle rate limiting with exponential backoff
                 if response.status_code == 429:
                     if attempt < max_retries - 1:
-                        # Calculate delay with exponential backoff + jitter
+                        # Calculate delay with exponential backoff + jitter, or use the server's Retry-After
                         delay = base_delay * (2 ** attempt) + random.uniform(0, 1)
+                        retry_after = response.headers.get('Retry-After', '')
+                        if retry_after.isdigit():
+                            delay = max(delay, int(retry_after))
                         print(f"Rate limited, retrying in {delay:.1f}s (attempt {attempt + 1}/{max_retries})")
-                        time.sleep(delay)
+                        provider_backoff.trip(delay)
                         continue
                     else:
-                        if API_PROVIDER == 'openrouter':
-                            return "⏰ **Rate Limited**: Switch to free models like 'Llama 3.1 8B (Free)' or wait a few minutes."
-                        else:
-                            return "⏰ **Rate Limited**: Too many requests. Consider switching to OpenRouter for better limits."
+                        return None, self._rate_limited_message()
                 
                 response.raise_for_status()
                 
-                result = response.json()
-                
-                if 'choices' not in result or not result['choices']:
-                    return "Error: Invalid response from AI service"
-                
-                ai_response = result['choices'][0]['message']['content']
-                
-                # Save messages to database (save original message, not enhanced one)
-                user_message = ChatMessage(
-                    session_id=session_id,
-                    role='user',
-                    content=message,  # Store original message
-                    model_used=model if model else (AVAILABLE_MODELS_LIST[0] if AVAILABLE_MODELS_LIST else AI_MODEL)
-                )
-                
-                assistant_message = ChatMessage(
-                    session_id=session_id,
-                    role='assistant',
-                    content=ai_response,
-                    model_used=model if model else (AVAILABLE_MODELS_LIST[0] if AVAILABLE_MODELS_LIST else AI_MODEL)
-                )
-                
-                db.session.add(user_message)
-                db.session.add(assistant_message)
-                
-                # Update session timestamp
-                chat_session.updated_at = datetime.now()
-                
-                db.session.commit()
-                
-                return ai_response
+                return self._parse_completion(response.json())
                 
             except requests.exceptions.Timeout:
-                if attempt < max_retries - 1:
-                    time.sleep(2)
+                if attempt < max_retries - 1 and (not deadline or deadline.allows(2 + UPSTREAM_MIN_ATTEMPT_TIMEOUT)):
+                    with span('retry_wait'):
+                        time.sleep(2)
                     continue
-                return "Error: Request timed out after multiple attempts. Please try again."
+                return None, "Error: Request timed out after multiple attempts. Please try again."
             except requests.exceptions.RequestException as e:
                 error_msg = str(e)
-                if "402" in error_msg or "Payment Required" in error_msg:
-                    return f"⚠️ **Insufficient Credits**: Your {API_PROVIDER.upper()} account needs credits. Add credits to your account."
-                elif "401" in error_msg or "Unauthorized" in error_msg:
-                    return f"🔑 **API Key Error**: Please check your {API_PROVIDER.upper()} API key in .env file."
-                elif "429" in error_msg or "rate limit" in error_msg.lower():
-                    if attempt < max_retries - 1:
-                        delay = base_delay * (2 ** attempt) + random.uniform(0, 1)
-                        time.sleep(delay)
-                        continue
-                    return "⏰ **Rate Limited**: Please wait a few minutes before trying again."
-                return f"🌐 **Connection Error**: {error_msg}"
+                if ("429" in error_msg or "rate limit" in error_msg.lower()) and attempt < max_retries - 1:
+                    delay = base_delay * (2 ** attempt) + random.uniform(0, 1)
+                    provider_backoff.trip(delay)
+                    continue
+                return None, self._connection_error_message(error_msg)
             except KeyError as e:
-                return f"📝 **Response Error**: Invalid AI service response. Please try again or switch models."
+                return None, f"📝 **Response Error**: Invalid AI service response. Please try again or switch models."
             except Exception as e:
-                return f"❌ **Unexpected Error**: {str(e)}"
+                return None, f"❌ **Unexpected Error**: {str(e)}"
         
-        return "❌ **Error**: Failed after multiple attempts. Please try again later."
+        return None, "❌ **Error**: Failed after multiple attempts. Please try again later."
+    
+    def _build_request(self, messages, model_name):
+        """Headers and JSON body for a chat completion request"""
+        headers = {
+            "Authorization": f"Bearer {API_KEY}",
+            "Content-Type": "application/json"
+        }
+        
+        # Add OpenRouter specific headers
+        if API_PROVIDER == 'openrouter':
+            headers["HTTP-Referer"] = "http://localhost:5000"
+            headers["X-Title"] = "Roseew AI Assistant"
+        
+        data = {
+            "model": model_name,
+            "messages": messages,
+            "temperature": TEMPERATURE,
+            "max_tokens": MAX_TOKENS
+        }
+        return headers, data
+    
+    def _parse_completion(self, result):
+        """Extract (response text, error message) from a completion payload"""
+        if 'choices' not in result or not result['choices']:
+            return None, "Error: Invalid response from AI service"
+        return result['choices'][0]['message']['content'], None
+    
+    def _rate_limited_message(self):
+        if API_PROVIDER == 'openrouter':
+            return "⏰ **Rate Limited**: Switch to free models like 'Llama 3.1 8B (Free)' or wait a few minutes."
+        return "⏰ **Rate Limited**: Too many requests. Consider switching to OpenRouter for better limits."
+    
+    def _connection_error_message(self, error_msg):
+        """User-facing message for a failed upstream request"""
+        if "402" in error_msg or "Payment Required" in error_msg:
+            return f"⚠️ **Insufficient Credits**: Your {API_PROVIDER.upper()} account needs credits. Add credits to your account."
+        elif "401" in error_msg or "Unauthorized" in error_msg:
+            return f"🔑 **API Key Error**: Please check your {API_PROVIDER.upper()} API key in .env file."
+        elif "429" in error_msg or "rate limit" in error_msg.lower():
+            return "⏰ **Rate Limited**: Please wait a few minutes before trying again."
+        return f"🌐 **Connection Error**: {error_msg}"
+    
+    def get_ai_responses(self, prompts, persist=False, max_concurrency=None):
+        """Answer independent prompts concurrently, yielding results as they finish
+        
+        Each prompt is a dict with 'message' and optional 'id', 'model' and
+        'session_id'. Concurrency is bounded by the per-provider batch limit,
+        and retries share the provider-wide rate-limit backoff.
+        """
+        limit = BATCH_CONCURRENCY.get(API_PROVIDER, 4)
+        if max_concurrency:
+            limit = max(1, min(limit, max_concurrency))
+        
+        def run(index, item):
+            session_id = item.get('session_id') or str(uuid.uuid4())
+            started = time.perf_counter()
+            with app.app_context(), batch_slots, request_deadline(CHAT_REQUEST_BUDGET):
+                response, model_used = self.get_ai_response_and_source(
+                    item['message'], session_id, item.get('model'), persist=persist)
+            result = {
+                'index': index,
+                'id': item.get('id', index),
+                'response': response,
+                'model_used': model_used,  # FAQ_MODEL_LABEL for curated answers, as stored by /chat
+                'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+            }
+            if persist:
+                result['session_id'] = session_id
+            return result
+        
+        executor = ThreadPoolExecutor(max_workers=limit, thread_name_prefix='chat-batch')
+        try:
+            futures = {executor.submit(run, index, item): index for index, item in enumerate(prompts)}
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    yield future.result()
+                except Exception as e:
+                    yield {'index': index, 'id': prompts[index].get('id', index), 'error': str(e)}
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
     
     def _generate_title(self, first_message):
         """Generate a title for the chat session based on the first message"""
@@ -251,6 +615,108 @@ but always make your answers natural and conversational. Don't explicitly mentio
 # Initialize chatbot
 chatbot = ChatBot()
 
+@app.before_request
+def start_request_timing():
+    """Start span collection and, for a sampled fraction, stack profiling"""
+    if request.endpoint == 'static':
+        return
+    g.request_timer, g.request_timer_token = start_timer(request.path)
+    g.stack_sampler = None
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        g.stack_sampler = StackSampler(threading.get_ident(), PROFILE_INTERVAL_MS / 1000).start()
+
+@app.before_request
+def sync_job_results():
+    """Install indexes, embeddings and examples from jobs other workers ran (throttled)"""
+    job_runner.sync()
+
+def client_rate_limit_key(conversation_id, forwarded_for, remote_addr):
+    """Identify the client by conversation or by IP (behind RATE_LIMIT_TRUSTED_PROXIES proxies)"""
+    if RATE_LIMIT_KEY == 'session' and conversation_id:
+        return f"session:{conversation_id}"
+    forwarded = [ip.strip() for ip in (forwarded_for or '').split(',') if ip.strip()]
+    if RATE_LIMIT_TRUSTED_PROXIES and len(forwarded) >= RATE_LIMIT_TRUSTED_PROXIES:
+        return f"ip:{forwarded[-RATE_LIMIT_TRUSTED_PROXIES]}"
+    return f"ip:{remote_addr}"
+
+def rate_limit_key():
+    return client_rate_limit_key(session.get('conversation_id'), request.headers.get('X-Forwarded-For'), request.remote_addr)
+
+def batch_cost():
+    """Tokens a /chat/batch request spends: one per prompt, since each is an upstream call"""
+    data = request.get_json(silent=True)
+    prompts = data.get('prompts') if isinstance(data, dict) else None
+    return min(len(prompts), BATCH_MAX_PROMPTS) if isinstance(prompts, list) and prompts else 1
+
+@app.before_request
+def enforce_rate_limit():
+    """Reject over-limit clients before any chat DB or upstream work"""
+    if rate_limiter is None or request.endpoint not in RATE_LIMITED_ENDPOINTS:
+        return
+    try:
+        with span('rate_limit'):
+            if request.endpoint == 'chat_batch':
+                decision = batch_rate_limiter.check(f"batch:{rate_limit_key()}", cost=batch_cost())
+            else:
+                decision = rate_limiter.check(rate_limit_key())
+    except Exception as e:
+        # Fail open: a limiter outage should not take chat down
+        print(f"Rate limiter error: {e}")
+        return
+    if not decision.allowed:
+        response = jsonify({
+            'error': f'Rate limit exceeded. Please wait {decision.retry_after_header} seconds before trying again.',
+            'retry_after': decision.retry_after_header
+        })
+        response.status_code = 429
+        response.headers['Retry-After'] = decision.retry_after_header
+        return response
+
+@app.after_request
+def add_server_timing(response):
+    """Expose the span breakdown and log slow requests"""
+    timer = g.pop('request_timer', None)
+    if timer is None:
+        return response
+    response.headers['Server-Timing'] = timer.server_timing_header()
+    response.headers['X-Request-ID'] = timer.request_id
+    log_slow_request(timer, request.method, request.path, response.status_code, SLOW_REQUEST_THRESHOLD_MS)
+    
+    sampler = g.pop('stack_sampler', None)
+    if sampler is not None:
+        sampler.stop()
+        path = os.path.join(PROFILE_OUTPUT_DIR, f"{timer.request_id}.folded")
+        try:
+            sampler.write(path)
+            print(f"Profile written to {path}")
+        except OSError as e:
+            print(f"Failed to write profile: {e}")
+    return response
+
+@app.after_request
+def remember_write(response):
+    """Note when this client last wrote, so its reads stay on the primary for a moment"""
+    if read_router.enabled and request.method in ('POST', 'PUT', 'PATCH', 'DELETE') and response.status_code < 400:
+        session['last_write'] = time.time()
+    return response
+
+@app.teardown_appcontext
+def close_read_session(exc=None):
+    ReadRouter.close(g)
+
+def read_session():
+    """Session for read-only queries: the replica, unless there is none or this client just wrote"""
+    return read_router.session(g, session.get('last_write'))
+
+@app.teardown_request
+def stop_request_timing(exc=None):
+    sampler = g.pop('stack_sampler', None)
+    if sampler is not None:
+        sampler.stop()
+    token = g.pop('request_timer_token', None)
+    if token is not None:
+        stop_timer(token)
+
 @app.route('/')
 def index():
     # Create new conversation ID if not exists
@@ -258,65 +724,215 @@ def index():
         session['conversation_id'] = str(uuid.uuid4())
     return render_template('index.html')
 
+def parse_chat_request(data):
+    """Validate a /chat body; returns (message, model, error)"""
+    if not data:
+        return None, None, 'No JSON data provided'
+    
+    message = data.get('message', '').strip()
+    model = data.get('model', AI_MODEL)  # Get model from request
+    
+    if not message:
+        return None, None, 'Empty message'
+    
+    # Validate message length
+    if len(message) > MAX_MESSAGE_LENGTH:
+        return None, None, f'Message too long (max {MAX_MESSAGE_LENGTH} characters)'
+    return message, model, None
+
+def chat_budget(requested=None):
+    """Total time budget for a chat request; clients may ask for a shorter one"""
+    budget = CHAT_REQUEST_BUDGET
+    try:
+        budget = max(1.0, min(budget, float(requested or budget)))
+    except ValueError:
+        pass
+    return budget
+
+def chat_reply(response, model):
+    tz = pytz.timezone(TIMEZONE)
+    now = datetime.now(tz)
+    return {
+        'response': response,
+        'timestamp': now.strftime('%H:%M'),
+        'model_used': model
+    }
+
 @app.route('/chat', methods=['POST'])
 def chat():
     try:
-        data = request.json
-        if not data:
-            return jsonify({'error': 'No JSON data provided'}), 400
-            
-        message = data.get('message', '').strip()
-        model = data.get('model', AI_MODEL)  # Get model from request
-        
-        if not message:
-            return jsonify({'error': 'Empty message'}), 400
-        
-        # Validate message length
-        if len(message) > MAX_MESSAGE_LENGTH:
-            return jsonify({'error': f'Message too long (max {MAX_MESSAGE_LENGTH} characters)'}), 400
+        message, model, error = parse_chat_request(request.json)
+        if error:
+            return jsonify({'error': error}), 400
         
         conversation_id = session.get('conversation_id', str(uuid.uuid4()))
         session['conversation_id'] = conversation_id
         
         # Get AI response with selected model
-        response = chatbot.get_ai_response(message, conversation_id, model)
+        try:
+            with request_deadline(chat_budget(request.headers.get('X-Request-Timeout'))):
+                response, model_used = chatbot.get_ai_response_and_source(message, conversation_id, model)
+        except AdmissionRejected as e:
+            overloaded = jsonify({'error': str(e), 'retry_after': e.retry_after})
+            overloaded.status_code = 503
+            overloaded.headers['Retry-After'] = str(e.retry_after)
+            return overloaded
         
-        tz = pytz.timezone(TIMEZONE)
-        now = datetime.now(tz)
-        return jsonify({
-            'response': response,
-            'timestamp': now.strftime('%H:%M'),
-            'model_used': model
-        })
+        return jsonify(chat_reply(response, model_used))
         
     except Exception as e:
         return jsonify({'error': f'Internal server error: {str(e)}'}), 500
 
+@app.route('/chat/batch', methods=['POST'])
+def chat_batch():
+    """Answer a list of independent prompts, streaming NDJSON results as they finish"""
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get('prompts'), list) or not data['prompts']:
+        return jsonify({'error': "Expected JSON with a non-empty 'prompts' list"}), 400
+    
+    prompts = data['prompts']
+    if len(prompts) > BATCH_MAX_PROMPTS:
+        return jsonify({'error': f'Too many prompts (max {BATCH_MAX_PROMPTS})'}), 400
+    
+    items = []
+    for index, prompt in enumerate(prompts):
+        item = {'message': prompt} if isinstance(prompt, str) else prompt
+        if not isinstance(item, dict):
+            return jsonify({'error': f'Prompt {index} must be a string or an object'}), 400
+        message = str(item.get('message', '')).strip()
+        if not message:
+            return jsonify({'error': f'Prompt {index} has an empty message'}), 400
+        if len(message) > MAX_MESSAGE_LENGTH:
+            return jsonify({'error': f'Prompt {index} too long (max {MAX_MESSAGE_LENGTH} characters)'}), 400
+        items.append(dict(item, message=message))
+    
+    persist = bool(data.get('persist', False))
+    try:
+        max_concurrency = int(data['max_concurrency']) if data.get('max_concurrency') else None
+    except (TypeError, ValueError):
+        return jsonify({'error': "'max_concurrency' must be an integer"}), 400
+    
+    def generate():
+        started = time.perf_counter()
+        errors = 0
+        for result in chatbot.get_ai_responses(items, persist=persist, max_concurrency=max_concurrency):
+            errors += 'error' in result
+            yield json.dumps(result) + '\n'
+        yield json.dumps({'summary': {
+            'count': len(items),
+            'errors': errors,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+        }}) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @app.route('/new-chat', methods=['POST'])
 def new_chat():
     """Start a new conversation"""
     session['conversation_id'] = str(uuid.uuid4())
     return jsonify({'success': True})
 
+# Delta sync: /history and /load-session carry a weak ETag of the data they show,
+# answer 304 to a matching If-None-Match and take ?since=<message id> to send only newer messages
+def session_version(reader, session_id):
+    """(last message id, message count) of a session, from the (session_id, id) index"""
+    last_id, count = reader.query(func.max(ChatMessage.id), func.count(ChatMessage.id)) \
+        .filter(ChatMessage.session_id == session_id).one()
+    return last_id or 0, count
+
+def sidebar_version(reader):
+    """Changes whenever a session is added, updated or removed or gets a new message
+
+    One round trip of index lookups (newest updated_at, newest message id and
+    the removal counter), so polling stays cheap however long the history is.
+    """
+    last_update, last_message, removed = reader.execute(select(
+        select(func.max(ChatSession.updated_at)).scalar_subquery(),
+        select(func.max(ChatMessage.id)).scalar_subquery(),
+        select(ChangeCounter.value).where(ChangeCounter.name == SESSIONS_REMOVED).scalar_subquery()
+    )).one()
+    return f"{last_update.isoformat() if last_update else ''}-{last_message or 0}-{removed or 0}"
+
+def make_etag(*parts):
+    return hashlib.sha1('|'.join(map(str, parts)).encode()).hexdigest()[:20]
+
+def not_modified(etag):
+    """304 response if the client already has this version, else None"""
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    response = Response(status=304)
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def versioned_json(payload, etag):
+    response = jsonify(payload)
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def messages_since(reader, session_id, since):
+    """Messages of a session, only those after message id ``since`` if given"""
+    query = reader.query(ChatMessage).filter_by(session_id=session_id)
+    if since:
+        query = query.filter(ChatMessage.id > since)
+    return query.order_by(ChatMessage.timestamp, ChatMessage.id).all()
+
+def sidebar_sessions(reader, limit=10):
+    sessions = reader.query(ChatSession).order_by(ChatSession.updated_at.desc()).limit(limit).all()
+    counts = dict(reader.query(ChatMessage.session_id, func.count(ChatMessage.id))
+                  .filter(ChatMessage.session_id.in_([s.id for s in sessions]))
+                  .group_by(ChatMessage.session_id).all()) if sessions else {}
+    return [s.to_dict(message_count=counts.get(s.id, 0)) for s in sessions]
+
 # Endpoint to get chat history
 @app.route('/history', methods=['GET'])
 def get_history():
+    """Messages of the current conversation and the sidebar sessions
+    
+    ?since=<message id> returns only newer messages of the conversation.
+    """
     conversation_id = session.get('conversation_id')
     if not conversation_id:
         return jsonify({'history': [], 'sessions': []})
     
-    # Get current session messages
-    messages = ChatMessage.query.filter_by(session_id=conversation_id).order_by(ChatMessage.timestamp).all()
-    history = [{'role': msg.role, 'content': msg.content} for msg in messages]
+    reader = read_session()
+    last_message_id, message_count = session_version(reader, conversation_id)
+    etag = make_etag('history', conversation_id, last_message_id, sidebar_version(reader))
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
     
-    # Get all sessions for sidebar
-    sessions = ChatSession.query.order_by(ChatSession.updated_at.desc()).limit(10).all()
-    sessions_data = [session.to_dict() for session in sessions]
+    # Get current session messages
+    since = request.args.get('since', type=int)
+    history = [{'id': msg.id, 'role': msg.role, 'content': msg.content}
+               for msg in messages_since(reader, conversation_id, since)]
     
-    return jsonify({
+    return versioned_json({
         'history': history,
-        'sessions': sessions_data
-    })
+        'since': since,
+        'last_message_id': last_message_id,
+        'message_count': message_count,
+        'sessions': sidebar_sessions(reader)
+    }, etag)
+
+@app.route('/history/search', methods=['GET'])
+def search_history():
+    """Sessions whose messages match ?q=, best first, with a highlighted snippet each
+    
+    Pass the returned next_cursor as ?cursor= to get the following page.
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Query parameter q is required'}), 400
+    limit = min(max(request.args.get('limit', HISTORY_SEARCH_PAGE_SIZE, type=int), 1), HISTORY_SEARCH_MAX_PAGE_SIZE)
+    try:
+        results, next_cursor = search_sessions(read_session().connection(), query, limit, request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except SearchIndexMissing as e:
+        return jsonify({'error': str(e)}), 503
+    return jsonify({'results': results, 'next_cursor': next_cursor})
 
 # Endpoint to delete chat history
 @app.route('/delete-history', methods=['POST'])
@@ -326,7 +942,9 @@ def delete_history():
         # Delete all messages for this session
         ChatMessage.query.filter_by(session_id=conversation_id).delete()
         # Delete the session
-        ChatSession.query.filter_by(id=conversation_id).delete()
+        if ChatSession.query.filter_by(id=conversation_id).delete():
+            bump_change_counter(db.session, SESSIONS_REMOVED)
+        ArchivedSession.query.filter_by(id=conversation_id).delete()
         db.session.commit()
     return jsonify({'success': True})
 
@@ -338,6 +956,9 @@ def delete_session(session_id):
         # Check if session exists
         chat_session = db.session.get(ChatSession, session_id)
         if not chat_session:
+            if ArchivedSession.query.filter_by(id=session_id).delete():
+                db.session.commit()
+                return jsonify({'success': True, 'message': 'Chat session deleted successfully'})
             return jsonify({'error': 'Session not found'}), 404
         
         # Delete all messages for this session
@@ -345,6 +966,7 @@ def delete_session(session_id):
         
         # Delete the session
         db.session.delete(chat_session)
+        bump_change_counter(db.session, SESSIONS_REMOVED)
         db.session.commit()
         
         return jsonify({'success': True, 'message': 'Chat session deleted successfully'})
@@ -360,8 +982,10 @@ def delete_all_history():
     try:
         # Delete all messages
         ChatMessage.query.delete()
-        # Delete all sessions
+        # Delete all sessions, archived ones included
         ChatSession.query.delete()
+        ArchivedSession.query.delete()
+        bump_change_counter(db.session, SESSIONS_REMOVED)
         db.session.commit()
         
         # Start a new session
@@ -373,23 +997,62 @@ def delete_all_history():
         db.session.rollback()
         return jsonify({'error': f'Failed to delete all history: {str(e)}'}), 500
 
+def restore_archived_session(session_id):
+    """Bring a session archived by retention.archive_idle_sessions back; None if there is none"""
+    if not restore_session(db.session.connection(), session_id):
+        return None
+    db.session.commit()
+    print(f"📦 Restored archived session {session_id}")
+    return db.session.get(ChatSession, session_id)
+
 @app.route('/load-session/<session_id>', methods=['GET'])
 def load_session(session_id):
-    """Load a specific chat session"""
-    chat_session = db.session.get(ChatSession, session_id)
+    """Load a specific chat session (restoring it if it was archived)
+    
+    ?since=<message id> returns only newer messages.
+    """
+    reader = read_session()
+    chat_session = reader.get(ChatSession, session_id)
+    if not chat_session:
+        # New on the primary (not replicated yet) or archived: read this one from the primary
+        reader = db.session
+        chat_session = db.session.get(ChatSession, session_id)
+        if not chat_session:
+            chat_session = restore_archived_session(session_id)
+            if chat_session and read_router.enabled:
+                session['last_write'] = time.time()
     if not chat_session:
         return jsonify({'error': 'Session not found'}), 404
     
     # Update current session
     session['conversation_id'] = session_id
     
+    last_message_id, message_count = session_version(reader, session_id)
+    etag = make_etag('session', session_id, last_message_id, message_count)
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+    
     # Get messages for this session
-    messages = ChatMessage.query.filter_by(session_id=session_id).order_by(ChatMessage.timestamp).all()
-    messages_data = [msg.to_dict() for msg in messages]
+    since = request.args.get('since', type=int)
+    messages_data = [msg.to_dict() for msg in messages_since(reader, session_id, since)]
     
+    return versioned_json({
+        'session': chat_session.to_dict(message_count=message_count),
+        'messages': messages_data,
+        'since': since,
+        'last_message_id': last_message_id,
+        'message_count': message_count
+    }, etag)
+
+@app.route('/metrics')
+def metrics():
+    """Load-shedding and coalescing counters for this worker"""
     return jsonify({
-        'session': chat_session.to_dict(),
-        'messages': messages_data
+        'admission': upstream_admission.stats(),
+        'single_flight': dict(upstream_flight.stats, in_flight=upstream_flight.in_flight()),
+        'faq': dict(faq_stats, hit_rate=round(faq_stats['hits'] / faq_stats['lookups'], 3) if faq_stats['lookups'] else 0.0),
+        'retrieval_cache': dict(retrieval_cache.stats() if retrieval_cache else {}, index_version=rag_system.index_version)
     })
 
 @app.route('/health')
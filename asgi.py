@@ -0,0 +1,304 @@
+"""
+ASGI entry point for the AI Chatbot
+POST /chat runs natively on the event loop and awaits the upstream API with an
+async HTTP client, so a chat waiting on the LLM costs a coroutine instead of a
+worker thread. Database and RAG work still run in a thread pool, and every
+other route is served by the Flask app through a WSGI adapter.
+
+    gunicorn asgi:application --worker-class uvicorn_worker.UvicornWorker
+"""
+
+import asyncio
+import contextvars
+import json
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.http import dump_cookie, parse_cookie
+
+import app as chat_app
+from app import app, chatbot
+from config import *
+from admission import AdmissionRejected
+from deadline import request_deadline, current_deadline
+from request_timing import start_timer, stop_timer, span, log_slow_request
+from singleflight import AsyncSingleFlight, SingleFlightTimeout, coalesce_key
+
+wsgi_application = WsgiToAsgi(app)
+
+# Coalesces identical chats between tasks of this worker's event loop
+async_upstream_flight = AsyncSingleFlight()
+
+_http_client = None
+
+
+def http_client():
+    """Shared async client; connections are pooled across all chats of the worker"""
+    global _http_client
+    if _http_client is None:
+        limit = chat_app.upstream_admission.max_concurrent
+        _http_client = httpx.AsyncClient(limits=httpx.Limits(max_connections=limit, max_keepalive_connections=limit))
+    return _http_client
+
+
+# Blocking database/RAG phases of async chats; sized separately from the event loop's default pool
+db_executor = ThreadPoolExecutor(max_workers=ASYNC_DB_THREADS, thread_name_prefix='asgi-db')
+
+
+async def run_in_app_context(fn, *args):
+    """Run blocking Flask/SQLAlchemy work in a thread; request timer and deadline carry over"""
+    def call():
+        with app.app_context():
+            return fn(*args)
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(db_executor, context.run, call)
+
+
+async def aget_ai_response(message, session_id, model=None, persist=True):
+    """Async counterpart of ChatBot.get_ai_response"""
+    return (await aget_ai_response_and_source(message, session_id, model, persist))[0]
+
+
+async def aget_ai_response_and_source(message, session_id, model=None, persist=True):
+    """Async counterpart of ChatBot.get_ai_response_and_source; returns (response, model_used)"""
+    if FAQ_SHORT_CIRCUIT and chat_app.training_manager.get_examples():
+        faq_answer = await run_in_app_context(chatbot._faq_exchange, message, session_id, persist)
+        if faq_answer is not None:
+            return faq_answer, FAQ_MODEL_LABEL
+
+    requested_model = model or (chat_app.AVAILABLE_MODELS_LIST[0] if chat_app.AVAILABLE_MODELS_LIST else AI_MODEL)
+    if not chat_app.API_KEY:
+        return f"Error: {chat_app.API_PROVIDER.upper()} API key not configured. Please set it in .env file.", requested_model
+
+    chat_app.upstream_admission.check_capacity()
+
+    deadline = current_deadline()
+    admission_deadline = chatbot._admission_deadline(deadline)
+
+    prepared = await run_in_app_context(chatbot._prepare_exchange, message, session_id, model, persist)
+    if isinstance(prepared, str):
+        return prepared, requested_model
+    messages, model_name = prepared
+
+    try:
+        ai_response, error = await async_upstream_flight.do(
+            coalesce_key(model_name, messages[1:]),
+            lambda: _admitted_post(messages, model_name, admission_deadline),
+            timeout=deadline.cap(SINGLE_FLIGHT_TIMEOUT) if deadline else SINGLE_FLIGHT_TIMEOUT
+        )
+    except SingleFlightTimeout:
+        return "Error: Request timed out after multiple attempts. Please try again.", model_name
+    except AdmissionRejected:
+        raise
+    except Exception as e:
+        return f"❌ **Unexpected Error**: {str(e)}", model_name
+
+    if error:
+        return error, model_name
+
+    if persist:
+        stored = await run_in_app_context(chatbot._store_exchange, session_id, message, ai_response, model_name)
+        return stored or ai_response, model_name
+    return ai_response, model_name
+
+
+async def _admitted_post(messages, model_name, deadline):
+    admission = chat_app.upstream_admission
+    with span('queue'):
+        await admission.acquire_async(deadline)
+    try:
+        return await _post_with_retries(messages, model_name)
+    finally:
+        admission.release()
+
+
+async def _post_with_retries(messages, model_name):
+    """Async counterpart of ChatBot._post_with_retries; returns (response text, error message)"""
+    max_retries = 3
+    base_delay = 1  # Base delay in seconds
+
+    deadline = current_deadline()
+    backoff = chat_app.provider_backoff
+
+    for attempt in range(max_retries):
+        if deadline and not deadline.allows(backoff.remaining() + UPSTREAM_MIN_ATTEMPT_TIMEOUT):
+            return None, "Error: Request timed out after multiple attempts. Please try again."
+
+        await backoff.wait_async()
+        try:
+            headers, data = chatbot._build_request(messages, model_name)
+
+            with span('upstream'):
+                upstream_timeout = deadline.cap(UPSTREAM_TIMEOUT) if deadline else UPSTREAM_TIMEOUT
+                response = await http_client().post(chat_app.API_URL, headers=headers, json=data, timeout=upstream_timeout)
+
+            if response.status_code == 429:
+                if attempt < max_retries - 1:
+                    delay = base_delay * (2 ** attempt) + random.uniform(0, 1)
+                    retry_after = response.headers.get('Retry-After', '')
+                    if retry_after.isdigit():
+                        delay = max(delay, int(retry_after))
+                    print(f"Rate limited, retrying in {delay:.1f}s (attempt {attempt + 1}/{max_retries})")
+                    backoff.trip(delay)
+                    continue
+                return None, chatbot._rate_limited_message()
+
+            response.raise_for_status()
+
+            return chatbot._parse_completion(response.json())
+
+        except httpx.TimeoutException:
+            if attempt < max_retries - 1 and (not deadline or deadline.allows(2 + UPSTREAM_MIN_ATTEMPT_TIMEOUT)):
+                with span('retry_wait'):
+                    await asyncio.sleep(2)
+                continue
+            return None, "Error: Request timed out after multiple attempts. Please try again."
+        except httpx.HTTPError as e:
+            error_msg = str(e)
+            if ("429" in error_msg or "rate limit" in error_msg.lower()) and attempt < max_retries - 1:
+                backoff.trip(base_delay * (2 ** attempt) + random.uniform(0, 1))
+                continue
+            return None, chatbot._connection_error_message(error_msg)
+        except KeyError:
+            return None, f"📝 **Response Error**: Invalid AI service response. Please try again or switch models."
+        except Exception as e:
+            return None, f"❌ **Unexpected Error**: {str(e)}"
+
+    return None, "❌ **Error**: Failed after multiple attempts. Please try again later."
+
+
+class _Session:
+    """Flask's signed cookie session, read and written outside a Flask request"""
+
+    def __init__(self, cookie_header):
+        self.name = app.config['SESSION_COOKIE_NAME']
+        self.serializer = app.session_interface.get_signing_serializer(app)
+        self.data = {}
+        self.modified = False
+        value = parse_cookie(cookie_header or '').get(self.name)
+        if value:
+            try:
+                self.data = self.serializer.loads(value, max_age=int(app.permanent_session_lifetime.total_seconds()))
+            except Exception:
+                self.data = {}
+
+    def set_cookie_header(self):
+        return dump_cookie(
+            self.name, self.serializer.dumps(self.data),
+            path=app.config['SESSION_COOKIE_PATH'] or '/',
+            domain=app.config['SESSION_COOKIE_DOMAIN'],
+            secure=app.config['SESSION_COOKIE_SECURE'],
+            httponly=app.config['SESSION_COOKIE_HTTPONLY'],
+            samesite=app.config['SESSION_COOKIE_SAMESITE'],
+        )
+
+
+async def _read_body(receive):
+    body = b''
+    more_body = True
+    while more_body:
+        event = await receive()
+        body += event.get('body', b'')
+        more_body = event.get('more_body', False)
+    return body
+
+
+async def _send_json(send, status, payload, headers=()):
+    body = json.dumps(payload).encode('utf-8')
+    raw_headers = [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+    raw_headers += [(name.encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+    await send({'type': 'http.response.start', 'status': status, 'headers': raw_headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def chat(scope, receive, send):
+    """POST /chat with the same contract as the Flask view"""
+    request_headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+    timer, token = start_timer(scope['path'])
+    headers = []
+    try:
+        cookie_session = _Session(request_headers.get('cookie'))
+        data = json.loads(await _read_body(receive) or b'null')
+        status, payload, headers = await _chat(scope, request_headers, cookie_session, data)
+        if cookie_session.modified:
+            headers.append(('Set-Cookie', cookie_session.set_cookie_header()))
+    except Exception as e:
+        status, payload = 500, {'error': f'Internal server error: {str(e)}'}
+    finally:
+        stop_timer(token)
+
+    headers += [('Server-Timing', timer.server_timing_header()), ('X-Request-ID', timer.request_id)]
+    log_slow_request(timer, scope['method'], scope['path'], status, SLOW_REQUEST_THRESHOLD_MS)
+    await _send_json(send, status, payload, headers)
+
+
+async def _chat(scope, request_headers, cookie_session, data):
+    """Returns (status, payload, headers)"""
+    # Like the Flask app's sync_job_results: install results of jobs other workers ran
+    await run_in_app_context(chat_app.job_runner.sync)
+
+    limiter = chat_app.rate_limiter
+    if limiter is not None and 'chat' in RATE_LIMITED_ENDPOINTS:
+        client = scope.get('client') or (None, None)
+        key = chat_app.client_rate_limit_key(
+            cookie_session.data.get('conversation_id'), request_headers.get('x-forwarded-for'), client[0])
+        try:
+            with span('rate_limit'):
+                # The database limiter reaches db.engine, which needs an app context
+                decision = await run_in_app_context(limiter.check, key)
+        except Exception as e:
+            print(f"Rate limiter error: {e}")
+            decision = None
+        if decision is not None and not decision.allowed:
+            return 429, {
+                'error': f'Rate limit exceeded. Please wait {decision.retry_after_header} seconds before trying again.',
+                'retry_after': decision.retry_after_header
+            }, [('Retry-After', decision.retry_after_header)]
+
+    message, model, error = chat_app.parse_chat_request(data)
+    if error:
+        return 400, {'error': error}, []
+
+    conversation_id = cookie_session.data.get('conversation_id')
+    if not conversation_id:
+        conversation_id = cookie_session.data['conversation_id'] = str(uuid.uuid4())
+        cookie_session.modified = True
+
+    try:
+        with request_deadline(chat_app.chat_budget(request_headers.get('x-request-timeout'))):
+            response, model_used = await aget_ai_response_and_source(message, conversation_id, model)
+    except AdmissionRejected as e:
+        return 503, {'error': str(e), 'retry_after': e.retry_after}, [('Retry-After', str(e.retry_after))]
+
+    if chat_app.read_router.enabled:
+        # Like the Flask app's remember_write: this client's next reads stay on the primary
+        cookie_session.data['last_write'] = time.time()
+        cookie_session.modified = True
+
+    return 200, chat_app.chat_reply(response, model_used), []
+
+
+async def lifespan(receive, send):
+    global _http_client
+    while True:
+        event = await receive()
+        if event['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif event['type'] == 'lifespan.shutdown':
+            if _http_client is not None:
+                await _http_client.aclose()
+                _http_client = None
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] == 'http' and scope['path'] == '/chat' and scope['method'] == 'POST':
+        return await chat(scope, receive, send)
+    return await wsgi_application(scope, receive, send)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Approximate vs exact retrieval benchmark
+Builds the knowledge base of a synthetic corpus with an IVF index, then runs the
+same queries with exact search and with ANN at several probe counts, reporting
+recall@k against exact search and per-query latency:
+
+    python benchmarks/bench_ann.py                                  # 100k and 1M documents
+    python benchmarks/bench_ann.py --sizes 200000 --probes 1,4,16 --queries 500
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+from unittest.mock import patch
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from training_system import TrainingDataManager, SimpleRAGSystem
+from bench_training_system import SyntheticCorpus, RESULTS_DIR
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run_queries(rag, queries, top_k):
+    results, latencies = [], []
+    for query in queries:
+        started = time.perf_counter()
+        results.append(rag._ranked_doc_ids(query, top_k))
+        latencies.append((time.perf_counter() - started) * 1000)
+    return results, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ANN retrieval against exact search')
+    parser.add_argument('--sizes', default='100000,1000000', help='comma separated corpus sizes')
+    parser.add_argument('--probes', default='4,16,64', help='comma separated probe counts')
+    parser.add_argument('--lists', type=int, help='IVF lists (default about sqrt(documents))')
+    parser.add_argument('--queries', type=int, default=300)
+    parser.add_argument('--top-k', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='results path (default benchmarks/results/ann_<timestamp>.json)')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    probe_counts = [int(probes) for probes in args.probes.split(',')]
+    results = []
+    for size in sizes:
+        corpus = SyntheticCorpus(args.seed)
+        print(f"📚 {size} documents: generating and indexing...")
+        manager = TrainingDataManager()
+        for doc in corpus.documents(size):
+            manager.add_document(doc)
+        queries = [example.input_text for example in corpus.examples(args.queries)]
+
+        rag = SimpleRAGSystem(manager, retrieval_mode='ann', ann_lists=args.lists)
+        started = time.perf_counter()
+        with patch('builtins.print'):
+            rag.build_knowledge_base(workers=1)
+        build_seconds = time.perf_counter() - started
+        del manager
+
+        rag.retrieval_mode = 'exact'
+        exact, exact_latency = run_queries(rag, queries, args.top_k)
+        rag.retrieval_mode = 'ann'
+        row = {
+            'documents': size,
+            'lists': rag.ann_index.lists,
+            'build_seconds': round(build_seconds, 1),
+            'exact': {'p50_ms': round(percentile(exact_latency, 0.5), 2),
+                      'p95_ms': round(percentile(exact_latency, 0.95), 2)},
+            'ann': []
+        }
+        print(f"  exact      p50 {row['exact']['p50_ms']:8.2f}ms  p95 {row['exact']['p95_ms']:8.2f}ms")
+        for probes in probe_counts:
+            rag.ann_probes = probes
+            approximate, latency = run_queries(rag, queries, args.top_k)
+            found = sum(len(set(a) & set(e)) for a, e in zip(approximate, exact))
+            recall = found / max(1, sum(len(e) for e in exact))
+            row['ann'].append({
+                'probes': probes,
+                f'recall_at_{args.top_k}': round(recall, 3),
+                'p50_ms': round(percentile(latency, 0.5), 2),
+                'p95_ms': round(percentile(latency, 0.95), 2)
+            })
+            print(f"  {probes:>3} probes p50 {percentile(latency, 0.5):8.2f}ms  p95 {percentile(latency, 0.95):8.2f}ms"
+                  f"  recall@{args.top_k} {recall:.3f}")
+        results.append(row)
+        del rag
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(RESULTS_DIR, f"ann_{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'created_at': datetime.now().isoformat(),
+            'config': vars(args),
+            'python': platform.python_version(),
+            'results': results
+        }, f, indent=2)
+    print(f"📝 Results written to {output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Sync vs async serving benchmark for /chat
+Launches one worker process per configuration against a slow mock LLM and
+holds N concurrent chats open, so the result shows how many waiting chats a
+single process can serve:
+
+    python benchmarks/bench_async_serving.py
+    python benchmarks/bench_async_serving.py --concurrency 50,200,500 --mock-latency 2
+    python benchmarks/bench_async_serving.py --modes sync,async --output async.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+from load_test import launch_app, summarize, wait_until_healthy, PROMPTS
+from mock_llm_server import MockSettings, start_mock_server
+
+MODES = {
+    # name: (application, worker class, threads)
+    'sync': ('app:app', 'sync', 1),  # gunicorn turns sync workers with threads > 1 into gthread
+    'gthread': ('app:app', 'gthread', 8),
+    'async': ('asgi:application', 'uvicorn_worker.UvicornWorker', 0),
+}
+
+
+class ChatUser(threading.Thread):
+    """Sends /chat requests back to back until stopped"""
+
+    def __init__(self, base_url, stop_event, samples, timeout, index):
+        super().__init__(daemon=True)
+        self.base_url = base_url
+        self.stop_event = stop_event
+        self.samples = samples
+        self.timeout = timeout
+        self.index = index
+        self.http = requests.Session()
+
+    def run(self):
+        sent = 0
+        while not self.stop_event.is_set():
+            # Distinct prompts per user so request coalescing does not merge them
+            message = f"{PROMPTS[sent % len(PROMPTS)]} (user {self.index}, #{sent})"
+            started = time.perf_counter()
+            try:
+                ok = self.http.post(self.base_url + '/chat', json={'message': message}, timeout=self.timeout).status_code < 400
+            except requests.RequestException:
+                ok = False
+            self.samples.append(('chat', time.perf_counter() - started, ok))
+            sent += 1
+
+
+def run_level(base_url, concurrency, duration, warmup, timeout):
+    samples = []
+    stop_event = threading.Event()
+    users = [ChatUser(base_url, stop_event, samples, timeout, i) for i in range(concurrency)]
+    for user in users:
+        user.start()
+    time.sleep(warmup)
+    warm_count = len(samples)
+    measure_start = time.perf_counter()
+    time.sleep(duration)
+    elapsed = time.perf_counter() - measure_start
+    measured = samples[warm_count:]
+    stop_event.set()
+    for user in users:
+        user.join(timeout + 1)
+    return summarize(measured, concurrency, elapsed)['overall']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare sync and async serving of /chat')
+    parser.add_argument('--modes', default='sync,gthread,async', help=f"comma separated, from {', '.join(MODES)}")
+    parser.add_argument('--concurrency', default='10,100,300', help='comma separated concurrent chats')
+    parser.add_argument('--duration', type=float, default=15, help='measured seconds per level')
+    parser.add_argument('--warmup', type=float, default=3, help='unmeasured seconds per level')
+    parser.add_argument('--timeout', type=float, default=60, help='client timeout per request')
+    parser.add_argument('--port', type=int, default=5056)
+    parser.add_argument('--mock-latency', type=float, default=1.0, help='seconds the mock LLM takes per reply')
+    parser.add_argument('--output', help='write results as JSON to this path')
+    args = parser.parse_args()
+
+    modes = [m.strip() for m in args.modes.split(',') if m.strip()]
+    levels = [int(c) for c in args.concurrency.split(',') if c.strip()]
+
+    # One worker per mode, with admission limits high enough not to be the bottleneck
+    os.environ.setdefault('UPSTREAM_MAX_CONCURRENT', str(max(levels) * 2))
+    os.environ.setdefault('ADMISSION_MAX_QUEUE', str(max(levels) * 2))
+
+    mock = start_mock_server(MockSettings(latency=args.mock_latency, tokens=30))
+    results = {}
+    try:
+        for mode in modes:
+            application, worker_class, threads = MODES[mode]
+            launch_args = argparse.Namespace(app=application, port=args.port, workers=1,
+                                             worker_class=worker_class, threads=threads)
+            database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), f'bench_{mode}.db')}"
+            print(f"🚀 {mode}: {application} on 1 x {worker_class} worker")
+            process = launch_app(launch_args, mock.url, database_url)
+            try:
+                base_url = f"http://127.0.0.1:{args.port}"
+                wait_until_healthy(base_url, process)
+                results[mode] = []
+                for concurrency in levels:
+                    print(f"⏱️  {concurrency} concurrent chats for {args.duration:.0f}s...")
+                    level = run_level(base_url, concurrency, args.duration, args.warmup, args.timeout)
+                    results[mode].append(dict(level, concurrency=concurrency))
+            finally:
+                process.terminate()
+                process.wait(10)
+    finally:
+        mock.shutdown()
+
+    print()
+    print(f"{'mode':<8} {'chats':>6} {'req':>7} {'rps':>8} {'err%':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    print('-' * 68)
+    for mode, levels_run in results.items():
+        for s in levels_run:
+            print(f"{mode:<8} {s['concurrency']:>6} {s['requests']:>7} {s['throughput_rps']:>8.1f} "
+                  f"{s['error_rate'] * 100:>6.1f} {s['p50_ms']:>9.1f} {s['p95_ms']:>9.1f} {s['p99_ms']:>9.1f}")
+    print(f"\nIdeal throughput is concurrency / mock latency ({args.mock_latency}s) requests per second.")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'created_at': datetime.now().isoformat(), 'config': vars(args), 'results': results}, f, indent=2)
+        print(f"📝 Results written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
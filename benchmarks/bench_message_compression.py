@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Chat message compression benchmark
+Writes the same synthetic conversations (short questions, long answers built
+from the word pools of the bundled datasets) into a fresh SQLite database per
+setting of MESSAGE_COMPRESSION, then reports the database file size after
+VACUUM, write and read throughput (whole sessions loaded through the model, as
+/load-session does, and a scan of every message) and history search latency:
+
+    python benchmarks/bench_message_compression.py                     # 2,000 sessions
+    python benchmarks/bench_message_compression.py --sessions 10000 --min-bytes 256
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from compression import zstandard
+from history_search import install_search_index, search_sessions
+from models import db, ChatSession, ChatMessage
+from bench_training_system import SyntheticCorpus, RESULTS_DIR
+from bench_ann import percentile
+
+
+def conversations(corpus, sessions, turns):
+    """Session ids with their (role, content) messages; answers are 80-600 words in paragraphs"""
+    for s in range(sessions):
+        category = corpus.categories[s % len(corpus.categories)]
+        messages = []
+        for _ in range(turns):
+            messages.append(('user', corpus._words(category, corpus.random.randint(6, 30)).capitalize() + '?'))
+            paragraphs = []
+            for _ in range(corpus.random.randint(1, 6)):
+                sentences = [corpus._words(category, corpus.random.randint(8, 20)).capitalize() + '.'
+                             for _ in range(corpus.random.randint(2, 6))]
+                paragraphs.append(' '.join(sentences))
+            messages.append(('assistant', '\n\n'.join(paragraphs)))
+        yield f"session-{s}", category, messages
+
+
+def bench_setting(name, codec, level, args, data, queries, work_dir):
+    path = os.path.join(work_dir, f"{name}.db")
+    engine = create_engine(f"sqlite:///{path}")
+    db.metadata.create_all(engine, tables=[ChatSession.__table__, ChatMessage.__table__])
+    install_search_index(engine)
+    ChatMessage.__table__.c.content.type.configure(codec, args.min_bytes, level)
+
+    started = time.perf_counter()
+    for session_id, category, messages in data:
+        with Session(engine) as session:
+            session.add(ChatSession(id=session_id, title=category.title()))
+            session.add_all(ChatMessage(session_id=session_id, role=role, content=content)
+                            for role, content in messages)
+            session.commit()
+    write_seconds = time.perf_counter() - started
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.exec_driver_sql('VACUUM')
+    size = os.path.getsize(path)
+
+    session_ids = [data[i][0] for i in range(0, len(data), max(1, len(data) // args.reads))]
+    characters = 0
+    started = time.perf_counter()
+    with Session(engine) as session:
+        for session_id in session_ids:
+            query = select(ChatMessage).filter_by(session_id=session_id).order_by(ChatMessage.timestamp)
+            characters += sum(len(message.to_dict()['content']) for message in session.scalars(query))
+            session.expunge_all()
+    read_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    with engine.connect() as conn:
+        scanned = sum(len(content) for content in conn.scalars(select(ChatMessage.content)))
+    scan_seconds = time.perf_counter() - started
+
+    latency = []
+    with engine.connect() as conn:
+        for query in queries:
+            started = time.perf_counter()
+            search_sessions(conn, query)
+            latency.append((time.perf_counter() - started) * 1000)
+    engine.dispose()
+
+    messages = sum(len(messages) for _, _, messages in data)
+    return {
+        'setting': name,
+        'db_mb': round(size / 2 ** 20, 2),
+        'writes_per_s': round(messages / write_seconds),
+        'sessions_read_per_s': round(len(session_ids) / read_seconds),
+        'read_mb_per_s': round(characters / 2 ** 20 / read_seconds, 1),
+        'scan_mb_per_s': round(scanned / 2 ** 20 / scan_seconds, 1),
+        'search_p50_ms': round(percentile(latency, 0.5), 2),
+        'search_p95_ms': round(percentile(latency, 0.95), 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark database size and throughput with compressed chat messages')
+    parser.add_argument('--sessions', type=int, default=2000)
+    parser.add_argument('--turns', type=int, default=5, help='question/answer pairs per session')
+    parser.add_argument('--reads', type=int, default=500, help='sessions loaded for the read timing')
+    parser.add_argument('--min-bytes', type=int, default=512, help='MESSAGE_COMPRESSION_MIN_BYTES')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='results path (default benchmarks/results/compression_<timestamp>.json)')
+    args = parser.parse_args()
+
+    corpus = SyntheticCorpus(args.seed)
+    data = list(conversations(corpus, args.sessions, args.turns))
+    queries = [' '.join(question.split()[:2]) for question in corpus.queries(100)]
+    stored = sum(len(content.encode('utf-8')) for _, _, messages in data for _, content in messages)
+    print(f"💬 {args.sessions} sessions, {args.sessions * args.turns * 2} messages, {stored / 2 ** 20:.1f} MiB of text")
+
+    setups = [('none', 'none', 0), ('zlib-1', 'zlib', 1), ('zlib-6', 'zlib', 6)]
+    if zstandard is not None:
+        setups += [('zstd-3', 'zstd', 3), ('zstd-9', 'zstd', 9)]
+    work_dir = tempfile.mkdtemp(prefix='bench_compression_')
+    results = []
+    try:
+        for name, codec, level in setups:
+            result = bench_setting(name, codec, level, args, data, queries, work_dir)
+            results.append(result)
+            print(f"  {name:<8} {result['db_mb']:8.2f} MiB  {result['writes_per_s']:7d} writes/s  "
+                  f"{result['sessions_read_per_s']:6d} sessions/s  scan {result['scan_mb_per_s']:6.1f} MiB/s  "
+                  f"search p50 {result['search_p50_ms']:.2f}ms")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(RESULTS_DIR, f"compression_{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'created_at': datetime.now().isoformat(),
+            'config': vars(args),
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+            'results': results
+        }, f, indent=2)
+    print(f"📝 Results written to {output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Scaling benchmark for the parallel knowledge-base build
+Builds the TF-IDF index of one synthetic corpus with 1, 2, 4, ... worker
+processes and reports wall time and speedup over the sequential build
+
+Usage:
+    python benchmarks/bench_parallel_build.py                        # 1M documents, 1..all cores
+    python benchmarks/bench_parallel_build.py --documents 200000 --workers 1,2,4
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+from unittest.mock import patch
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import training_system
+from training_system import TrainingDataManager, SimpleRAGSystem
+from bench_training_system import SyntheticCorpus, RESULTS_DIR
+
+
+def default_workers():
+    counts = []
+    workers = 1
+    while workers < (os.cpu_count() or 1):
+        counts.append(workers)
+        workers *= 2
+    return counts + [os.cpu_count() or 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the parallel knowledge-base build')
+    parser.add_argument('--documents', type=int, default=1000000, help='synthetic corpus size')
+    parser.add_argument('--workers', help='comma separated worker counts (default 1, 2, 4, ... up to all cores)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='results path (default benchmarks/results/parallel_build_<timestamp>.json)')
+    args = parser.parse_args()
+
+    worker_counts = [int(w) for w in args.workers.split(',')] if args.workers else default_workers()
+
+    print(f"📚 Generating {args.documents} synthetic documents...")
+    manager = TrainingDataManager()
+    for doc in SyntheticCorpus(args.seed).documents(args.documents):
+        manager.add_document(doc)
+
+    results = []
+    baseline = None
+    for workers in worker_counts:
+        rag = SimpleRAGSystem(manager, retrieval_mode='exact')  # Index build only, no ANN clustering
+        # workers=1 is the sequential build; force the parallel path for everything else
+        with patch('builtins.print'), patch.object(training_system, 'PARALLEL_BUILD_MIN_DOCUMENTS', 1):
+            started = time.perf_counter()
+            rag.build_knowledge_base(workers=workers)
+            elapsed = time.perf_counter() - started
+        baseline = baseline or elapsed
+        results.append({
+            'workers': workers,
+            'seconds': round(elapsed, 2),
+            'speedup': round(baseline / elapsed, 2),
+            'docs_per_second': round(args.documents / elapsed),
+            'terms': len(rag.vocabulary)
+        })
+        print(f"  {workers:>3} workers: {elapsed:8.2f}s  speedup {baseline / elapsed:5.2f}x")
+        del rag
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(RESULTS_DIR, f"parallel_build_{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'created_at': datetime.now().isoformat(),
+            'documents': args.documents,
+            'cpu_count': os.cpu_count(),
+            'python': platform.python_version(),
+            'results': results
+        }, f, indent=2)
+    print(f"📝 Results written to {output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
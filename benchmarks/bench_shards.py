@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Category shard routing benchmark
+Builds the exact knowledge base of a synthetic multi-domain corpus, then runs
+the same queries against the whole index (no shards), against the one or two
+shards the router picks, and fanned out to every shard, serially and in
+threads, reporting per-query latency and recall@k against the whole index:
+
+    python benchmarks/bench_shards.py                      # 200k documents
+    python benchmarks/bench_shards.py --documents 1000000 --threads 5
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+from unittest.mock import patch
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from training_system import TrainingDataManager, SimpleRAGSystem
+from bench_training_system import SyntheticCorpus, RESULTS_DIR
+from bench_ann import percentile, run_queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark category shard routing against whole-index search')
+    parser.add_argument('--documents', type=int, default=200000)
+    parser.add_argument('--threads', type=int, default=4, help='threads for the parallel fan-out')
+    parser.add_argument('--queries', type=int, default=300)
+    parser.add_argument('--top-k', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='results path (default benchmarks/results/shards_<timestamp>.json)')
+    args = parser.parse_args()
+
+    corpus = SyntheticCorpus(args.seed)
+    print(f"📚 {args.documents} documents in {len(corpus.categories)} categories: generating and indexing...")
+    manager = TrainingDataManager()
+    for doc in corpus.documents(args.documents):
+        manager.add_document(doc)
+    queries = [example.input_text for example in corpus.examples(args.queries)]
+    rag = SimpleRAGSystem(manager, retrieval_mode='exact')
+    with patch('builtins.print'):
+        rag.build_knowledge_base(workers=1)
+    del manager
+
+    state = rag.index_state()
+    rag.load_index_state(dict(state, shards=None))
+    whole, whole_latency = run_queries(rag, queries, args.top_k)
+    rag.load_index_state(state)
+
+    setups = [('whole index', None, 1), ('route 1 shard', 1, 1), ('route 2 shards', 2, 1),
+              ('all shards', 0, 1), (f'all shards, {args.threads} threads', 0, args.threads)]
+    results = []
+    for name, probes, threads in setups:
+        if probes is None:
+            found, latency = whole, whole_latency
+        else:
+            rag.shard_probes, rag.shard_threads = probes, threads
+            found, latency = run_queries(rag, queries, args.top_k)
+        recall = sum(len(set(f) & set(w)) for f, w in zip(found, whole)) / max(1, sum(len(w) for w in whole))
+        results.append({
+            'search': name,
+            f'recall_at_{args.top_k}': round(recall, 3),
+            'p50_ms': round(percentile(latency, 0.5), 2),
+            'p95_ms': round(percentile(latency, 0.95), 2)
+        })
+        print(f"  {name:<24} p50 {percentile(latency, 0.5):8.2f}ms  p95 {percentile(latency, 0.95):8.2f}ms"
+              f"  recall@{args.top_k} {recall:.3f}")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(RESULTS_DIR, f"shards_{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'created_at': datetime.now().isoformat(),
+            'config': vars(args),
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+            'results': results
+        }, f, indent=2)
+    print(f"📝 Results written to {output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
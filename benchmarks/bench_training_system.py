@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for training_system at scale
+Generates synthetic corpora modeled on datasets/*.json and datasets/*_doc_*.txt,
+times the data manager, importers, knowledge base build, retrieval and export,
+records peak memory and saves the results as a JSON baseline
+
+Usage:
+    python benchmarks/bench_training_system.py                          # 1k and 10k
+    python benchmarks/bench_training_system.py --sizes 1000,100000,1000000
+    python benchmarks/bench_training_system.py --baseline benchmarks/results/training_baseline.json
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+from training_system import (
+    TrainingExample,
+    Document,
+    TrainingDataManager,
+    SimpleRAGSystem,
+    FinetuningDataPrep,
+    DataImporter,
+    tokenize
+)
+
+DATASETS_DIR = os.path.join(ROOT_DIR, 'datasets')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+
+class SyntheticCorpus:
+    """Generates examples and documents from the word pools of the bundled datasets"""
+
+    def __init__(self, seed=42):
+        self.random = random.Random(seed)
+        self.pools = {}
+        self.questions = {}
+        for path in sorted(glob.glob(os.path.join(DATASETS_DIR, '*_training.json'))):
+            with open(path, 'r', encoding='utf-8') as f:
+                items = json.load(f)
+            for item in items:
+                category = item.get('category', 'general')
+                self.pools.setdefault(category, []).extend(tokenize(f"{item['input']} {item['output']}"))
+                self.questions.setdefault(category, []).append(item['input'])
+        for path in sorted(glob.glob(os.path.join(DATASETS_DIR, '*_doc_*.txt'))):
+            category = os.path.basename(path).split('_')[0]
+            with open(path, 'r', encoding='utf-8') as f:
+                self.pools.setdefault(category, []).extend(tokenize(f.read()))
+        self.categories = sorted(self.pools)
+
+    def _words(self, category, count):
+        pool = self.pools[category]
+        return ' '.join(self.random.choice(pool) for _ in range(count))
+
+    def examples(self, count):
+        for i in range(count):
+            category = self.categories[i % len(self.categories)]
+            yield TrainingExample(
+                input_text=f"{self._words(category, 8)}?",
+                output_text=self._words(category, 40),
+                category=category,
+                source='synthetic'
+            )
+
+    def documents(self, count):
+        for i in range(count):
+            category = self.categories[i % len(self.categories)]
+            yield Document(
+                content=self._words(category, 80),
+                title=f"{category.title()} document {i}",
+                category=category
+            )
+
+    def queries(self, count):
+        return [self.random.choice(self.questions[self.random.choice(self.categories)]) for _ in range(count)]
+
+
+def measure(func, trace_memory=True):
+    """Run func once and return (result, seconds, peak traced bytes)"""
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+    peak = 0
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def record(results, name, size, elapsed, peak, **extra):
+    entry = {
+        'seconds': round(elapsed, 4),
+        'per_item_us': round(elapsed / size * 1e6, 3) if size else 0,
+        'peak_mb': round(peak / 1024 / 1024, 2)
+    }
+    entry.update(extra)
+    results[name] = entry
+    print(f"  {name:<24} {elapsed:>9.3f}s  {entry['per_item_us']:>9.2f} us/item  {entry['peak_mb']:>9.1f} MB")
+
+
+def bench_size(size, corpus, work_dir, queries, trace_memory):
+    results = {}
+    examples = list(corpus.examples(size))
+    documents = list(corpus.documents(size))
+
+    manager = TrainingDataManager()
+
+    def insert_examples():
+        for example in examples:
+            manager.add_example(example)
+
+    _, elapsed, peak = measure(insert_examples, trace_memory)
+    record(results, 'insert_examples', size, elapsed, peak)
+
+    def insert_documents():
+        for doc in documents:
+            manager.add_document(doc)
+
+    _, elapsed, peak = measure(insert_documents, trace_memory)
+    record(results, 'insert_documents', size, elapsed, peak)
+
+    def category_queries():
+        return sum(len(manager.get_examples(category)) for category in corpus.categories)
+
+    _, elapsed, peak = measure(category_queries, trace_memory)
+    record(results, 'category_queries', size, elapsed, peak, queries=len(corpus.categories))
+
+    json_path = os.path.join(work_dir, 'examples.json')
+    csv_path = os.path.join(work_dir, 'examples.csv')
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump([ex.to_dict() for ex in examples], f)
+    with open(csv_path, 'w', encoding='utf-8') as f:
+        f.write('input,output,category\n')
+        for ex in examples:
+            f.write(f'"{ex.input_text}","{ex.output_text}",{ex.category}\n')
+
+    importer = DataImporter()
+    imported, elapsed, peak = measure(lambda: importer.import_from_json(json_path), trace_memory)
+    record(results, 'import_json', size, elapsed, peak, imported=len(imported))
+    imported, elapsed, peak = measure(lambda: importer.import_from_csv(csv_path), trace_memory)
+    record(results, 'import_csv', size, elapsed, peak, imported=len(imported))
+    del imported
+
+    rag = SimpleRAGSystem(manager)
+    _, elapsed, peak = measure(rag.build_knowledge_base, trace_memory)
+    record(results, 'build_knowledge_base', size, elapsed, peak, vocabulary=len(rag.vocabulary))
+
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        rag.retrieve_relevant_docs(query, top_k=3)
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    results['retrieve_relevant_docs'] = {
+        'queries': len(latencies),
+        'p50_ms': round(latencies[len(latencies) // 2], 3),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1], 3),
+        'mean_ms': round(sum(latencies) / len(latencies), 3)
+    }
+    print(f"  {'retrieve_relevant_docs':<24} p50 {results['retrieve_relevant_docs']['p50_ms']:.3f} ms"
+          f"  p95 {results['retrieve_relevant_docs']['p95_ms']:.3f} ms")
+
+    jsonl_path = os.path.join(work_dir, 'export.jsonl')
+    exporter = FinetuningDataPrep()
+    _, elapsed, peak = measure(lambda: exporter.export_jsonl(examples, jsonl_path), trace_memory)
+    record(results, 'export_jsonl', size, elapsed, peak, bytes=os.path.getsize(jsonl_path))
+
+    return results
+
+
+def compare(current, baseline_path, tolerance):
+    """Return regressions where an operation got slower than the tolerance allows"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)['sizes']
+
+    regressions = []
+    for size, ops in current.items():
+        for name, entry in ops.items():
+            old = baseline.get(size, {}).get(name)
+            if not old:
+                continue
+            key = 'p95_ms' if 'p95_ms' in entry else 'seconds'
+            if old[key] and entry[key] > old[key] * (1 + tolerance):
+                regressions.append(f"{name} @ {size}: {old[key]} -> {entry[key]} ({key})")
+            if 'peak_mb' in entry and old.get('peak_mb') and entry['peak_mb'] > old['peak_mb'] * (1 + tolerance):
+                regressions.append(f"{name} @ {size}: {old['peak_mb']} -> {entry['peak_mb']} MB peak")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark training_system on synthetic corpora')
+    parser.add_argument('--sizes', default='1000,10000', help='comma separated corpus sizes')
+    parser.add_argument('--queries', type=int, default=200, help='retrieval queries per size')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--no-memory', action='store_true', help='skip tracemalloc (faster, no peak memory)')
+    parser.add_argument('--output', help='results path (default benchmarks/results/training_<timestamp>.json)')
+    parser.add_argument('--baseline', help='compare against a previous results file')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative regression')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    corpus = SyntheticCorpus(args.seed)
+    queries = corpus.queries(args.queries)
+    work_dir = tempfile.mkdtemp(prefix='bench_training_')
+
+    results = {}
+    try:
+        for size in sizes:
+            print(f"📊 {size:,} examples / documents")
+            results[str(size)] = bench_size(size, corpus, work_dir, queries, not args.no_memory)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        'created_at': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'trace_memory': not args.no_memory,
+        'sizes': results
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"training_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"📝 Results written to {output}")
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        if regressions:
+            print("❌ Regressions against baseline:")
+            for line in regressions:
+                print(f"  - {line}")
+            return 1
+        print("✅ No regressions against baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
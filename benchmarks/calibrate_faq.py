@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Threshold calibration for the FAQ short-circuit
+Scores rephrasings of every bundled training question (should be answered from
+the example) against three kinds of questions that must go to the LLM: every
+question with its own example left out (any example that matches it answers a
+different question), each content word of a question on its own (a bare
+keyword), and near misses that narrow a question ("... in children?", which
+the general answer does not address). Reports coverage and false matches per
+threshold:
+
+    python benchmarks/calibrate_faq.py
+    python benchmarks/calibrate_faq.py --thresholds 0.6,0.7,0.8,0.9
+"""
+
+import argparse
+import os
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+from config import FAQ_MATCH_THRESHOLD
+from dataset_snapshot import compile_datasets
+from training_system import TrainingExample, TrainingDataManager, ExampleMatcher, tokenize
+
+# How users tend to ask a question that is in the FAQ
+REPHRASINGS = [
+    lambda q: q,
+    lambda q: q.lower().rstrip('?'),
+    lambda q: f"Can you tell me {q[0].lower()}{q[1:]}",
+    lambda q: f"{q.rstrip('?')}, please?",
+    lambda q: f"Quick question: {q}",
+    lambda q: f"{q} Explain it simply.",
+]
+
+# Qualifiers that turn a question into a different one
+NEAR_MISSES = [
+    lambda q: f"{q.rstrip('?')} in children?",
+    lambda q: f"{q.rstrip('?')} for a small business?",
+    lambda q: f"{q.rstrip('?')} in the 1800s?",
+    lambda q: f"Why is this wrong: {q}",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Calibrate FAQ_MATCH_THRESHOLD on the bundled datasets')
+    parser.add_argument('--thresholds', default='0.5,0.6,0.7,0.75,0.8,0.85,0.9,0.95')
+    args = parser.parse_args()
+    thresholds = [float(t) for t in args.thresholds.split(',')]
+
+    examples = [TrainingExample(input_text, output_text, category)
+                for input_text, output_text, category in compile_datasets()[0]]
+    manager = TrainingDataManager()
+    for example in examples:
+        manager.add_example(example)
+    matcher = ExampleMatcher(manager)
+
+    # (score, correct example matched) for questions that are in the FAQ
+    known = []
+    for example in examples:
+        for rephrase in REPHRASINGS:
+            matched, score = matcher.match(rephrase(example.input_text))
+            known.append((score, matched is example))
+
+    # Best score of a question against all other examples
+    unknown = []
+    for held_out in examples:
+        others = TrainingDataManager()
+        for example in examples:
+            if example is not held_out:
+                others.add_example(example)
+        unknown.append(ExampleMatcher(others).match(held_out.input_text)[1])
+
+    keywords = [matcher.match(term)[1] for term in sorted({term for example in examples
+                                                            for term in tokenize(example.input_text)})]
+    near_misses = [matcher.match(qualify(example.input_text))[1]
+                   for example in examples for qualify in NEAR_MISSES]
+
+    print(f"{len(examples)} examples, {len(known)} rephrased questions, {len(unknown)} held-out questions, "
+          f"{len(keywords)} keywords, {len(near_misses)} near misses\n")
+    print(f"{'threshold':>9} {'answered':>9} {'wrong':>6} {'held-out':>9} {'keyword':>8} {'near miss':>10}")
+    print('-' * 56)
+    for threshold in thresholds:
+        answered = sum(1 for score, _ in known if score >= threshold)
+        wrong = sum(1 for score, correct in known if score >= threshold and not correct)
+        rates = [sum(1 for score in negatives if score >= threshold) / len(negatives)
+                 for negatives in (unknown, keywords, near_misses)]
+        marker = '  <- FAQ_MATCH_THRESHOLD' if threshold == FAQ_MATCH_THRESHOLD else ''
+        print(f"{threshold:>9.2f} {answered / len(known):>8.0%} {wrong:>6} {rates[0]:>8.0%} {rates[1]:>7.0%} "
+              f"{rates[2]:>9.0%}{marker}")
+    print(f"\nHighest scores: held-out {max(unknown):.3f}, keyword {max(keywords):.3f}, near miss {max(near_misses):.3f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test for the AI Chatbot
+Drives /chat, /history and /load-session with a fixed number of concurrent
+virtual users and reports throughput, p50/p95/p99 latency and error rate
+
+By default it launches the app under gunicorn against a temporary SQLite
+database and the local mock LLM server, so it runs fully offline:
+
+    python benchmarks/load_test.py --concurrency 1,8,32 --duration 20
+    python benchmarks/load_test.py --workers 4 --worker-class gthread --threads 8
+    python benchmarks/load_test.py --database-url postgresql://localhost/chatbot_bench
+    python benchmarks/load_test.py --target http://127.0.0.1:5000   # already running app
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from mock_llm_server import MockSettings, start_mock_server
+
+PROMPTS = [
+    "What is a business plan?",
+    "How do you calculate ROI?",
+    "Explain the difference between a contract and an agreement.",
+    "What are the symptoms of dehydration?",
+    "How does machine learning work?",
+    "Give me three tips for studying effectively.",
+    "What is cloud computing?",
+    "Summarize the benefits of regular exercise.",
+]
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class VirtualUser(threading.Thread):
+    """Runs chat -> history -> load-session iterations until stopped"""
+
+    def __init__(self, base_url, stop_event, samples, timeout):
+        super().__init__(daemon=True)
+        self.base_url = base_url
+        self.stop_event = stop_event
+        self.samples = samples
+        self.timeout = timeout
+        self.http = requests.Session()
+
+    def _call(self, endpoint, method, path, **kwargs):
+        started = time.perf_counter()
+        ok = False
+        try:
+            response = self.http.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+            ok = response.status_code < 400
+            payload = response.json() if ok else None
+        except (requests.RequestException, ValueError):
+            payload = None
+        self.samples.append((endpoint, time.perf_counter() - started, ok))
+        return payload
+
+    def run(self):
+        self._call('index', 'GET', '/')
+        while not self.stop_event.is_set():
+            self._call('chat', 'POST', '/chat', json={'message': random.choice(PROMPTS)})
+            if self.stop_event.is_set():
+                break
+            history = self._call('history', 'GET', '/history')
+            sessions = (history or {}).get('sessions') or []
+            if sessions and not self.stop_event.is_set():
+                self._call('load_session', 'GET', f"/load-session/{sessions[0]['id']}")
+
+
+def run_level(base_url, concurrency, duration, warmup, timeout):
+    """Run one concurrency level and return its summary"""
+    samples = []
+    stop_event = threading.Event()
+    users = [VirtualUser(base_url, stop_event, samples, timeout) for _ in range(concurrency)]
+    for user in users:
+        user.start()
+
+    time.sleep(warmup)
+    warm_count = len(samples)
+    measure_start = time.perf_counter()
+    time.sleep(duration)
+    elapsed = time.perf_counter() - measure_start
+    measured = samples[warm_count:]
+    stop_event.set()
+    for user in users:
+        user.join(timeout + 1)
+
+    return summarize(measured, concurrency, elapsed)
+
+
+def summarize(samples, concurrency, elapsed):
+    endpoints = {}
+    for endpoint, latency, ok in samples:
+        endpoints.setdefault(endpoint, []).append((latency, ok))
+
+    def stats(entries):
+        latencies = sorted(latency for latency, _ in entries)
+        errors = sum(1 for _, ok in entries if not ok)
+        return {
+            'requests': len(entries),
+            'throughput_rps': round(len(entries) / elapsed, 2) if elapsed else 0,
+            'error_rate': round(errors / len(entries), 4) if entries else 0,
+            'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+        }
+
+    all_entries = [(latency, ok) for _, latency, ok in samples]
+    return {
+        'concurrency': concurrency,
+        'duration_s': round(elapsed, 2),
+        'overall': stats(all_entries),
+        'endpoints': {name: stats(entries) for name, entries in sorted(endpoints.items())}
+    }
+
+
+def print_report(results):
+    print()
+    print(f"{'users':>6} {'endpoint':<13} {'req':>7} {'rps':>8} {'err%':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    print('-' * 72)
+    for level in results:
+        rows = [('ALL', level['overall'])] + list(level['endpoints'].items())
+        for name, s in rows:
+            print(f"{level['concurrency']:>6} {name:<13} {s['requests']:>7} {s['throughput_rps']:>8.1f} "
+                  f"{s['error_rate'] * 100:>6.1f} {s['p50_ms']:>9.1f} {s['p95_ms']:>9.1f} {s['p99_ms']:>9.1f}")
+        print('-' * 72)
+
+
+def compare_to_baseline(results, baseline_path, tolerance):
+    """Flag levels whose throughput dropped or p95 grew beyond the tolerance"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {level['concurrency']: level for level in json.load(f)['levels']}
+
+    regressions = []
+    for level in results:
+        old = baseline.get(level['concurrency'])
+        if not old:
+            continue
+        new_s, old_s = level['overall'], old['overall']
+        if old_s['throughput_rps'] and new_s['throughput_rps'] < old_s['throughput_rps'] * (1 - tolerance):
+            regressions.append(f"{level['concurrency']} users: throughput {old_s['throughput_rps']} -> {new_s['throughput_rps']} rps")
+        if old_s['p95_ms'] and new_s['p95_ms'] > old_s['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{level['concurrency']} users: p95 {old_s['p95_ms']} -> {new_s['p95_ms']} ms")
+        if new_s['error_rate'] > old_s['error_rate'] + tolerance / 10:
+            regressions.append(f"{level['concurrency']} users: error rate {old_s['error_rate']} -> {new_s['error_rate']}")
+    return regressions
+
+
+def wait_until_healthy(base_url, process, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"App exited with code {process.returncode}")
+        try:
+            if requests.get(base_url + '/health', timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f"App at {base_url} did not become healthy within {timeout}s")
+
+
+def launch_app(args, api_url, database_url):
+    """Start the app under gunicorn with the requested worker configuration"""
+    env = dict(os.environ)
+    env.update({
+        'DATABASE_URL': database_url,
+        'FLASK_ENV': 'development',  # Creates tables on startup
+        'API_PROVIDER': 'openrouter',
+        'OPENROUTER_API_KEY': 'mock-key',
+        'API_URL': api_url,
+        'SECRET_KEY': 'load-test',
+        # All virtual users share one IP, so per-client limiting is off unless asked for
+        'RATE_LIMIT_BACKEND': os.environ.get('RATE_LIMIT_BACKEND', 'off'),
+    })
+    command = [
+        sys.executable, '-m', 'gunicorn', args.app,
+        '--bind', f"127.0.0.1:{args.port}",
+        '--workers', str(args.workers),
+        '--worker-class', args.worker_class,
+        '--timeout', '120',
+        '--log-level', 'warning',
+    ]
+    if args.threads:
+        command += ['--threads', str(args.threads)]
+    log = open(os.path.join(tempfile.gettempdir(), 'chatbot_load_test_app.log'), 'w')
+    return subprocess.Popen(command, cwd=ROOT_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test /chat, /history and /load-session')
+    parser.add_argument('--target', help='base URL of an already running app (skips launching)')
+    parser.add_argument('--concurrency', default='1,8,32', help='comma separated virtual user counts')
+    parser.add_argument('--duration', type=float, default=20, help='measured seconds per level')
+    parser.add_argument('--warmup', type=float, default=2, help='unmeasured seconds per level')
+    parser.add_argument('--timeout', type=float, default=60, help='client timeout per request')
+    # App launch options
+    parser.add_argument('--app', default='app:app', help='WSGI application for gunicorn')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--worker-class', default='sync')
+    parser.add_argument('--threads', type=int, default=0)
+    parser.add_argument('--database-url', help='defaults to a temporary SQLite database')
+    # Mock upstream options
+    parser.add_argument('--api-url', help='use an external OpenAI-compatible server instead of the mock')
+    parser.add_argument('--mock-latency', type=float, default=0.5)
+    parser.add_argument('--mock-tokens', type=int, default=60)
+    parser.add_argument('--mock-token-rate', type=float, default=0.0)
+    parser.add_argument('--mock-error-rate', type=float, default=0.0)
+    parser.add_argument('--mock-rate-limit-rate', type=float, default=0.0)
+    # Reporting
+    parser.add_argument('--output', help='write results as JSON to this path')
+    parser.add_argument('--baseline', help='compare against a previous --output file')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='allowed relative regression')
+    args = parser.parse_args()
+
+    levels = [int(c) for c in args.concurrency.split(',') if c.strip()]
+    process = None
+    mock = None
+    try:
+        if args.target:
+            base_url = args.target.rstrip('/')
+        else:
+            api_url = args.api_url
+            if not api_url:
+                mock = start_mock_server(MockSettings(
+                    latency=args.mock_latency, tokens=args.mock_tokens, token_rate=args.mock_token_rate,
+                    error_rate=args.mock_error_rate, rate_limit_rate=args.mock_rate_limit_rate))
+                api_url = mock.url
+            database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'load_test.db')}"
+            base_url = f"http://127.0.0.1:{args.port}"
+            print(f"🚀 Launching {args.app}: {args.workers} x {args.worker_class} workers on {database_url.split('://')[0]}")
+            process = launch_app(args, api_url, database_url)
+
+        wait_until_healthy(base_url, process)
+
+        results = []
+        for concurrency in levels:
+            print(f"⏱️  {concurrency} users for {args.duration:.0f}s...")
+            results.append(run_level(base_url, concurrency, args.duration, args.warmup, args.timeout))
+        print_report(results)
+
+        report = {
+            'created_at': datetime.now().isoformat(),
+            'config': {key: value for key, value in vars(args).items() if key not in ('output', 'baseline')},
+            'levels': results
+        }
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+            print(f"📝 Results written to {args.output}")
+
+        if args.baseline:
+            regressions = compare_to_baseline(results, args.baseline, args.tolerance)
+            if regressions:
+                print("❌ Regressions against baseline:")
+                for line in regressions:
+                    print(f"  - {line}")
+                return 1
+            print("✅ No regressions against baseline")
+        return 0
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(10)
+        if mock is not None:
+            mock.shutdown()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Per-worker memory report for the shared knowledge-base index
+Builds a synthetic index, saves it for KNOWLEDGE_BASE_PATH and starts gunicorn
+once without and once with GUNICORN_PRELOAD, then reads RSS, PSS and the
+shared/private split of the master and every worker from /proc (Linux only):
+
+    python benchmarks/memory_report.py
+    python benchmarks/memory_report.py --documents 500000 --workers 8 --output memory.json
+
+PSS charges each shared page to the processes sharing it in equal parts, so
+the PSS total is what the deployment really costs; RSS counts shared pages in
+every process.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from unittest.mock import patch
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from training_system import TrainingDataManager, SimpleRAGSystem
+from bench_training_system import SyntheticCorpus
+from load_test import launch_app, wait_until_healthy, PROMPTS
+from mock_llm_server import MockSettings, start_mock_server
+
+FIELDS = ('Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty')
+
+
+def memory(pid):
+    """Memory of one process in MiB, from /proc/<pid>/smaps_rollup"""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup", encoding='ascii') as f:
+        for line in f:
+            name, _, rest = line.partition(':')
+            if name in FIELDS:
+                values[name] = int(rest.split()[0]) / 1024
+    return {
+        'rss_mb': round(values['Rss'], 1),
+        'pss_mb': round(values['Pss'], 1),
+        'shared_mb': round(values['Shared_Clean'] + values['Shared_Dirty'], 1),
+        'private_mb': round(values['Private_Clean'] + values['Private_Dirty'], 1),
+    }
+
+
+def children(pid):
+    with open(f"/proc/{pid}/task/{pid}/children", encoding='ascii') as f:
+        return [int(child) for child in f.read().split()]
+
+
+def build_index(path, documents, seed):
+    print(f"📚 Building an index of {documents} synthetic documents...")
+    manager = TrainingDataManager()
+    for doc in SyntheticCorpus(seed).documents(documents):
+        manager.add_document(doc)
+    rag = SimpleRAGSystem(manager)
+    with patch('builtins.print'):
+        rag.build_knowledge_base()
+    rag.save_index(path)
+    print(f"💾 Saved to {path} ({os.path.getsize(path) / 2 ** 20:.1f} MiB)")
+
+
+def measure(preload, args, mock_url, index_path):
+    os.environ['GUNICORN_PRELOAD'] = 'true' if preload else 'false'
+    os.environ['KNOWLEDGE_BASE_PATH'] = index_path
+    launch_args = argparse.Namespace(app='app:app', port=args.port, workers=args.workers,
+                                     worker_class='gthread', threads=4)
+    database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'memory_report.db')}"
+    process = launch_app(launch_args, mock_url, database_url)
+    try:
+        base_url = f"http://127.0.0.1:{args.port}"
+        wait_until_healthy(base_url, process, timeout=300)
+        while len(children(process.pid)) < args.workers:
+            time.sleep(0.25)
+        # Let every worker answer a few chats so retrieval has touched the index
+        for i in range(args.requests):
+            requests.post(base_url + '/chat', json={'message': PROMPTS[i % len(PROMPTS)]}, timeout=60)
+        time.sleep(1)
+        return {
+            'master': memory(process.pid),
+            'workers': [memory(pid) for pid in children(process.pid)]
+        }
+    finally:
+        process.terminate()
+        process.wait(30)
+
+
+def print_report(mode, report):
+    print(f"\n{mode}")
+    print(f"{'process':<10} {'RSS MiB':>9} {'PSS MiB':>9} {'shared':>9} {'private':>9}")
+    print('-' * 50)
+    rows = [('master', report['master'])] + [(f"worker {i}", m) for i, m in enumerate(report['workers'], 1)]
+    for name, m in rows:
+        print(f"{name:<10} {m['rss_mb']:>9.1f} {m['pss_mb']:>9.1f} {m['shared_mb']:>9.1f} {m['private_mb']:>9.1f}")
+    total = {key: sum(m[key] for _, m in rows) for key in ('rss_mb', 'pss_mb')}
+    print(f"{'total':<10} {total['rss_mb']:>9.1f} {total['pss_mb']:>9.1f}")
+    report['total_pss_mb'] = round(total['pss_mb'], 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare worker memory with and without a preloaded index')
+    parser.add_argument('--documents', type=int, default=200000, help='synthetic corpus size')
+    parser.add_argument('--index', help='use this saved index instead of building one')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=20, help='chats sent before measuring')
+    parser.add_argument('--port', type=int, default=5057)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write results as JSON to this path')
+    args = parser.parse_args()
+
+    if not os.path.exists('/proc/self/smaps_rollup'):
+        print("❌ /proc/<pid>/smaps_rollup is required (Linux 4.14+)")
+        return 1
+
+    index_path = args.index
+    if not index_path:
+        index_path = os.path.join(tempfile.mkdtemp(), 'knowledge_base.npz')
+        build_index(index_path, args.documents, args.seed)
+
+    mock = start_mock_server(MockSettings(latency=0.05, tokens=30))
+    results = {}
+    try:
+        for mode, preload in (('per_worker', False), ('preload', True)):
+            print(f"🚀 {args.workers} workers, GUNICORN_PRELOAD={str(preload).lower()}")
+            results[mode] = measure(preload, args, mock.url, index_path)
+    finally:
+        mock.shutdown()
+
+    for mode, report in results.items():
+        print_report(mode, report)
+    saved = results['per_worker']['total_pss_mb'] - results['preload']['total_pss_mb']
+    print(f"\nPreloading saves {saved:.1f} MiB PSS across {args.workers} workers.")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'created_at': datetime.now().isoformat(), 'config': vars(args), 'results': results}, f, indent=2)
+        print(f"📝 Results written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Local OpenAI-compatible mock LLM server for load testing
+Serves /v1/chat/completions with configurable latency, token rate,
+streaming and error injection so benchmarks can run fully offline
+
+Usage:
+    python benchmarks/mock_llm_server.py --port 8001 --latency 0.5 --token-rate 50
+    API_URL=http://127.0.0.1:8001/v1/chat/completions python app.py
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = ("the quick brown fox jumps over a lazy dog while the assistant explains "
+         "how retrieval augmented generation improves answers with relevant context").split()
+
+
+class MockSettings:
+    def __init__(self, latency=0.5, jitter=0.1, tokens=60, token_rate=0.0,
+                 error_rate=0.0, error_status=500, rate_limit_rate=0.0):
+        self.latency = latency  # Seconds before the first token
+        self.jitter = jitter  # Uniform +/- jitter applied to latency
+        self.tokens = tokens  # Completion tokens per response
+        self.token_rate = token_rate  # Tokens per second (0 = instant)
+        self.error_rate = error_rate  # Fraction of requests answered with error_status
+        self.error_status = error_status
+        self.rate_limit_rate = rate_limit_rate  # Fraction of requests answered with 429
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'MockLLM/1.0'
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output clean
+
+    @property
+    def settings(self):
+        return self.server.settings
+
+    def do_GET(self):
+        if self.path.rstrip('/').endswith('/models'):
+            self._send_json(200, {'object': 'list', 'data': [{'id': 'mock-model', 'object': 'model'}]})
+        elif self.path == '/health':
+            self._send_json(200, {'status': 'healthy', 'requests': self.server.request_count})
+        else:
+            self._send_json(404, {'error': {'message': 'Not found'}})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self._send_json(400, {'error': {'message': 'Invalid JSON'}})
+            return
+
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': 'Not found'}})
+            return
+
+        with self.server.lock:
+            self.server.request_count += 1
+
+        settings = self.settings
+        roll = random.random()
+        if roll < settings.rate_limit_rate:
+            self._send_json(429, {'error': {'message': 'Rate limit exceeded'}}, {'Retry-After': '1'})
+            return
+        if roll < settings.rate_limit_rate + settings.error_rate:
+            self._send_json(settings.error_status, {'error': {'message': 'Injected upstream error'}})
+            return
+
+        delay = max(0.0, settings.latency + random.uniform(-settings.jitter, settings.jitter))
+        time.sleep(delay)
+
+        model = body.get('model', 'mock-model')
+        words = [random.choice(WORDS) for _ in range(settings.tokens)]
+        if body.get('stream'):
+            self._stream_completion(model, words)
+        else:
+            if settings.token_rate > 0:
+                time.sleep(len(words) / settings.token_rate)
+            prompt_tokens = sum(len(str(m.get('content', '')).split()) for m in body.get('messages', []))
+            self._send_json(200, {
+                'id': f"chatcmpl-{uuid.uuid4().hex[:12]}",
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': ' '.join(words)},
+                    'finish_reason': 'stop'
+                }],
+                'usage': {
+                    'prompt_tokens': prompt_tokens,
+                    'completion_tokens': len(words),
+                    'total_tokens': prompt_tokens + len(words)
+                }
+            })
+
+    def _stream_completion(self, model, words):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        interval = 1 / self.settings.token_rate if self.settings.token_rate > 0 else 0
+        for i, word in enumerate(words):
+            chunk = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'delta': {'content': word if i == 0 else ' ' + word}, 'finish_reason': None}]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+            if interval:
+                time.sleep(interval)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+    def _send_json(self, status, payload, extra_headers=None):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (extra_headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, settings):
+        super().__init__(address, MockLLMHandler)
+        self.settings = settings
+        self.request_count = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+
+
+def start_mock_server(settings=None, host='127.0.0.1', port=0):
+    """Start the mock server on a background thread and return it"""
+    server = MockLLMServer((host, port), settings or MockSettings())
+    thread = threading.Thread(target=server.serve_forever, name='mock-llm', daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='OpenAI-compatible mock LLM server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--latency', type=float, default=0.5, help='seconds before the first token')
+    parser.add_argument('--jitter', type=float, default=0.1, help='uniform +/- latency jitter in seconds')
+    parser.add_argument('--tokens', type=int, default=60, help='completion tokens per response')
+    parser.add_argument('--token-rate', type=float, default=0.0, help='tokens per second, 0 for instant')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests that fail')
+    parser.add_argument('--error-status', type=int, default=500, help='HTTP status for injected errors')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='fraction of requests answered with 429')
+    args = parser.parse_args()
+
+    settings = MockSettings(args.latency, args.jitter, args.tokens, args.token_rate,
+                            args.error_rate, args.error_status, args.rate_limit_rate)
+    server = MockLLMServer((args.host, args.port), settings)
+    print(f"🤖 Mock LLM server listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -5,6 +5,9 @@ set -o errexit
 # Modify this line as needed for your package manager (pip, poetry, etc.)
 pip install -r requirements.txt
 
+# Compile the bundled datasets into datasets/bundled.snapshot (see DATASET_SNAPSHOT_PATH)
+python dataset_snapshot.py
+
 # Convert static asset files
 # python manage.py collectstatic --no-input
 
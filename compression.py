@@ -0,0 +1,152 @@
+"""
+Transparent compression of stored chat messages for the AI Chatbot
+CompressedText is a Text column type that stores long values compressed
+(zlib, or zstd when the zstandard package is installed) as a BLOB on SQLite
+and hands back plain strings, so models and queries never see the bytes.
+Short values and values that do not shrink stay plain text. PostgreSQL
+already compresses long text values itself (TOAST), so they pass through.
+
+SQLite connections get a message_text(content) SQL function that decodes a
+stored value; the chat history search index reads messages through it.
+"""
+
+import sqlite3
+import zlib
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.types import Text, TypeDecorator
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CODECS = ('none', 'zlib', 'zstd')
+SQL_FUNCTION = 'message_text'
+
+# First byte of a stored value says how the rest was compressed
+_ZLIB_TAG, _ZSTD_TAG = b'z', b's'
+
+
+def _zstd():
+    if zstandard is None:
+        raise RuntimeError("MESSAGE_COMPRESSION=zstd needs the zstandard package (pip install zstandard)")
+    return zstandard
+
+
+def compress_text(value, codec='zlib', min_bytes=1024, level=6):
+    """Stored form of ``value``: tagged compressed bytes, or the string itself
+    if it is shorter than ``min_bytes`` (UTF-8) or compression would not save space
+    """
+    if value is None or codec == 'none':
+        return value
+    raw = value.encode('utf-8')
+    if len(raw) < min_bytes:
+        return value
+    if codec == 'zlib':
+        packed = _ZLIB_TAG + zlib.compress(raw, level)
+    elif codec == 'zstd':
+        packed = _ZSTD_TAG + _zstd().ZstdCompressor(level=level).compress(raw)
+    else:
+        raise ValueError(f"Unknown message compression {codec!r}, expected one of {', '.join(CODECS)}")
+    return packed if len(packed) < len(raw) else value
+
+
+def decompress_text(value):
+    """Plain text of a value stored by compress_text (strings are returned as they are)"""
+    if value is None or isinstance(value, str):
+        return value
+    value = bytes(value)
+    tag, payload = value[:1], value[1:]
+    if tag == _ZLIB_TAG:
+        return zlib.decompress(payload).decode('utf-8')
+    if tag == _ZSTD_TAG:
+        return _zstd().ZstdDecompressor().decompress(payload).decode('utf-8')
+    raise ValueError(f"Unknown compressed message format {tag!r}")
+
+
+class CompressedText(TypeDecorator):
+    """Text column that compresses values of at least ``min_bytes`` on SQLite
+
+    Reading always works, whatever the current settings: rows written with
+    another codec, or before compression was turned on, decode as well.
+    """
+    impl = Text
+    cache_ok = True
+
+    def __init__(self, codec='none', min_bytes=1024, level=6):
+        super().__init__()
+        self.configure(codec, min_bytes, level)
+
+    def configure(self, codec, min_bytes, level):
+        """Settings for values written from now on"""
+        if codec not in CODECS:
+            raise ValueError(f"Unknown message compression {codec!r}, expected one of {', '.join(CODECS)}")
+        if codec == 'zstd':
+            _zstd()
+        self.codec = codec
+        self.min_bytes = min_bytes
+        self.level = level
+
+    def encode(self, value):
+        return compress_text(value, self.codec, self.min_bytes, self.level)
+
+    def process_bind_param(self, value, dialect):
+        if dialect.name != 'sqlite':
+            return value
+        return self.encode(value)
+
+    def process_result_value(self, value, dialect):
+        return decompress_text(value)
+
+
+@event.listens_for(Engine, 'connect')
+def _register_sqlite_function(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.create_function(SQL_FUNCTION, 1, decompress_text, deterministic=True)
+
+
+def compress_existing_messages(engine, column_type, batch_size=500, progress=None):
+    """Rewrite stored messages with the settings of ``column_type``, in batches
+
+    Long plain rows get compressed, compressed rows are re-encoded (so a new
+    codec, or 'none', applies to old rows too). Each batch is one transaction,
+    so the app can keep writing meanwhile and an interrupted run can be
+    repeated. Returns counts of rows rewritten and stored bytes before/after;
+    run VACUUM afterwards to give the space back to the file system.
+    """
+    if engine.dialect.name != 'sqlite':
+        raise ValueError(f"Message compression applies to SQLite only; {engine.dialect.name} compresses long text itself")
+    stats = {'scanned': 0, 'rewritten': 0, 'bytes_before': 0, 'bytes_after': 0}
+    select = text("SELECT id, content FROM chat_messages "
+                  "WHERE id > :after AND (typeof(content) = 'blob' OR length(CAST(content AS BLOB)) >= :min_bytes) "
+                  "ORDER BY id LIMIT :batch_size")
+    update = text("UPDATE chat_messages SET content = :content WHERE id = :id")
+    after = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(select, {'after': after, 'min_bytes': column_type.min_bytes,
+                                         'batch_size': batch_size}).all()
+            if not rows:
+                break
+            changes = []
+            for message_id, stored in rows:
+                stored = bytes(stored) if isinstance(stored, (bytes, memoryview)) else stored
+                encoded = column_type.encode(decompress_text(stored))
+                stats['scanned'] += 1
+                if encoded != stored:
+                    changes.append({'id': message_id, 'content': encoded})
+                    stats['bytes_before'] += _stored_size(stored)
+                    stats['bytes_after'] += _stored_size(encoded)
+            if changes:
+                conn.execute(update, changes)
+            stats['rewritten'] += len(changes)
+            after = rows[-1][0]
+        if progress:
+            progress(stats)
+    return stats
+
+
+def _stored_size(value):
+    return len(value) if isinstance(value, bytes) else len(value.encode('utf-8'))
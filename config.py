@@ -23,6 +23,13 @@ TEMPERATURE = 0.7  # AI creativity/randomness (0.0 to 1.0)
 
 # Chat Configuration
 MAX_CONVERSATION_HISTORY = 20  # Number of messages to keep in memory
+HISTORY_SEARCH_PAGE_SIZE = 20  # Sessions per /history/search page unless ?limit= asks for fewer or more
+HISTORY_SEARCH_MAX_PAGE_SIZE = 100
+MESSAGE_COMPRESSION = os.environ.get('MESSAGE_COMPRESSION', 'none').lower()  # none, zlib or zstd (SQLite only; PostgreSQL compresses long text itself)
+MESSAGE_COMPRESSION_MIN_BYTES = int(os.environ.get('MESSAGE_COMPRESSION_MIN_BYTES', '512'))  # Shorter messages are stored as plain text
+MESSAGE_COMPRESSION_LEVEL = int(os.environ.get('MESSAGE_COMPRESSION_LEVEL', '6'))  # zlib 1-9, zstd 1-22
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', '90'))  # Sessions idle this long move to archived_sessions
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', '200'))  # Sessions moved per transaction
 CONVERSATION_TIMEOUT = 3600  # Session timeout in seconds (1 hour)
 MAX_MESSAGE_LENGTH = 2000  # Maximum characters per message
 
@@ -69,5 +76,91 @@ AVAILABLE_MODELS = {
 RATE_LIMIT_REQUESTS = 20  # Requests per hour per user (reduced from 100)
 RATE_LIMIT_WINDOW = 3600  # Time window in seconds
 MIN_REQUEST_INTERVAL = 2  # Minimum seconds between requests
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'database').lower()  # database (shared by workers), memory, off
+RATE_LIMIT_KEY = os.environ.get('RATE_LIMIT_KEY', 'ip').lower()  # ip or session (conversation_id, falls back to ip)
+RATE_LIMIT_TRUSTED_PROXIES = int(os.environ.get('RATE_LIMIT_TRUSTED_PROXIES', 0))  # Proxies that append to X-Forwarded-For (0 = use the peer address)
+RATE_LIMITED_ENDPOINTS = ('chat', 'chat_batch')  # Flask endpoints the limiter applies to
+BATCH_RATE_LIMIT_PROMPTS = int(os.environ.get('BATCH_RATE_LIMIT_PROMPTS', 1000))  # /chat/batch prompts per window per user (one token each)
 MAX_RETRIES = 3  # Maximum retry attempts for rate limited requests
 BASE_RETRY_DELAY = 1  # Base delay for exponential backoff (seconds)
+
+# Request Timing & Profiling
+SLOW_REQUEST_THRESHOLD_MS = int(os.environ.get('SLOW_REQUEST_THRESHOLD_MS', 5000))  # Log requests slower than this
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))  # Fraction of requests to profile (0 = off)
+PROFILE_INTERVAL_MS = 5  # Stack sampling interval for profiled requests
+PROFILE_OUTPUT_DIR = os.environ.get('PROFILE_OUTPUT_DIR', 'profiles')  # Folded stack output for flame graphs
+
+# Database Engine (see database.py)
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '5'))  # Persistent connections per worker (PostgreSQL)
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', '10'))  # Extra connections under bursts
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', '1800'))  # Seconds before a pooled connection is replaced
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', '15000'))  # PostgreSQL statement_timeout (0 = none)
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000'))  # Wait this long for a locked SQLite database
+DATABASE_REPLICA_STICKY_SECONDS = float(os.environ.get('DATABASE_REPLICA_STICKY_SECONDS', '5'))  # Reads stay on the primary after a client's write
+
+# Request Coalescing (single-flight)
+SINGLE_FLIGHT_TIMEOUT = 90  # Seconds a coalesced request waits for the in-flight call
+SINGLE_FLIGHT_DATABASE = os.environ.get('SINGLE_FLIGHT_DATABASE', 'false').lower() == 'true'  # Coalesce across workers
+
+# Batch Chat API
+BATCH_MAX_PROMPTS = 1000  # Maximum prompts per /chat/batch request
+BATCH_CONCURRENCY = {  # Concurrent upstream calls per provider for batch jobs
+    'openai': 8,
+    'openrouter': 4,
+    'groq': 4
+}
+
+# Admission Control (per worker)
+ADMISSION_MAX_CONCURRENT = {  # Concurrent upstream calls per provider
+    'openai': 16,
+    'openrouter': 8,
+    'groq': 8
+}
+# Async workers (asgi.py) keep waiting chats cheaply, so both limits can be raised per deployment
+UPSTREAM_MAX_CONCURRENT = int(os.environ.get('UPSTREAM_MAX_CONCURRENT', 0))  # Overrides ADMISSION_MAX_CONCURRENT when > 0
+ADMISSION_MAX_QUEUE = int(os.environ.get('ADMISSION_MAX_QUEUE', 32))  # Requests allowed to wait for an upstream slot
+ASYNC_DB_THREADS = int(os.environ.get('ASYNC_DB_THREADS', 16))  # Threads for database work of async chats (asgi.py)
+ADMISSION_QUEUE_TIMEOUT = 10  # Seconds a request may wait for a slot before a 503
+
+# Approximate Retrieval (IVF index over the knowledge base)
+RAG_RETRIEVAL_MODE = os.environ.get('RAG_RETRIEVAL_MODE', 'auto')  # 'auto' (ANN from 50,000 documents), 'ann' or 'exact'
+RAG_ANN_LISTS = int(os.environ.get('RAG_ANN_LISTS', 0))  # Clusters built; 0 for about sqrt(documents)
+RAG_ANN_PROBES = int(os.environ.get('RAG_ANN_PROBES', 0))  # Clusters searched per query: more is slower, higher recall; 0 for a fifth of them
+
+# Category Shards (exact retrieval searches only the categories a query is routed to)
+RAG_SHARD_PROBES = int(os.environ.get('RAG_SHARD_PROBES', 2))  # Best-matching category shards searched; 0 searches all
+RAG_SHARD_THREADS = int(os.environ.get('RAG_SHARD_THREADS', 1))  # Threads per query searching shards in parallel
+
+# Document Embeddings (feature-hashed vectors in the embeddings table, no model download)
+EMBEDDING_DIMENSIONS = int(os.environ.get('EMBEDDING_DIMENSIONS', 384))  # Changing it re-embeds every document
+EMBEDDING_BATCH_SIZE = 256  # Documents embedded and written per transaction
+
+# Retrieval Cache (RAG context per query terms, invalidated whenever the index changes)
+RETRIEVAL_CACHE_SIZE = int(os.environ.get('RETRIEVAL_CACHE_SIZE', 1024))  # Entries per worker, 0 disables
+RETRIEVAL_CACHE_MAX_BYTES = int(os.environ.get('RETRIEVAL_CACHE_MAX_BYTES', 8 * 1024 * 1024))  # Estimated size bound
+
+# FAQ Short-Circuit
+# Opening questions matching a training example's input this closely are answered with its output
+# without an upstream call (benchmarks/calibrate_faq.py reports coverage and false matches)
+FAQ_SHORT_CIRCUIT = os.environ.get('FAQ_SHORT_CIRCUIT', 'true').lower() == 'true'
+FAQ_MATCH_THRESHOLD = float(os.environ.get('FAQ_MATCH_THRESHOLD', 0.85))  # Lower of cosine similarity and term coverage, 0-1
+FAQ_MODEL_LABEL = 'faq'  # Stored as model_used for answers from training examples
+
+# Request Deadlines
+CHAT_REQUEST_BUDGET = 45  # Total seconds a /chat request may take (queueing, RAG, upstream retries)
+UPSTREAM_TIMEOUT = 30  # Per-attempt upstream timeout, shrunk to the remaining budget
+UPSTREAM_MIN_ATTEMPT_TIMEOUT = 3  # Don't start an upstream attempt with less time than this left
+RAG_MIN_REMAINING = 10  # Skip RAG enrichment when less budget than this remains
+
+# Background Jobs (knowledge-base builds, imports, exports)
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))  # Processes per app worker
+JOB_ARTIFACT_DIR = os.environ.get('JOB_ARTIFACT_DIR', 'job_artifacts')  # Files produced by jobs
+JOB_PROGRESS_INTERVAL = 0.5  # Minimum seconds between progress writes to the database
+JOB_SYNC_INTERVAL = float(os.environ.get('JOB_SYNC_INTERVAL', 5))  # Seconds between checks for jobs other workers finished
+
+# Knowledge Base
+# Index written by SimpleRAGSystem.save_index (or a build job's .npz artifact), loaded at startup;
+# with GUNICORN_PRELOAD=true it is loaded once in the master and shared copy-on-write by the workers
+KNOWLEDGE_BASE_PATH = os.environ.get('KNOWLEDGE_BASE_PATH', '')
+# Snapshot of the bundled datasets (python dataset_snapshot.py); seeds the training data and index at startup
+DATASET_SNAPSHOT_PATH = os.environ.get('DATASET_SNAPSHOT_PATH', '')
@@ -0,0 +1,88 @@
+"""
+Database engine profiles and read routing for the AI Chatbot
+engine_options gives the create_engine settings for a database URL: on
+SQLite a busy timeout plus WAL and synchronous=NORMAL on every connection (so
+readers never block the writer), on PostgreSQL a sized, pre-pinged pool with a
+statement timeout. ReadRouter hands out sessions for read-only requests, on a
+read replica when one is configured and on the primary otherwise.
+"""
+
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+def engine_options(url, pool_size=5, max_overflow=10, pool_recycle=1800,
+                   statement_timeout_ms=15000, sqlite_busy_timeout_ms=5000):
+    """Keyword arguments for create_engine (SQLALCHEMY_ENGINE_OPTIONS) suited to ``url``"""
+    if url.startswith('sqlite'):
+        return {'connect_args': {'timeout': sqlite_busy_timeout_ms / 1000}}
+    options = {
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_recycle': pool_recycle,  # Before proxies and managed databases drop idle connections
+        'pool_pre_ping': True,  # Replace connections that died (failover, restarts) instead of failing a request
+    }
+    if url.startswith('postgresql') and statement_timeout_ms:
+        options['connect_args'] = {'options': f"-c statement_timeout={int(statement_timeout_ms)}"}
+    return options
+
+
+def tune_sqlite(engine, busy_timeout_ms=5000):
+    """Set WAL, synchronous=NORMAL and the busy timeout on every new connection of a SQLite engine
+
+    WAL lets requests read while another one writes; with it, NORMAL only
+    syncs at checkpoints, which can lose the last commits on power loss but
+    never corrupts the database. Does nothing for other databases.
+    """
+    if engine.dialect.name != 'sqlite' or engine.url.database in (None, '', ':memory:'):
+        return False
+
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('PRAGMA synchronous=NORMAL')
+            cursor.execute(f'PRAGMA busy_timeout={int(busy_timeout_ms)}')
+        finally:
+            cursor.close()
+    return True
+
+
+class ReadRouter:
+    """Sessions for read-only work, on the replica engine if there is one
+
+    A client that wrote within ``sticky_seconds`` reads from the primary, so
+    it sees its own writes despite replication lag (pass its last write time).
+    """
+
+    def __init__(self, primary_session, replica_engine=None, sticky_seconds=5.0):
+        self.primary_session = primary_session
+        self.replica_engine = replica_engine
+        self.sticky_seconds = sticky_seconds
+
+    @property
+    def enabled(self):
+        return self.replica_engine is not None
+
+    def uses_replica(self, last_write=None):
+        if self.replica_engine is None:
+            return False
+        return not last_write or time.time() - last_write >= self.sticky_seconds
+
+    def session(self, holder, last_write=None):
+        """Session for this request: a replica Session cached on ``holder`` (flask.g), or the primary one"""
+        if not self.uses_replica(last_write):
+            return self.primary_session
+        read_session = getattr(holder, 'replica_session', None)
+        if read_session is None:
+            read_session = holder.replica_session = Session(bind=self.replica_engine)
+        return read_session
+
+    @staticmethod
+    def close(holder):
+        read_session = holder.pop('replica_session', None)
+        if read_session is not None:
+            read_session.close()
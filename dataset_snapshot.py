@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Binary snapshot of the bundled datasets
+Compiles every training example and document under datasets/ (CSV, JSON and
+.txt) into one file of packed arrays: string arenas with offsets plus a
+category table, optionally with the prebuilt TF-IDF index. Loading maps the
+file and uses the arrays in place, so seeding an instance or a test does not
+re-parse any text.
+
+    python dataset_snapshot.py                       # datasets/ -> datasets/bundled.snapshot
+    python dataset_snapshot.py --output /tmp/kb.snapshot --no-index
+"""
+
+import argparse
+import csv
+import glob
+import json
+import mmap
+import os
+import sys
+from datetime import datetime, timezone
+
+import numpy as np
+
+from training_system import (
+    TrainingExample, Document, TrainingDataManager, SimpleRAGSystem, StringTable, DocumentTable
+)
+
+DATASETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'datasets')
+DEFAULT_SNAPSHOT_PATH = os.path.join(DATASETS_DIR, 'bundled.snapshot')
+
+MAGIC = b'AICBSNP1'
+ALIGNMENT = 64  # Every array starts on a cache-line boundary
+INDEX_PREFIX = 'index.'
+
+
+def _parse_document(path):
+    """A datasets/*_doc_*.txt file: 'Title:' and 'Category:' lines, then 'Content:' and the text"""
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    title = os.path.splitext(os.path.basename(path))[0]
+    header, _, content = text.partition('Content:')
+    if not content:
+        header, content = '', text
+    for line in header.splitlines():
+        name, _, value = line.partition(':')
+        if name.strip().lower() == 'title' and value.strip():
+            title = value.strip()
+    return title, content.strip()
+
+
+def compile_datasets(datasets_dir=DATASETS_DIR):
+    """Read all bundled datasets; returns (examples, documents, source file names)
+
+    Examples shipped in both the CSV and the JSON file are kept once. Every item
+    is filed under its dataset's domain, the file name prefix.
+    """
+    examples = []
+    seen = set()
+    sources = []
+
+    def add_example(item, domain):
+        input_text = (item.get('input') or item.get('input_text') or '').strip()
+        output_text = (item.get('output') or item.get('output_text') or '').strip()
+        key = (input_text, output_text, domain)
+        if input_text and output_text and key not in seen:
+            seen.add(key)
+            examples.append((input_text, output_text, domain))
+
+    for path in sorted(glob.glob(os.path.join(datasets_dir, '*_training.json'))):
+        domain = os.path.basename(path).split('_')[0]
+        with open(path, 'r', encoding='utf-8') as f:
+            for item in json.load(f):
+                add_example(item, domain)
+        sources.append(os.path.basename(path))
+
+    for path in sorted(glob.glob(os.path.join(datasets_dir, '*_training.csv'))):
+        domain = os.path.basename(path).split('_')[0]
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            for item in csv.DictReader(f):
+                add_example(item, domain)
+        sources.append(os.path.basename(path))
+
+    documents = []
+    for path in sorted(glob.glob(os.path.join(datasets_dir, '*_doc_*.txt'))):
+        title, content = _parse_document(path)
+        documents.append(Document(content, title, os.path.basename(path).split('_')[0]))
+        sources.append(os.path.basename(path))
+
+    return examples, documents, sources
+
+
+def write_arrays(path, arrays, meta=None):
+    """Write named arrays into one file: magic, header length, JSON header, aligned array data"""
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        arrays[name] = array
+        layout[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+    header = json.dumps({'meta': meta or {}, 'arrays': layout}).encode('utf-8')
+    data_start = -(-(len(MAGIC) + 8 + len(header)) // ALIGNMENT) * ALIGNMENT
+
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(len(header).to_bytes(8, 'little'))
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name]['offset'])
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+    os.replace(temporary_path, path)  # Readers never see a half-written snapshot
+
+
+def map_arrays(path):
+    """Map a file written by write_arrays; returns (meta, {name: read-only array over the mapping})"""
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if buffer[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a dataset snapshot")
+    header_length = int.from_bytes(buffer[len(MAGIC):len(MAGIC) + 8], 'little')
+    header = json.loads(buffer[len(MAGIC) + 8:len(MAGIC) + 8 + header_length].decode('utf-8'))
+    data_start = -(-(len(MAGIC) + 8 + header_length) // ALIGNMENT) * ALIGNMENT
+
+    arrays = {}
+    for name, spec in header['arrays'].items():
+        dtype = np.dtype(spec['dtype'])
+        count = int(np.prod(spec['shape']))
+        arrays[name] = np.frombuffer(buffer, dtype=dtype, count=count,
+                                     offset=data_start + spec['offset']).reshape(spec['shape'])
+    return header['meta'], arrays
+
+
+def build_snapshot(path=DEFAULT_SNAPSHOT_PATH, datasets_dir=DATASETS_DIR, include_index=True):
+    """Compile the datasets into a snapshot at ``path``; returns its metadata"""
+    examples, documents, sources = compile_datasets(datasets_dir)
+    categories = sorted({example[2] for example in examples} | {doc.category for doc in documents})
+    codes = {name: code for code, name in enumerate(categories)}
+
+    category_table = StringTable.from_strings(categories)
+    inputs = StringTable.from_strings([example[0] for example in examples])
+    outputs = StringTable.from_strings([example[1] for example in examples])
+    titles = StringTable.from_strings([doc.title for doc in documents])
+    contents = StringTable.from_strings([doc.content for doc in documents])
+    arrays = {
+        'category_arena': category_table.arena, 'category_offsets': category_table.offsets,
+        'example_input_arena': inputs.arena, 'example_input_offsets': inputs.offsets,
+        'example_output_arena': outputs.arena, 'example_output_offsets': outputs.offsets,
+        'example_category_codes': np.array([codes[example[2]] for example in examples], dtype=np.uint16),
+        'document_title_arena': titles.arena, 'document_title_offsets': titles.offsets,
+        'document_content_arena': contents.arena, 'document_content_offsets': contents.offsets,
+        'document_category_codes': np.array([codes[doc.category] for doc in documents], dtype=np.uint16),
+    }
+
+    has_index = False
+    if include_index and documents:
+        manager = TrainingDataManager()
+        manager.add_documents(documents)
+        rag = SimpleRAGSystem(manager)
+        rag.build_knowledge_base(workers=1)
+        arrays.update({INDEX_PREFIX + name: array for name, array in rag.index_arrays().items()})
+        has_index = True
+
+    meta = {
+        'format': 1,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'sources': sources,
+        'examples': len(examples),
+        'documents': len(documents),
+        'has_index': has_index
+    }
+    write_arrays(path, arrays, meta)
+    return meta
+
+
+class DatasetSnapshot:
+    """A mapped snapshot; examples and documents are materialised only when asked for"""
+
+    def __init__(self, meta, arrays):
+        self.meta = meta
+        self.arrays = arrays
+        self.categories = StringTable(arrays['category_arena'], arrays['category_offsets'])
+        self.inputs = StringTable(arrays['example_input_arena'], arrays['example_input_offsets'])
+        self.outputs = StringTable(arrays['example_output_arena'], arrays['example_output_offsets'])
+        self.example_category_codes = arrays['example_category_codes']
+        self.documents = DocumentTable(
+            StringTable(arrays['document_title_arena'], arrays['document_title_offsets']),
+            StringTable(arrays['document_content_arena'], arrays['document_content_offsets']),
+            self.categories,
+            arrays['document_category_codes']
+        )
+
+    @property
+    def has_index(self):
+        return self.meta.get('has_index', False)
+
+    def examples(self):
+        categories = list(self.categories)
+        for index in range(len(self.inputs)):
+            yield TrainingExample(self.inputs[index], self.outputs[index],
+                                  categories[int(self.example_category_codes[index])],
+                                  source='bundled', created_at=self.meta['created_at'])
+
+    def index_arrays(self):
+        return {name[len(INDEX_PREFIX):]: array for name, array in self.arrays.items()
+                if name.startswith(INDEX_PREFIX)}
+
+    def seed(self, manager, rag_system=None):
+        """Add the snapshot's examples and documents to a TrainingDataManager
+
+        If a rag_system is given and the snapshot carries an index, it is
+        installed directly instead of being rebuilt.
+        """
+        manager.add_examples(self.examples())
+        manager.add_documents(self.documents)
+        if rag_system is not None and self.has_index:
+            rag_system.load_index_arrays(self.index_arrays())
+
+
+def load_snapshot(path=DEFAULT_SNAPSHOT_PATH):
+    """Map a snapshot written by build_snapshot"""
+    meta, arrays = map_arrays(path)
+    return DatasetSnapshot(meta, arrays)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compile the bundled datasets into a binary snapshot')
+    parser.add_argument('--datasets', default=DATASETS_DIR, help='directory with the dataset files')
+    parser.add_argument('--output', default=DEFAULT_SNAPSHOT_PATH)
+    parser.add_argument('--no-index', action='store_true', help='leave out the prebuilt TF-IDF index')
+    args = parser.parse_args()
+
+    meta = build_snapshot(args.output, args.datasets, include_index=not args.no_index)
+    print(f"✅ Snapshot written to {args.output} ({os.path.getsize(args.output)} bytes): "
+          f"{meta['examples']} examples, {meta['documents']} documents from {len(meta['sources'])} files"
+          f"{', with index' if meta['has_index'] else ''}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
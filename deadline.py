@@ -0,0 +1,46 @@
+"""
+Request-scoped deadline budget
+The /chat handler opens a budget and every phase of the request (queueing,
+RAG, upstream attempts, retry backoff) spends from it, which bounds tail latency
+"""
+
+import contextvars
+import time
+from contextlib import contextmanager
+
+_current_deadline = contextvars.ContextVar('request_deadline', default=None)
+
+
+class Deadline:
+    def __init__(self, budget):
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def cap(self, timeout):
+        """Shrink a timeout so it does not outlive the deadline"""
+        return min(timeout, self.remaining())
+
+    def allows(self, seconds):
+        """True if `seconds` can still be spent without exhausting the budget"""
+        return self.remaining() >= seconds
+
+
+@contextmanager
+def request_deadline(budget):
+    """Run the enclosed block with a deadline `budget` seconds from now"""
+    deadline = Deadline(budget)
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def current_deadline():
+    return _current_deadline.get()
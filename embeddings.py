@@ -0,0 +1,160 @@
+"""
+Document embeddings for the AI Chatbot
+Vectors come from feature hashing of word, word-bigram and character n-gram
+features, so they are computed offline, without a model download. Each
+document's vector is stored as a float32 blob in the embeddings table next to
+a hash of its content; a sync only re-embeds documents that are new or
+changed, and all vectors load into one matrix for dot-product search.
+"""
+
+import hashlib
+import zlib
+
+import numpy as np
+from sqlalchemy import delete, insert, select
+
+from training_system import tokenize, _best_rows
+
+_VECTOR_DTYPE = np.dtype('<f4')  # Blob layout, the same on every platform
+_CHAR_NGRAM_WEIGHT = 0.5  # Words carry more meaning than their fragments, which outnumber them
+
+
+def document_key(document, occurrence=0):
+    """Stable id of a document: category and title, plus a counter for duplicate titles"""
+    text = f"{document.category}\0{document.title}\0{occurrence}"
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def content_hash(document):
+    text = f"{document.title}\0{document.category}\0{document.content}"
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def document_keys(documents):
+    """document_key of each document, in order"""
+    seen = {}
+    keys = []
+    for document in documents:
+        name = (document.category, document.title)
+        keys.append(document_key(document, seen.get(name, 0)))
+        seen[name] = seen.get(name, 0) + 1
+    return keys
+
+
+class HashedEmbedder:
+    """L2-normalised signed feature-hashing vectors of a fixed dimension"""
+
+    def __init__(self, dimensions=384, char_ngrams=(3, 4)):
+        self.dimensions = dimensions
+        self.char_ngrams = tuple(char_ngrams)
+
+    @property
+    def signature(self):
+        """Identifies the vector space; vectors of another signature are recomputed"""
+        return f"hash-v1-{self.dimensions}-c{''.join(map(str, self.char_ngrams))}"
+
+    def _features(self, text):
+        """(feature, weight) pairs of one text"""
+        words = tokenize(text)
+        for word in words:
+            yield f"w:{word}", 1.0
+            padded = f"<{word}>"
+            for n in self.char_ngrams:
+                for start in range(len(padded) - n + 1):
+                    yield f"c:{padded[start:start + n]}", _CHAR_NGRAM_WEIGHT
+        for first, second in zip(words, words[1:]):
+            yield f"b:{first} {second}", 1.0
+
+    def embed(self, texts):
+        """float32 matrix with one row per text; texts without features get a zero row"""
+        rows, buckets, weights = [], [], []
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                hashed = zlib.crc32(feature.encode('utf-8'))
+                rows.append(row)
+                buckets.append(hashed % self.dimensions)
+                weights.append(weight if hashed & 0x80000000 else -weight)  # Sign bit keeps collisions unbiased
+        cells = np.asarray(rows, dtype=np.int64) * self.dimensions + np.asarray(buckets, dtype=np.int64)
+        matrix = np.bincount(cells, weights=weights, minlength=len(texts) * self.dimensions)
+        matrix = matrix.reshape(len(texts), self.dimensions).astype(np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+
+class EmbeddingStore:
+    """Embeddings of the knowledge base in a table of the app database
+
+    ``sync`` writes them (from a background job), ``load`` reads them all into
+    one matrix that ``search`` scores with a single matrix-vector product.
+    """
+
+    def __init__(self, get_engine, table, embedder=None, batch_size=256):
+        self.get_engine = get_engine
+        self.table = table
+        self.embedder = embedder or HashedEmbedder()
+        self.batch_size = batch_size
+        self._loaded = ([], np.zeros((0, self.embedder.dimensions), dtype=np.float32))  # (rows, matrix)
+
+    def sync(self, documents, progress=None):
+        """Embed new and changed documents, drop rows of removed ones; returns counts
+
+        ``progress`` is called with the fraction of stale documents embedded so far.
+        """
+        t = self.table
+        keys = document_keys(documents)
+        with self.get_engine().connect() as conn:
+            stored = {row.key: (row.content_hash, row.model)
+                      for row in conn.execute(select(t.c.key, t.c.content_hash, t.c.model))}
+        signature = self.embedder.signature
+        stale = [(key, document, content_hash(document)) for key, document in zip(keys, documents)]
+        stale = [item for item in stale if stored.get(item[0]) != (item[2], signature)]
+        removed = list(set(stored) - set(keys))
+
+        for start in range(0, len(stale), self.batch_size):
+            batch = stale[start:start + self.batch_size]
+            vectors = self.embedder.embed([f"{document.title}\n{document.content}" for _, document, _ in batch])
+            vectors = vectors.astype(_VECTOR_DTYPE, copy=False)
+            with self.get_engine().begin() as conn:
+                conn.execute(delete(t).where(t.c.key.in_([key for key, _, _ in batch])))
+                conn.execute(insert(t), [
+                    {'key': key, 'title': document.title[:255], 'category': document.category[:100],
+                     'content_hash': digest, 'model': signature, 'vector': vector.tobytes()}
+                    for (key, document, digest), vector in zip(batch, vectors)
+                ])
+            if progress:
+                progress((start + len(batch)) / len(stale))
+        for start in range(0, len(removed), self.batch_size):
+            with self.get_engine().begin() as conn:
+                conn.execute(delete(t).where(t.c.key.in_(removed[start:start + self.batch_size])))
+        return {'embedded': len(stale), 'unchanged': len(documents) - len(stale), 'removed': len(removed)}
+
+    def load(self):
+        """Read every vector of the current model into one matrix; returns the row count"""
+        t = self.table
+        rows, blobs = [], []
+        with self.get_engine().connect() as conn:
+            result = conn.execute(select(t.c.key, t.c.title, t.c.category, t.c.vector)
+                                  .where(t.c.model == self.embedder.signature).order_by(t.c.key))
+            for row in result:
+                rows.append({'key': row.key, 'title': row.title, 'category': row.category})
+                blobs.append(row.vector)
+        # One copy to concatenate the blobs; frombuffer then views that buffer without another
+        matrix = np.frombuffer(b''.join(blobs), dtype=_VECTOR_DTYPE).reshape(len(rows), self.embedder.dimensions)
+        self._loaded = (rows, matrix)  # Swapped in whole, so searches never see a mix
+        return len(rows)
+
+    def __len__(self):
+        return len(self._loaded[0])
+
+    def search(self, query, top_k=3, category=None):
+        """Loaded documents most similar to the query: dicts with key, title, category and score"""
+        rows, matrix = self._loaded
+        if not rows:
+            return []
+        scores = matrix @ self.embedder.embed([query])[0]
+        candidates = np.arange(len(rows))
+        if category is not None:
+            candidates = np.array([i for i, row in enumerate(rows) if row['category'] == category], dtype=np.int64)
+        return [dict(rows[i], score=round(score, 4))
+                for i, score in _best_rows(candidates, scores[candidates], top_k)]
@@ -0,0 +1,39 @@
+"""
+Gunicorn configuration for the AI Chatbot
+Picked up automatically by `gunicorn app:app` when started from the project root
+"""
+
+import gc
+import os
+
+# Threaded workers keep serving while some threads wait on the upstream API;
+# admission control in app.py bounds how many of them call upstream at once.
+# For asgi:application use GUNICORN_WORKER_CLASS=uvicorn_worker.UvicornWorker.
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+
+# A chat can legitimately take a while (upstream retries), so allow more than the 30s default
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+
+# Import the app (and load KNOWLEDGE_BASE_PATH) once in the master before forking,
+# so workers share the index pages copy-on-write instead of each loading a copy
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'false').lower() == 'true'
+
+
+def when_ready(server):
+    if preload_app:
+        # Move everything imported so far out of the collector's reach: a full
+        # collection in a worker would otherwise write to (and so copy) every page
+        # holding an object header
+        gc.collect()
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    if preload_app:
+        # Connections opened in the master must not be shared by workers
+        from app import app, db
+        with app.app_context():
+            db.engine.dispose(close=False)
@@ -0,0 +1,212 @@
+"""
+Full-text search over chat history for the AI Chatbot
+Messages are indexed by the database itself: an FTS5 table kept in sync by
+triggers on SQLite, a GIN index on to_tsvector(content) on PostgreSQL. A search
+ranks sessions by their best matching message, returns a highlighted snippet
+of it and pages with a keyset cursor. The cursor pins the newest message id
+seen by the first page, so later messages stay out of the paging, and it cuts
+after its last session's best message as scored now: BM25 scores drift as the
+index grows, so a stored score would skip or repeat sessions (close scores can
+still swap when the average message length moves). Every page still
+scores all matching messages before the cursor cuts it: its cost follows the
+number of matches, not the page depth.
+"""
+
+import base64
+import html
+import json
+import re
+
+from sqlalchemy import DateTime, Float, Integer, String, text
+from sqlalchemy.exc import OperationalError
+
+from compression import SQL_FUNCTION
+
+FTS_TABLE = 'chat_messages_fts'
+TS_CONFIG = 'english'  # PostgreSQL text search configuration (stemming, stop words)
+SNIPPET_WORDS = 16  # Words around the match shown in a snippet
+
+# Highlight markers put in by the database, replaced after HTML-escaping the snippet
+_MARK_START, _MARK_END = '\x02', '\x03'
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+# Messages are indexed through a view that decodes compressed rows (message_text
+# is registered on every SQLite connection by compression.py)
+TEXT_VIEW = 'chat_messages_text'
+_SQLITE_TRIGGERS = ('chat_messages_fts_insert', 'chat_messages_fts_delete', 'chat_messages_fts_update')
+
+_SQLITE_DDL = [
+    # Left behind if chat_messages was dropped with its triggers, or by an older install
+    *(f"DROP TRIGGER IF EXISTS {name}" for name in _SQLITE_TRIGGERS),
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+    f"DROP VIEW IF EXISTS {TEXT_VIEW}",
+    f"CREATE VIEW {TEXT_VIEW} AS SELECT id, {SQL_FUNCTION}(content) AS content FROM chat_messages",
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+    f"content, content='{TEXT_VIEW}', content_rowid='id', tokenize='porter unicode61')",
+    f"CREATE TRIGGER chat_messages_fts_insert AFTER INSERT ON chat_messages BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, content) VALUES (new.id, {SQL_FUNCTION}(new.content)); END",
+    f"CREATE TRIGGER chat_messages_fts_delete AFTER DELETE ON chat_messages BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content) VALUES ('delete', old.id, {SQL_FUNCTION}(old.content)); END",
+    f"CREATE TRIGGER chat_messages_fts_update AFTER UPDATE OF content ON chat_messages BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content) VALUES ('delete', old.id, {SQL_FUNCTION}(old.content)); "
+    f"INSERT INTO {FTS_TABLE}(rowid, content) VALUES (new.id, {SQL_FUNCTION}(new.content)); END",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",  # Index messages stored before
+]
+
+_POSTGRES_DDL = [
+    f"CREATE INDEX IF NOT EXISTS ix_chat_messages_content_fts ON chat_messages "
+    f"USING GIN (to_tsvector('{TS_CONFIG}', content))",
+]
+
+
+class SearchIndexMissing(RuntimeError):
+    """The full-text index was never installed (see install_search_index)"""
+
+
+def install_search_index(engine):
+    """Create the full-text index of chat_messages if it is missing; returns True if created
+
+    Run after the tables exist (db.create_all or init_db.py); existing messages are indexed.
+    """
+    with engine.begin() as conn:
+        if engine.dialect.name == 'sqlite':
+            installed = conn.execute(text("SELECT count(*) FROM sqlite_master WHERE name IN (:trigger, :view)"),
+                                     {'trigger': _SQLITE_TRIGGERS[0], 'view': TEXT_VIEW}).scalar()
+            if installed == 2:
+                return False
+            for statement in _SQLITE_DDL:
+                conn.execute(text(statement))
+            return True
+        if engine.dialect.name == 'postgresql':
+            for statement in _POSTGRES_DDL:
+                conn.execute(text(statement))
+            return True
+    raise ValueError(f"History search is not supported on {engine.dialect.name}")
+
+
+def _fts5_query(query):
+    """FTS5 MATCH expression: every word must occur, the last one as a prefix (search as you type)"""
+    words = _WORD_RE.findall(query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def encode_cursor(score, session_id, message_id, upto):
+    return base64.urlsafe_b64encode(json.dumps([score, session_id, message_id, upto]).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """(score, session_id, message_id, upto) of a cursor from a previous page; ValueError if it is malformed
+
+    The last session of the page, its best message with the score it had, and
+    the newest message id the search covers.
+    """
+    try:
+        score, session_id, message_id, upto = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(score), str(session_id), int(message_id), int(upto)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {e}") from None
+
+
+def _highlight(snippet):
+    escaped = html.escape(snippet or '')
+    return escaped.replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>')
+
+
+# Best matching message per session with a score where higher is better.
+# {match} and {score} are filled in per dialect, {after} cuts the page by keyset.
+_RANKED_SESSIONS = """
+WITH scored AS (
+    SELECT m.session_id, m.id AS message_id, {score} AS score
+    FROM {match} AND m.id <= :upto
+), hits AS (
+    SELECT session_id, message_id, score,
+           ROW_NUMBER() OVER (PARTITION BY session_id ORDER BY score DESC, message_id) AS position,
+           COUNT(*) OVER (PARTITION BY session_id) AS matches
+    FROM scored
+)
+SELECT hits.session_id, hits.message_id, hits.score, hits.matches,
+       s.title, s.updated_at
+FROM hits JOIN chat_sessions s ON s.id = hits.session_id
+WHERE hits.position = 1 {after}
+ORDER BY hits.score DESC, hits.session_id
+LIMIT :limit
+"""
+
+_DIALECTS = {
+    'sqlite': {
+        'match': f"{FTS_TABLE} JOIN chat_messages m ON m.id = {FTS_TABLE}.rowid WHERE {FTS_TABLE} MATCH :query",
+        'score': f"-bm25({FTS_TABLE})",
+        'snippets': (f"SELECT rowid AS id, snippet({FTS_TABLE}, 0, :mark_start, :mark_end, '…', {SNIPPET_WORDS}) AS snippet "
+                     f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :query AND rowid IN ({{ids}})"),
+    },
+    'postgresql': {
+        'match': (f"chat_messages m CROSS JOIN websearch_to_tsquery('{TS_CONFIG}', :query) q "
+                  f"WHERE to_tsvector('{TS_CONFIG}', m.content) @@ q"),
+        'score': f"ts_rank(to_tsvector('{TS_CONFIG}', m.content), q)",
+        'snippets': (f"SELECT m.id, ts_headline('{TS_CONFIG}', m.content, q, "
+                     f"'StartSel=' || :mark_start || ', StopSel=' || :mark_end || ', MaxWords={SNIPPET_WORDS}, MinWords=5') "
+                     f"AS snippet FROM chat_messages m CROSS JOIN websearch_to_tsquery('{TS_CONFIG}', :query) q "
+                     f"WHERE m.id IN ({{ids}})"),
+    },
+}
+
+
+def search_sessions(conn, query, limit=20, cursor=None):
+    """One page of sessions matching ``query``, best first, and the cursor of the next page (or None)
+
+    Each result has the session's id, title and updated_at, the number of
+    matching messages, the score of the best one, its id and an HTML snippet
+    of it with the matched words in <mark> tags. Raises SearchIndexMissing if
+    the SQLite FTS5 table has not been created.
+    """
+    dialect = _DIALECTS.get(conn.dialect.name)
+    if dialect is None:
+        raise ValueError(f"History search is not supported on {conn.dialect.name}")
+    match_query = _fts5_query(query) if conn.dialect.name == 'sqlite' else query.strip()
+    if not match_query:
+        return [], None
+
+    params = {'query': match_query, 'limit': limit + 1}
+    after = ''
+    if cursor:
+        params['after_score'], params['after_session'], params['after_message'], params['upto'] = decode_cursor(cursor)
+        # Re-score the previous page's last message (scores drift with the index); the stored score is a fallback
+        anchor = "COALESCE((SELECT score FROM scored WHERE message_id = :after_message), :after_score)"
+        after = (f"AND (hits.score < {anchor} OR "
+                 f"(hits.score = {anchor} AND hits.session_id > :after_session))")
+    else:
+        params['upto'] = conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM chat_messages")).scalar()
+    sql = _RANKED_SESSIONS.format(match=dialect['match'], score=dialect['score'], after=after)
+    sql = text(sql).columns(session_id=String, message_id=Integer, score=Float, matches=Integer,
+                            title=String, updated_at=DateTime)
+    try:
+        rows = conn.execute(sql, params).all()
+    except OperationalError as e:
+        if f"no such table: {FTS_TABLE}" in str(e.orig):
+            raise SearchIndexMissing("search index not installed; run init_db") from None
+        raise
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not rows:
+        return [], None
+
+    ids = {f"id{i}": row.message_id for i, row in enumerate(rows)}
+    snippets = dict(conn.execute(
+        text(dialect['snippets'].format(ids=', '.join(f":{name}" for name in ids))),
+        dict(ids, query=match_query, mark_start=_MARK_START, mark_end=_MARK_END)
+    ).all())
+    results = [{
+        'session_id': row.session_id,
+        'title': row.title,
+        'updated_at': row.updated_at.isoformat() if row.updated_at else None,
+        'matches': row.matches,
+        'score': row.score,
+        'message_id': row.message_id,
+        'snippet': _highlight(snippets.get(row.message_id)),
+    } for row in rows]
+    last = rows[-1]
+    return results, encode_cursor(last.score, last.session_id, last.message_id, params['upto']) if has_more else None
@@ -6,7 +6,11 @@ Run this script to initialize the database
 
 import os
 from app import app, db
-from models import ChatSession, ChatMessage, UserPreference
+from models import ChatSession, ChatMessage, UserPreference, create_missing_indexes, add_missing_columns
+from history_search import install_search_index
+from compression import compress_existing_messages
+from retention import archive_idle_sessions
+from config import ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE
 
 def init_database():
     """Initialize the database with all tables"""
@@ -14,7 +18,11 @@ def init_database():
         try:
             # Create all tables
             db.create_all()
+            add_missing_columns(db.engine)
+            create_missing_indexes(db.engine)
             print("✅ Database tables created successfully!")
+            if install_search_index(db.engine):
+                print("✅ Chat history search index created")
             
             # Verify tables exist
             inspector = db.inspect(db.engine)
@@ -36,14 +44,49 @@ def reset_database():
         if confirm.lower() == 'yes':
             db.drop_all()
             db.create_all()
+            install_search_index(db.engine)
             print("✅ Database reset successfully!")
         else:
             print("❌ Database reset cancelled.")
 
+def compress_messages():
+    """Rewrite stored messages with the current MESSAGE_COMPRESSION settings, then VACUUM"""
+    with app.app_context():
+        column_type = ChatMessage.__table__.c.content.type
+        print(f"🗜️  Rewriting messages with {column_type.codec} (from {column_type.min_bytes} bytes)...")
+        try:
+            stats = compress_existing_messages(
+                db.engine, column_type,
+                progress=lambda s: print(f"   {s['scanned']} scanned, {s['rewritten']} rewritten", end='\r'))
+        except ValueError as e:
+            print(f"❌ {e}")
+            return False
+        print(f"\n✅ {stats['rewritten']} messages rewritten: "
+              f"{stats['bytes_before'] / 1e6:.1f} MB -> {stats['bytes_after'] / 1e6:.1f} MB")
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            conn.exec_driver_sql('VACUUM')
+        print("✅ Database file compacted")
+        return True
+
+def archive_sessions(max_idle_days=ARCHIVE_AFTER_DAYS):
+    """Move sessions idle for max_idle_days into archived_sessions (e.g. from a daily cron job)"""
+    with app.app_context():
+        print(f"📦 Archiving sessions idle for {max_idle_days} days...")
+        summary = archive_idle_sessions(
+            db.engine, max_idle_days, ARCHIVE_BATCH_SIZE,
+            progress=lambda s: print(f"   {s['sessions']} sessions archived", end='\r'))
+        print(f"\n✅ Archived {summary['sessions']} sessions ({summary['messages']} messages, "
+              f"{summary['archived_bytes'] / 1e6:.1f} MB compressed)")
+        return summary
+
 if __name__ == "__main__":
     import sys
     
     if len(sys.argv) > 1 and sys.argv[1] == "--reset":
         reset_database()
+    elif len(sys.argv) > 1 and sys.argv[1] == "--compress-messages":
+        compress_messages()
+    elif len(sys.argv) > 1 and sys.argv[1] == "--archive":
+        archive_sessions(int(sys.argv[2]) if len(sys.argv) > 2 else ARCHIVE_AFTER_DAYS)
     else:
         init_database()
@@ -0,0 +1,420 @@
+"""
+Background jobs for the AI Chatbot
+Knowledge-base builds, imports, exports and archiving run in a process pool instead of
+the request handler, so they neither block a worker nor hit gunicorn's
+timeout. Job state lives in the training_jobs table: the job process writes
+progress there (and notices cancellation), the app process records the
+outcome and installs in-memory results such as a freshly built index. Other
+app processes (gunicorn workers) pick those results up from the table and the
+job's artifact with JobRunner.sync.
+"""
+
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine, func, insert, select, update
+from sqlalchemy.pool import NullPool
+
+from models import TrainingJob, DocumentEmbedding, ChatSession
+from retention import archive_idle_sessions
+from embeddings import HashedEmbedder, EmbeddingStore
+from training_system import (
+    TrainingExample, Document, TrainingDataManager, SimpleRAGSystem, FinetuningDataPrep, DataImporter
+)
+
+_jobs = TrainingJob.__table__
+
+ACTIVE_STATUSES = ('queued', 'running')
+SYNC_OVERLAP = timedelta(minutes=1)  # Jobs are recorded out of finish order across processes
+
+
+class JobCancelled(Exception):
+    """Raised inside a job once cancellation has been requested"""
+
+
+class JobOutput:
+    """What a job function returns
+
+    ``summary`` is stored as the job result, ``artifact`` is the path of a file
+    the job produced and ``payload`` is handed to the submitter's on_done callback
+    in the app process.
+    """
+
+    def __init__(self, summary, artifact=None, payload=None):
+        self.summary = summary
+        self.artifact = artifact
+        self.payload = payload
+
+
+# State of a job process, set by _init_worker
+_engine = None
+_progress_interval = 0.5
+_artifact_dir = None
+
+
+def _init_worker(database_url, progress_interval, artifact_dir):
+    global _engine, _progress_interval, _artifact_dir
+    _engine = create_engine(database_url, poolclass=NullPool)
+    _progress_interval = progress_interval
+    _artifact_dir = artifact_dir
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _utc(value):
+    # SQLite hands DateTime columns back without a timezone
+    return value.replace(tzinfo=timezone.utc) if value is not None and value.tzinfo is None else value
+
+
+def _process_owner():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Exists, owned by another user
+    return True
+
+
+class JobContext:
+    """Passed to job functions to report progress and produce artifacts"""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self._last_write = 0.0
+
+    def progress(self, percent, message=None, force=False):
+        """Record progress (throttled); raises JobCancelled if the job was cancelled"""
+        now = time.monotonic()
+        if not force and now - self._last_write < _progress_interval:
+            return
+        self._last_write = now
+        values = {'progress': max(0.0, min(100.0, percent))}
+        if message:
+            values['message'] = message[:255]
+        with _engine.begin() as conn:
+            written = conn.execute(
+                update(_jobs).where(_jobs.c.id == self.job_id).where(_jobs.c.cancel_requested == False)
+                .values(**values)
+            ).rowcount
+        if not written:
+            raise JobCancelled(f"Job {self.job_id} was cancelled")
+
+    def artifact_path(self, suffix):
+        os.makedirs(_artifact_dir, exist_ok=True)
+        return os.path.join(_artifact_dir, f"{self.job_id}{suffix}")
+
+
+def _run_job(job_id, fn, params):
+    """Entry point in the job process"""
+    with _engine.begin() as conn:
+        started = conn.execute(
+            update(_jobs).where(_jobs.c.id == job_id).where(_jobs.c.status == 'queued')
+            .where(_jobs.c.cancel_requested == False)
+            .values(status='running', started_at=_now(), message='Started')
+        ).rowcount
+    if not started:
+        raise JobCancelled(f"Job {job_id} was cancelled before it started")
+    return fn(JobContext(job_id), **params)
+
+
+class JobRunner:
+    """Runs job functions in a process pool and tracks them in training_jobs
+
+    Job functions must be importable top-level functions taking a JobContext
+    plus keyword arguments, and must return a JobOutput.
+    """
+
+    def __init__(self, get_engine, max_workers=2, artifact_dir='job_artifacts', progress_interval=0.5,
+                 sync_interval=5.0):
+        self.get_engine = get_engine
+        self.max_workers = max_workers
+        self.artifact_dir = os.path.abspath(artifact_dir)
+        self.progress_interval = progress_interval
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._executor = None
+        self._futures = {}  # job id -> Future, for jobs submitted by this process
+        self._publishers = {}  # kind -> (apply, latest_only), see publish()
+        self._sync_lock = threading.Lock()
+        self._next_sync = 0.0
+        self._synced_until = None  # finished_at of the newest job seen by sync()
+        self._started_at = _now()
+        self._applied = set()  # Ids of succeeded jobs whose results this process has installed
+        self._latest = {}  # latest_only kind -> finished_at of the installed result
+
+    def _pool(self):
+        # Created on first use so importing the app does not start processes.
+        # Spawned (not forked) children do not inherit the app's threads or DB connections.
+        with self._lock:
+            if self._executor is None:
+                database_url = self.get_engine().url.render_as_string(hide_password=False)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=(database_url, self.progress_interval, self.artifact_dir)
+                )
+            return self._executor
+
+    def submit(self, kind, fn, params=None, on_done=None):
+        """Queue ``fn`` and return the new job id; ``on_done(payload)`` runs here on success"""
+        job_id = str(uuid.uuid4())
+        with self.get_engine().begin() as conn:
+            conn.execute(insert(_jobs).values(
+                id=job_id, kind=kind, status='queued', progress=0.0, message='Queued',
+                cancel_requested=False, created_at=_now(), owner=_process_owner()
+            ))
+        future = self._pool().submit(_run_job, job_id, fn, params or {})
+        with self._lock:
+            self._futures[job_id] = future
+        future.add_done_callback(lambda f: self._finished(job_id, kind, f, on_done))
+        print(f"🛠️ Job {kind} {job_id} queued")
+        return job_id
+
+    def cancel(self, job_id):
+        """Request cancellation; returns False if the job is unknown or already finished"""
+        with self.get_engine().begin() as conn:
+            requested = conn.execute(
+                update(_jobs).where(_jobs.c.id == job_id).where(_jobs.c.status.in_(ACTIVE_STATUSES))
+                .values(cancel_requested=True, message='Cancelling')
+            ).rowcount
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is not None:
+            future.cancel()  # Only succeeds while queued; running jobs stop at their next progress()
+        return requested == 1
+
+    def wait(self, job_id, timeout=None):
+        """Block until a job submitted by this process has been recorded as finished"""
+        with self._lock:
+            future = self._futures.get(job_id)
+        deadline = time.monotonic() + timeout if timeout else None
+        while future is not None and job_id in self._futures:
+            if deadline and time.monotonic() > deadline:
+                raise TimeoutError(f"Job {job_id} did not finish within {timeout}s")
+            time.sleep(0.05)
+
+    def _finished(self, job_id, kind, future, on_done):
+        values = {'finished_at': _now()}
+        if future.cancelled() or isinstance(future.exception(), JobCancelled):
+            values.update(status='cancelled', message='Cancelled')
+        elif future.exception() is not None:
+            values.update(status='failed', message='Failed', error=str(future.exception()))
+        else:
+            output = future.result()
+            try:
+                if on_done is not None:
+                    on_done(output.payload)
+                values.update(status='succeeded', progress=100.0, message='Done',
+                              result=json.dumps(output.summary), artifact_path=output.artifact)
+                with self._sync_lock:
+                    # Installed here already; sync() must not apply it again
+                    self._applied.add(job_id)
+                    if self._publishers.get(kind, (None, False))[1]:
+                        self._latest[kind] = values['finished_at']
+            except Exception as e:
+                values.update(status='failed', message='Failed', error=f"Could not apply result: {e}")
+
+        try:
+            with self.get_engine().begin() as conn:
+                conn.execute(update(_jobs).where(_jobs.c.id == job_id).values(**values))
+        except Exception as e:
+            print(f"⚠️ Could not record outcome of job {job_id}: {e}")
+        finally:
+            with self._lock:
+                self._futures.pop(job_id, None)
+        print(f"🛠️ Job {kind} {job_id} {values['status']}")
+
+    def publish(self, kind, apply, latest_only=True):
+        """Install results of ``kind`` jobs that other app processes ran, via sync()
+
+        ``apply(job)`` gets the succeeded training_jobs row and must load the
+        result from shared state (its artifact, the database). With
+        ``latest_only`` only the newest result matters (an index replaces the
+        previous one) and a fresh process installs it on its first sync;
+        otherwise every job finished since this process started is applied in
+        order (imports add to what is there).
+        """
+        self._publishers[kind] = (apply, latest_only)
+
+    def sync(self, force=False):
+        """Apply results of jobs other app processes finished; returns how many were applied
+
+        Cheap to call on every request: it queries at most once per sync_interval
+        and skips if another thread of this process is already syncing.
+        """
+        now = time.monotonic()
+        if not self._publishers or (not force and now < self._next_sync):
+            return 0
+        if not self._sync_lock.acquire(blocking=False):
+            return 0
+        try:
+            self._next_sync = now + self.sync_interval
+            return self._sync()
+        except Exception as e:
+            print(f"⚠️ Could not sync job results: {e}")
+            return 0
+        finally:
+            self._sync_lock.release()
+
+    def _sync(self):
+        succeeded = select(_jobs).where(_jobs.c.status == 'succeeded').where(_jobs.c.kind.in_(list(self._publishers)))
+        first_sync = self._synced_until is None
+        since = self._started_at if first_sync else self._synced_until - SYNC_OVERLAP
+        with self.get_engine().connect() as conn:
+            rows = conn.execute(succeeded.where(_jobs.c.finished_at >= since).order_by(_jobs.c.finished_at)).all()
+            if first_sync:
+                for kind, (_, latest_only) in self._publishers.items():
+                    if latest_only:
+                        newest = conn.execute(succeeded.where(_jobs.c.kind == kind)
+                                              .order_by(_jobs.c.finished_at.desc()).limit(1)).first()
+                        rows = ([newest] if newest is not None else []) + rows
+
+        pending = {}
+        for row in sorted(rows, key=lambda r: _utc(r.finished_at)):
+            latest_only = self._publishers[row.kind][1]
+            installed = self._latest.get(row.kind)
+            if row.id in self._applied or (latest_only and installed and _utc(row.finished_at) <= installed):
+                continue
+            # Only the newest result of a latest_only kind is worth loading
+            pending[row.kind if latest_only else row.id] = row
+        applied = 0
+        for row in sorted(pending.values(), key=lambda r: _utc(r.finished_at)):
+            apply, latest_only = self._publishers[row.kind]
+            self._applied.add(row.id)  # Also on failure: a broken artifact is not retried every sync
+            try:
+                apply(row)
+            except Exception as e:
+                print(f"⚠️ Could not apply result of job {row.kind} {row.id}: {e}")
+                continue
+            if latest_only:
+                self._latest[row.kind] = _utc(row.finished_at)
+            applied += 1
+            print(f"🛠️ Applied result of job {row.kind} {row.id} from another worker")
+        if rows:
+            self._synced_until = max(_utc(row.finished_at) for row in rows)
+        elif first_sync:
+            self._synced_until = self._started_at
+        return applied
+
+    def reap_orphans(self):
+        """Fail queued and running jobs submitted by app processes on this host that no longer exist
+
+        Their outcome can never be recorded. Call at startup; jobs of live
+        processes and of other hosts are left alone. Returns how many were failed.
+        """
+        host = socket.gethostname()
+        orphans = []
+        with self.get_engine().begin() as conn:
+            for job_id, owner in conn.execute(select(_jobs.c.id, _jobs.c.owner)
+                                              .where(_jobs.c.status.in_(ACTIVE_STATUSES))):
+                owner_host, _, pid = (owner or '').rpartition(':')
+                if owner is None or (owner_host == host and
+                                     (not pid.isdigit() or int(pid) == os.getpid() or not _process_alive(int(pid)))):
+                    orphans.append(job_id)
+            for start in range(0, len(orphans), 500):
+                conn.execute(
+                    update(_jobs).where(_jobs.c.id.in_(orphans[start:start + 500]))
+                    .where(_jobs.c.status.in_(ACTIVE_STATUSES))
+                    .values(status='failed', message='Failed', finished_at=_now(),
+                            error='The app process running this job exited before it finished')
+                )
+        return len(orphans)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Job functions (run in the job process)
+
+def build_knowledge_base_job(ctx, documents, retrieval_mode='auto', ann_lists=None):
+    """Build the TF-IDF index; the app installs it with SimpleRAGSystem.load_index_state
+
+    The index is also saved as an .npz artifact that KNOWLEDGE_BASE_PATH can point at.
+    """
+    manager = TrainingDataManager()
+    manager.add_documents(Document(**item) for item in documents)
+    rag = SimpleRAGSystem(manager, retrieval_mode=retrieval_mode, ann_lists=ann_lists)
+    ctx.progress(0, f"Indexing {len(documents)} documents", force=True)
+    rag.build_knowledge_base(progress=lambda fraction: ctx.progress(fraction * 95, 'Indexing documents'))
+    ctx.progress(95, 'Saving index', force=True)
+    path = ctx.artifact_path('.npz')
+    rag.save_index(path)
+    return JobOutput({'documents': len(rag.documents), 'terms': len(rag.vocabulary)},
+                     artifact=path, payload=rag.index_state())
+
+
+def embed_documents_job(ctx, documents, dimensions=384, batch_size=256):
+    """Embed new and changed documents into the embeddings table; the app then reloads them"""
+    manager = TrainingDataManager()
+    manager.add_documents(Document(**item) for item in documents)
+    store = EmbeddingStore(lambda: _engine, DocumentEmbedding.__table__, HashedEmbedder(dimensions), batch_size)
+    ctx.progress(0, f"Checking {len(documents)} documents", force=True)
+    summary = store.sync(manager.get_documents(),
+                         progress=lambda fraction: ctx.progress(fraction * 100, 'Embedding documents'))
+    return JobOutput(summary)
+
+
+def import_examples_job(ctx, file_path, file_format='json'):
+    """Parse uploaded training examples; the app adds them to its data manager
+
+    The parsed examples are also saved as a .json artifact for the other app processes.
+    """
+    ctx.progress(0, f"Reading {os.path.basename(file_path)}", force=True)
+    importer = DataImporter()
+    if file_format == 'csv':
+        examples = importer.import_from_csv(file_path)
+    else:
+        examples = importer.import_from_json(file_path)
+    ctx.progress(90, f"Parsed {len(examples)} examples", force=True)
+    payload = [example.to_dict() for example in examples]
+    path = ctx.artifact_path('.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f)
+    return JobOutput({'imported': len(examples)}, artifact=path, payload=payload)
+
+
+def export_jsonl_job(ctx, examples, chunk_size=1000):
+    """Write examples in fine-tuning JSONL format as the job's artifact"""
+    path = ctx.artifact_path('.jsonl')
+    prep = FinetuningDataPrep()
+    with open(path, 'w', encoding='utf-8') as f:
+        for start in range(0, len(examples), chunk_size):
+            chunk = [TrainingExample(**item) for item in examples[start:start + chunk_size]]
+            for item in prep.prepare_for_training(chunk):
+                f.write(json.dumps(item) + '\n')
+            ctx.progress(100 * (start + len(chunk)) / len(examples), 'Writing examples')
+    return JobOutput({'exported': len(examples)}, artifact=path)
+
+
+def archive_sessions_job(ctx, max_idle_days, batch_size=200):
+    """Move sessions idle for max_idle_days out of the hot chat tables, batch by batch
+
+    Cancelling stops after the current batch; archived batches stay archived.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(days=max_idle_days)
+    with _engine.connect() as conn:
+        idle = conn.execute(select(func.count()).select_from(ChatSession.__table__)
+                            .where(ChatSession.updated_at < cutoff)).scalar()
+    ctx.progress(0, f"Archiving {idle} sessions idle for {max_idle_days} days", force=True)
+    summary = archive_idle_sessions(
+        _engine, max_idle_days, batch_size,
+        progress=lambda s: ctx.progress(100 * s['sessions'] / max(idle, 1), f"Archived {s['sessions']} sessions"))
+    return JobOutput(summary)
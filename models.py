@@ -1,6 +1,8 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import DDL, event, inspect, insert, text, update
 from datetime import datetime, timezone
 import json
+from compression import CompressedText
 
 db = SQLAlchemy()
 
@@ -11,28 +13,32 @@ class ChatSession(db.Model):
     id = db.Column(db.String(36), primary_key=True)  # UUID
     title = db.Column(db.String(100), nullable=False, default='New Chat')
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
-    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), index=True)
     
     # Relationship to messages
     messages = db.relationship('ChatMessage', backref='session', lazy=True, cascade='all, delete-orphan')
     
-    def to_dict(self):
+    def to_dict(self, message_count=None):
+        """Pass message_count if it is known, otherwise the messages are loaded to count them"""
         return {
             'id': self.id,
             'title': self.title,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat(),
-            'message_count': len(self.messages)
+            'message_count': len(self.messages) if message_count is None else message_count
         }
 
 class ChatMessage(db.Model):
     """Model for individual chat messages"""
     __tablename__ = 'chat_messages'
+    __table_args__ = (
+        db.Index('ix_chat_messages_session_id_id', 'session_id', 'id'),  # A session's messages, last id and count
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     session_id = db.Column(db.String(36), db.ForeignKey('chat_sessions.id'), nullable=False)
     role = db.Column(db.String(20), nullable=False)  # 'user' or 'assistant'
-    content = db.Column(db.Text, nullable=False)
+    content = db.Column(CompressedText(), nullable=False)  # Long messages stored compressed on SQLite, see compression.py
     model_used = db.Column(db.String(100), nullable=True)  # AI model used for this message
     timestamp = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     
@@ -45,6 +51,28 @@ class ChatMessage(db.Model):
             'timestamp': self.timestamp.isoformat()
         }
 
+class ArchivedSession(db.Model):
+    """Chat session moved out of the hot tables by retention.archive_idle_sessions"""
+    __tablename__ = 'archived_sessions'
+    
+    id = db.Column(db.String(36), primary_key=True)  # Same id as the chat session it was
+    title = db.Column(db.String(100), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=True)  # Last activity before archiving
+    archived_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), index=True)
+    message_count = db.Column(db.Integer, nullable=False, default=0)
+    messages = db.Column(db.LargeBinary, nullable=False)  # zlib-compressed JSON list of messages
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'title': self.title,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'archived_at': self.archived_at.isoformat() if self.archived_at else None,
+            'message_count': self.message_count
+        }
+
 class UserPreference(db.Model):
     """Model for user preferences"""
     __tablename__ = 'user_preferences'
@@ -71,3 +99,113 @@ class UserPreference(db.Model):
             'theme': self.theme,
             'settings': self.get_settings()
         }
+
+class InflightRequest(db.Model):
+    """Lock row for an upstream call shared by identical concurrent requests"""
+    __tablename__ = 'inflight_requests'
+    
+    key = db.Column(db.String(64), primary_key=True)  # coalesce_key() hash
+    owner = db.Column(db.String(32), nullable=False)  # Leader token
+    status = db.Column(db.String(10), nullable=False, default='pending')  # pending, done, error
+    result = db.Column(db.Text, nullable=True)  # JSON-encoded result
+    created_at = db.Column(db.DateTime, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class RateLimitBucket(db.Model):
+    """Shared rate limiter state: one GCRA timestamp per client key"""
+    __tablename__ = 'rate_limit_buckets'
+    
+    key = db.Column(db.String(128), primary_key=True)  # e.g. "ip:203.0.113.7"
+    tat = db.Column(db.Float, nullable=False)  # Theoretical arrival time (epoch seconds)
+    last_seen = db.Column(db.Float, nullable=False)  # Last allowed request (epoch seconds)
+    allowed = db.Column(db.Boolean, nullable=False, default=True)  # Outcome of the latest check
+
+class TrainingJob(db.Model):
+    """Background job (knowledge-base build, import, export) run by jobs.JobRunner"""
+    __tablename__ = 'training_jobs'
+    
+    id = db.Column(db.String(36), primary_key=True)  # UUID
+    kind = db.Column(db.String(50), nullable=False)  # e.g. 'build_knowledge_base'
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued, running, succeeded, failed, cancelled
+    progress = db.Column(db.Float, nullable=False, default=0.0)  # Percent complete
+    message = db.Column(db.String(255), nullable=True)  # Latest progress message
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    result = db.Column(db.Text, nullable=True)  # JSON summary
+    artifact_path = db.Column(db.String(500), nullable=True)  # File produced by the job, if any
+    owner = db.Column(db.String(255), nullable=True)  # host:pid of the app process that submitted it
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': round(self.progress or 0.0, 1),
+            'message': self.message,
+            'cancel_requested': self.cancel_requested,
+            'result': json.loads(self.result) if self.result else None,
+            'has_artifact': bool(self.artifact_path),
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+class DocumentEmbedding(db.Model):
+    """Embedding of one knowledge-base document, written by embeddings.EmbeddingStore"""
+    __tablename__ = 'embeddings'
+    
+    key = db.Column(db.String(64), primary_key=True)  # embeddings.document_key()
+    title = db.Column(db.String(255), nullable=False)
+    category = db.Column(db.String(100), nullable=False)
+    content_hash = db.Column(db.String(64), nullable=False)  # Re-embedded when this changes
+    model = db.Column(db.String(50), nullable=False)  # HashedEmbedder.signature the vector was computed with
+    vector = db.Column(db.LargeBinary, nullable=False)  # Little-endian float32, model dimensions long
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+
+class ChangeCounter(db.Model):
+    """Counters bumped by changes an indexed MAX lookup cannot see, such as removed chat sessions"""
+    __tablename__ = 'change_counters'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+SESSIONS_REMOVED = 'sessions_removed'  # Chat sessions deleted or archived
+
+# Seeded with the table, so bumping is a plain UPDATE
+event.listen(ChangeCounter.__table__, 'after_create',
+             DDL(f"INSERT INTO change_counters (name, value) VALUES ('{SESSIONS_REMOVED}', 0)"))
+
+def bump_change_counter(connection, name):
+    """Increment a counter in the caller's transaction (``connection`` may also be a Session)"""
+    table = ChangeCounter.__table__
+    if not connection.execute(update(table).where(table.c.name == name).values(value=table.c.value + 1)).rowcount:
+        connection.execute(insert(table).values(name=name, value=1))
+
+def create_missing_indexes(engine):
+    """Create indexes declared here but missing from tables that already exist
+
+    db.create_all only adds indexes together with a new table.
+    """
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+def add_missing_columns(engine):
+    """Add nullable columns declared here but missing from tables that already exist
+
+    db.create_all never alters an existing table.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing and column.nullable:
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} "
+                                         f"{column.type.compile(engine.dialect)}"))
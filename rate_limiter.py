@@ -0,0 +1,132 @@
+"""
+Per-client rate limiting for the AI Chatbot
+Implements the generic cell rate algorithm (GCRA), a token bucket that keeps
+a single timestamp per client, so every check is O(1). A check may spend
+several tokens at once (a batch request costs one per prompt). The database backend
+shares state across gunicorn workers with one atomic upsert per check.
+"""
+
+import math
+import random
+import threading
+import time
+
+from sqlalchemy import and_, case, delete, literal
+from sqlalchemy.dialects import postgresql, sqlite
+
+
+class RateLimitDecision:
+    def __init__(self, allowed, retry_after=0.0):
+        self.allowed = allowed
+        self.retry_after = retry_after  # Seconds until the next request would be allowed
+
+    @property
+    def retry_after_header(self):
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class RateLimiter:
+    """Allows `limit` requests per `window` seconds (bursts included) and at
+    most one request per `min_interval` seconds for each key"""
+
+    def __init__(self, limit, window, min_interval=0.0):
+        self.emission_interval = window / limit  # Seconds "paid" per request
+        self.tolerance = window - self.emission_interval  # Allowed burst
+        self.min_interval = min_interval
+
+    def _tolerance(self, cost):
+        # Burst left for the first of `cost` tokens; negative if cost exceeds the limit
+        return self.tolerance - (cost - 1) * self.emission_interval
+
+    def _decide(self, tat, last_seen, now, cost=1):
+        """Return (allowed, new_tat, retry_after) for the stored state"""
+        start = max(tat, now)
+        wait_burst = start - now - self._tolerance(cost)
+        wait_interval = self.min_interval - (now - last_seen)
+        if wait_burst <= 0 and wait_interval <= 0:
+            return True, start + cost * self.emission_interval, 0.0
+        return False, tat, max(wait_burst, wait_interval)
+
+    def check(self, key, cost=1):
+        raise NotImplementedError
+
+
+class MemoryRateLimiter(RateLimiter):
+    """In-process limiter; state is per worker"""
+
+    def __init__(self, limit, window, min_interval=0.0, max_keys=100000):
+        super().__init__(limit, window, min_interval)
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._state = {}  # key -> (tat, last_seen)
+
+    def check(self, key, cost=1):
+        now = time.time()
+        with self._lock:
+            tat, last_seen = self._state.get(key, (now, float('-inf')))
+            allowed, new_tat, retry_after = self._decide(tat, last_seen, now, cost)
+            if allowed:
+                self._state[key] = (new_tat, now)
+                if len(self._state) > self.max_keys:
+                    self._prune(now)
+        return RateLimitDecision(allowed, retry_after)
+
+    def _prune(self, now):
+        # Keys whose bucket has refilled carry no information
+        for key in [key for key, (tat, last_seen) in self._state.items()
+                    if tat <= now and now - last_seen >= self.min_interval]:
+            del self._state[key]
+
+
+class DatabaseRateLimiter(RateLimiter):
+    """Limiter shared by all workers through a table in the app database
+
+    Each check is a single INSERT ... ON CONFLICT DO UPDATE ... RETURNING, so
+    concurrent workers cannot both spend the same token.
+    """
+
+    def __init__(self, get_engine, table, limit, window, min_interval=0.0, cleanup_probability=0.001):
+        super().__init__(limit, window, min_interval)
+        self.get_engine = get_engine
+        self.table = table
+        self.cleanup_probability = cleanup_probability
+
+    def _upsert(self, dialect_name, key, now, cost):
+        t = self.table
+        if dialect_name == 'postgresql':
+            insert = postgresql.insert
+        elif dialect_name == 'sqlite':
+            insert = sqlite.insert
+        else:
+            raise ValueError(f"Database rate limiting is not supported on {dialect_name}")
+
+        start = case((t.c.tat > now, t.c.tat), else_=literal(now))
+        allowed = and_(
+            start - now <= self._tolerance(cost),
+            literal(now) - t.c.last_seen >= self.min_interval
+        )
+        increment = cost * self.emission_interval
+        fits = self._tolerance(cost) >= 0  # A new client can spend up to the whole limit at once
+        stmt = insert(t).values(key=key, tat=now + increment if fits else now,
+                                last_seen=now if fits else now - self.min_interval, allowed=fits)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[t.c.key],
+            set_={
+                'tat': case((allowed, start + increment), else_=t.c.tat),
+                'last_seen': case((allowed, literal(now)), else_=t.c.last_seen),
+                'allowed': allowed
+            }
+        )
+        return stmt.returning(t.c.tat, t.c.last_seen, t.c.allowed)
+
+    def check(self, key, cost=1):
+        now = time.time()
+        engine = self.get_engine()
+        with engine.begin() as conn:
+            row = conn.execute(self._upsert(engine.dialect.name, key, now, cost)).one()
+            if random.random() < self.cleanup_probability:
+                conn.execute(delete(self.table).where(self.table.c.tat < now - self.min_interval))
+        if row.allowed:
+            return RateLimitDecision(True)
+        _, _, retry_after = self._decide(row.tat, row.last_seen, now, cost)
+        return RateLimitDecision(False, retry_after)
@@ -0,0 +1,151 @@
+"""
+Request timing and sampling profiler for the AI Chatbot
+Collects per-phase spans for a request, renders them as a Server-Timing header
+and can sample the call stack of a request into flame-graph (folded) format
+"""
+
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# Timer of the request currently being handled by this thread / task
+_current_timer = contextvars.ContextVar('request_timer', default=None)
+
+
+class RequestTimer:
+    """Accumulates named spans (in milliseconds) for a single request"""
+
+    def __init__(self, name):
+        self.name = name
+        self.request_id = uuid.uuid4().hex[:12]
+        self.started = time.perf_counter()
+        self.spans = {}  # span name -> [total_ms, count]
+
+    def add(self, span_name, duration_ms):
+        entry = self.spans.setdefault(span_name, [0.0, 0])
+        entry[0] += duration_ms
+        entry[1] += 1
+
+    def total_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def server_timing_header(self):
+        """Render spans using the Server-Timing header syntax"""
+        parts = []
+        for span_name, (duration_ms, count) in self.spans.items():
+            metric = f"{span_name};dur={duration_ms:.1f}"
+            if count > 1:
+                metric += f';desc="{count} calls"'
+            parts.append(metric)
+        parts.append(f"total;dur={self.total_ms():.1f}")
+        return ', '.join(parts)
+
+    def to_dict(self):
+        return {
+            'request_id': self.request_id,
+            'name': self.name,
+            'total_ms': round(self.total_ms(), 1),
+            'spans': {
+                span_name: {'ms': round(duration_ms, 1), 'count': count}
+                for span_name, (duration_ms, count) in self.spans.items()
+            }
+        }
+
+
+def start_timer(name):
+    """Start timing a request; returns a token for stop_timer"""
+    timer = RequestTimer(name)
+    return timer, _current_timer.set(timer)
+
+
+def stop_timer(token):
+    """Detach the timer started with start_timer from the current context"""
+    _current_timer.reset(token)
+
+
+def current_timer():
+    return _current_timer.get()
+
+
+@contextmanager
+def span(span_name):
+    """Time a block of code and record it on the current request timer"""
+    timer = _current_timer.get()
+    if timer is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(span_name, (time.perf_counter() - started) * 1000)
+
+
+def log_slow_request(timer, method, path, status_code, threshold_ms):
+    """Write a structured log line when a request exceeds the threshold"""
+    data = timer.to_dict()
+    if data['total_ms'] < threshold_ms:
+        return False
+    data.update({
+        'event': 'slow_request',
+        'method': method,
+        'path': path,
+        'status': status_code,
+        'threshold_ms': threshold_ms
+    })
+    print(json.dumps(data), flush=True)
+    return True
+
+
+class StackSampler:
+    """Samples the stack of one thread and aggregates it into folded stacks
+
+    The output is the collapsed format understood by flamegraph.pl, speedscope
+    and inferno: one line per unique stack, frames joined by ';' from the root
+    to the leaf, followed by the number of samples.
+    """
+
+    def __init__(self, thread_id=None, interval=0.005):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.samples = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                break
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            key = ';'.join(reversed(stack))
+            self.samples[key] = self.samples.get(key, 0) + 1
+
+    def folded(self):
+        return [f"{stack} {count}" for stack, count in sorted(self.samples.items())]
+
+    def write(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            for line in self.folded():
+                f.write(line + '\n')
+        return path
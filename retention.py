@@ -0,0 +1,110 @@
+"""
+Retention of chat history for the AI Chatbot
+Sessions idle for longer than a configured age are moved out of chat_sessions
+and chat_messages into archived_sessions, one row per session with its
+messages as compressed JSON, so the hot tables (and the search index) only
+hold recent conversations. Each batch of sessions is moved in its own short
+transaction; /load-session and new messages restore an archived session.
+"""
+
+import json
+import zlib
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, insert, select
+
+from models import ChatSession, ChatMessage, ArchivedSession, SESSIONS_REMOVED, bump_change_counter
+
+_sessions = ChatSession.__table__
+_messages = ChatMessage.__table__
+_archive = ArchivedSession.__table__
+
+
+def _timestamp(value):
+    return value.isoformat() if value else None
+
+
+def _pack(messages):
+    return zlib.compress(json.dumps(messages, separators=(',', ':')).encode('utf-8'), 6)
+
+
+def _unpack(payload):
+    return json.loads(zlib.decompress(payload).decode('utf-8'))
+
+
+def archive_idle_sessions(engine, max_idle_days, batch_size=200, now=None, progress=None):
+    """Move sessions without activity for ``max_idle_days`` into archived_sessions
+
+    Returns counts of archived sessions and messages and the bytes stored for
+    them. Safe to run while the app serves requests and to repeat after an
+    interruption: a batch is archived and deleted in one transaction.
+    """
+    cutoff = (now or datetime.now(timezone.utc)) - timedelta(days=max_idle_days)
+    summary = {'sessions': 0, 'messages': 0, 'archived_bytes': 0}
+    while True:
+        with engine.begin() as conn:
+            sessions = conn.execute(
+                select(_sessions).where(_sessions.c.updated_at < cutoff)
+                .order_by(_sessions.c.updated_at, _sessions.c.id).limit(batch_size)
+                .with_for_update(skip_locked=True)  # PostgreSQL: leave sessions being written to alone
+            ).all()
+            if not sessions:
+                break
+            session_ids = [row.id for row in sessions]
+            by_session = {session_id: [] for session_id in session_ids}
+            message_ids = []
+            for row in conn.execute(select(_messages).where(_messages.c.session_id.in_(session_ids))
+                                    .order_by(_messages.c.timestamp, _messages.c.id)):
+                message_ids.append(row.id)
+                by_session[row.session_id].append({
+                    'role': row.role,
+                    'content': row.content,
+                    'model_used': row.model_used,
+                    'timestamp': _timestamp(row.timestamp)
+                })
+            archived = []
+            for row in sessions:
+                payload = _pack(by_session[row.id])
+                summary['archived_bytes'] += len(payload)
+                archived.append({
+                    'id': row.id, 'title': row.title, 'created_at': row.created_at,
+                    'updated_at': row.updated_at, 'message_count': len(by_session[row.id]),
+                    'messages': payload
+                })
+            conn.execute(insert(_archive), archived)
+            # By id, so a message stored after the select above stays (and comes back on restore)
+            for start in range(0, len(message_ids), 500):
+                conn.execute(delete(_messages).where(_messages.c.id.in_(message_ids[start:start + 500])))
+            conn.execute(delete(_sessions).where(_sessions.c.id.in_(session_ids)))
+            bump_change_counter(conn, SESSIONS_REMOVED)  # Sidebar versions cannot see the deletion otherwise
+        summary['sessions'] += len(sessions)
+        summary['messages'] += len(message_ids)
+        if progress:
+            progress(summary)
+    return summary
+
+
+def restore_session(conn, session_id, now=None):
+    """Move an archived session back into the hot tables; False if it is not archived
+
+    Runs on the caller's connection, which commits. Messages get new ids and
+    keep their timestamps; the session counts as active again.
+    """
+    row = conn.execute(select(_archive).where(_archive.c.id == session_id).with_for_update()).first()
+    if row is None:
+        return False
+    conn.execute(insert(_sessions).values(
+        id=row.id, title=row.title, created_at=row.created_at,
+        updated_at=now or datetime.now(timezone.utc)
+    ))
+    messages = [{
+        'session_id': row.id,
+        'role': message['role'],
+        'content': message['content'],
+        'model_used': message['model_used'],
+        'timestamp': datetime.fromisoformat(message['timestamp']) if message['timestamp'] else None
+    } for message in _unpack(row.messages)]
+    if messages:
+        conn.execute(insert(_messages), messages)
+    conn.execute(delete(_archive).where(_archive.c.id == session_id))
+    return True
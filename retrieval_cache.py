@@ -0,0 +1,89 @@
+"""
+Retrieval result cache for the AI Chatbot
+A bounded LRU cache whose entries are tagged with the version of the index
+they were computed from. Any change to the index bumps its version, so an
+entry from an older index is never served; it is dropped on lookup instead.
+"""
+
+import sys
+import threading
+from collections import OrderedDict
+
+# Rough per-entry bookkeeping (OrderedDict node, key tuple, value tuple)
+_ENTRY_OVERHEAD = 200
+
+
+def estimate_size(key, value):
+    """Approximate bytes held by a cache entry of strings, numbers and tuples"""
+    size = _ENTRY_OVERHEAD
+    stack = [key, value]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, (tuple, list)):
+            size += sys.getsizeof(item)
+            stack.extend(item)
+        else:
+            size += sys.getsizeof(item)
+    return size
+
+
+class VersionedLRUCache:
+    """Thread-safe LRU cache bounded by entry count and estimated bytes"""
+
+    def __init__(self, max_entries=1024, max_bytes=8 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (version, value, size)
+        self._bytes = 0
+        self._counters = {'hits': 0, 'misses': 0, 'stale': 0, 'evictions': 0}
+
+    def get(self, key, version):
+        """Cached value for key computed at ``version``, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counters['misses'] += 1
+                return None
+            if entry[0] != version:
+                self._remove(key)
+                self._counters['stale'] += 1
+                self._counters['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters['hits'] += 1
+            return entry[1]
+
+    def put(self, key, version, value):
+        size = estimate_size(key, value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (version, value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._counters['evictions'] += 1
+
+    def _remove(self, key):
+        self._bytes -= self._entries.pop(key)[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self._counters['hits'] + self._counters['misses']
+            data = {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hit_rate': round(self._counters['hits'] / lookups, 3) if lookups else 0.0,
+            }
+            data.update(self._counters)
+            return data
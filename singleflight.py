@@ -0,0 +1,211 @@
+"""
+Single-flight request coalescing for the AI Chatbot
+Concurrent callers with the same key wait on one in-flight call and share its
+result (or its error) instead of each issuing their own upstream request
+"""
+
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert, select, update, or_
+from sqlalchemy.exc import IntegrityError
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+class SingleFlightTimeout(Exception):
+    """Raised when a follower gives up waiting for the in-flight call"""
+
+
+class SingleFlightError(Exception):
+    """Raised in followers of another worker's call that failed"""
+
+
+def coalesce_key(model, messages):
+    """Stable key for a model plus whitespace/case-normalised messages"""
+    normalized = [
+        [msg.get('role', ''), _WHITESPACE_RE.sub(' ', str(msg.get('content', ''))).strip().lower()]
+        for msg in messages
+    ]
+    payload = json.dumps([model, normalized], ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """Coalesces identical concurrent calls between threads of one process
+
+    An optional ``backend`` (see DatabaseSingleFlight) extends coalescing to
+    other worker processes; only the local leader talks to it.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.stats = {'calls': 0, 'shared': 0, 'timeouts': 0}
+
+    def do(self, key, fn, timeout=None):
+        with self._lock:
+            self.stats['calls'] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.followers += 1
+                self.stats['shared'] += 1
+
+        if not leader:
+            if not call.done.wait(timeout):
+                with self._lock:
+                    self.stats['timeouts'] += 1
+                raise SingleFlightTimeout(f"Timed out after {timeout}s waiting for in-flight request")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            if self.backend is not None:
+                call.result = self.backend.do(key, fn, timeout)
+            else:
+                call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+class AsyncSingleFlight:
+    """Coalesces identical concurrent calls between tasks of one event loop"""
+
+    def __init__(self):
+        self._calls = {}  # key -> asyncio.Future
+        self.stats = {'calls': 0, 'shared': 0, 'timeouts': 0}
+
+    async def do(self, key, fn, timeout=None):
+        """Await ``fn()`` (a coroutine function) once per key"""
+        self.stats['calls'] += 1
+        future = self._calls.get(key)
+        if future is not None:
+            self.stats['shared'] += 1
+            try:
+                # Shielded so a follower timing out does not cancel the leader
+                return await asyncio.wait_for(asyncio.shield(future), timeout)
+            except asyncio.TimeoutError:
+                self.stats['timeouts'] += 1
+                raise SingleFlightTimeout(f"Timed out after {timeout}s waiting for in-flight request")
+
+        future = self._calls[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await fn()
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved when nobody was waiting
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._calls.pop(key, None)
+
+    def in_flight(self):
+        return len(self._calls)
+
+
+class DatabaseSingleFlight:
+    """Coalesces identical calls across worker processes through a lock table
+
+    The first worker to insert a row for the key runs the call; others poll
+    the row until it is marked done and read the JSON-encoded result. Rows of
+    crashed leaders are taken over once their lease expires.
+    """
+
+    def __init__(self, get_engine, table, poll_interval=0.1, lease=90, linger=60):
+        self.get_engine = get_engine
+        self.table = table
+        self.poll_interval = poll_interval
+        self.lease = lease  # Seconds before a pending row may be taken over
+        self.linger = linger  # Seconds finished rows are kept before cleanup
+
+    def _acquire(self, key, owner):
+        now = datetime.utcnow()
+        values = {'key': key, 'owner': owner, 'status': 'pending', 'result': None,
+                  'created_at': now, 'expires_at': now + timedelta(seconds=self.lease)}
+        t = self.table
+        try:
+            with self.get_engine().begin() as conn:
+                conn.execute(insert(t).values(**values))
+            return True
+        except IntegrityError:
+            pass
+        # Row exists: take it over if it is finished or its leader's lease ran out
+        with self.get_engine().begin() as conn:
+            taken = conn.execute(
+                update(t)
+                .where(t.c.key == key)
+                .where(or_(t.c.status != 'pending', t.c.expires_at < now))
+                .values(**{k: v for k, v in values.items() if k != 'key'})
+            )
+        return taken.rowcount == 1
+
+    def _finish(self, key, owner, status, result):
+        t = self.table
+        now = datetime.utcnow()
+        with self.get_engine().begin() as conn:
+            conn.execute(
+                update(t).where(t.c.key == key).where(t.c.owner == owner)
+                .values(status=status, result=json.dumps(result), expires_at=now)
+            )
+            conn.execute(delete(t).where(t.c.expires_at < now - timedelta(seconds=self.linger)))
+
+    def do(self, key, fn, timeout=None):
+        owner = uuid.uuid4().hex
+        if self._acquire(key, owner):
+            try:
+                result = fn()
+            except Exception as e:
+                self._finish(key, owner, 'error', str(e))
+                raise
+            self._finish(key, owner, 'done', result)
+            return result
+
+        t = self.table
+        deadline = time.monotonic() + timeout if timeout else None
+        while deadline is None or time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            with self.get_engine().connect() as conn:
+                row = conn.execute(select(t.c.status, t.c.result, t.c.expires_at).where(t.c.key == key)).first()
+            if row is None:
+                break
+            if row.status == 'done':
+                result = json.loads(row.result)
+                return tuple(result) if isinstance(result, list) else result
+            if row.status == 'error':
+                raise SingleFlightError(json.loads(row.result))
+            if row.expires_at < datetime.utcnow():
+                break  # Leader died; run the call ourselves
+        else:
+            raise SingleFlightTimeout(f"Timed out after {timeout}s waiting for in-flight request")
+        return fn()
@@ -4,9 +4,27 @@ let currentStats = {};
 // Initialize dashboard when page loads
 document.addEventListener('DOMContentLoaded', function() {
     loadStats();
+    loadJobStatus();
     setupEventListeners();
 });
 
+// Pick up a job that is still running (e.g. after a page reload)
+async function loadJobStatus() {
+    try {
+        const response = await fetch('/train/status');
+        const data = await response.json();
+        setRAGStatus(data.rag_built);
+
+        const active = (data.jobs || []).find(job => ['queued', 'running'].includes(job.status));
+        if (active && active.kind === 'build_knowledge_base') {
+            const job = await pollJob(active.id);
+            setRAGStatus(job.status === 'succeeded');
+        }
+    } catch (error) {
+        console.error('Error loading job status:', error);
+    }
+}
+
 // Setup event listeners
 function setupEventListeners() {
     // CSV Import Form
@@ -306,12 +324,14 @@ async function addDocument() {
     }
 }
 
-// Build RAG knowledge base
+// Build RAG knowledge base (runs as a background job)
 async function buildRAG() {
     try {
-        showAlert('Building RAG knowledge base...', 'info');
-        
-        const response = await fetch('/training/api/rag/build');
+        const response = await fetch('/train', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({job: 'build_knowledge_base'})
+        });
         const data = await response.json();
 
         if (data.error) {
@@ -319,18 +339,75 @@ async function buildRAG() {
             return;
         }
 
-        showAlert(data.message, 'success');
-        
-        // Update RAG status
-        document.getElementById('ragStatus').textContent = 'Built';
-        document.getElementById('ragStatusText').textContent = 'Ready';
-        document.getElementById('ragStatusIcon').className = 'fas fa-database fa-3x mb-3 text-success';
+        showAlert('Building RAG knowledge base...', 'info');
+        const job = await pollJob(data.job.id);
+
+        if (job.status === 'succeeded') {
+            showAlert(`Knowledge base built with ${job.result.documents} documents`, 'success');
+            setRAGStatus(true);
+        } else if (job.status === 'cancelled') {
+            showAlert('Knowledge base build cancelled', 'warning');
+        } else {
+            showAlert('Error building RAG: ' + (job.error || 'job failed'), 'error');
+        }
 
     } catch (error) {
         showAlert('Error building RAG: ' + error.message, 'error');
     }
 }
 
+function setRAGStatus(built) {
+    document.getElementById('ragStatus').textContent = built ? 'Built' : 'Not Built';
+    document.getElementById('ragStatusText').textContent = built ? 'Ready' : 'Not Built';
+    document.getElementById('ragStatusIcon').className = `fas fa-database fa-3x mb-3 ${built ? 'text-success' : 'text-muted'}`;
+}
+
+// Background jobs
+let currentJobId = null;
+
+// Poll /train/status until the job finishes, updating the progress bar
+async function pollJob(jobId, interval = 1000) {
+    currentJobId = jobId;
+    const container = document.getElementById('jobProgress');
+    const bar = document.getElementById('jobProgressBar');
+    const label = document.getElementById('jobProgressMessage');
+    container.style.display = 'block';
+
+    try {
+        while (true) {
+            const response = await fetch(`/train/status?job_id=${encodeURIComponent(jobId)}`);
+            const data = await response.json();
+            if (data.error) {
+                throw new Error(data.error);
+            }
+
+            const job = data.job;
+            bar.style.width = `${job.progress}%`;
+            bar.textContent = `${Math.round(job.progress)}%`;
+            label.textContent = job.message || job.status;
+
+            if (!['queued', 'running'].includes(job.status)) {
+                return job;
+            }
+            await new Promise(resolve => setTimeout(resolve, interval));
+        }
+    } finally {
+        currentJobId = null;
+        container.style.display = 'none';
+    }
+}
+
+async function cancelCurrentJob() {
+    if (!currentJobId) {
+        return;
+    }
+    const response = await fetch(`/train/jobs/${encodeURIComponent(currentJobId)}/cancel`, {method: 'POST'});
+    const data = await response.json();
+    if (data.error) {
+        showAlert('Error: ' + data.error, 'error');
+    }
+}
+
 // Test RAG system
 async function testRAG() {
     const query = document.getElementById('ragQuery').value.trim();
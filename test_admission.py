@@ -0,0 +1,92 @@
+"""
+Tests for upstream admission control
+"""
+
+import unittest
+import asyncio
+import threading
+import time
+
+from admission import AdmissionController, AdmissionRejected
+
+
+class TestAdmissionController(unittest.TestCase):
+    def test_admits_up_to_limit_immediately(self):
+        controller = AdmissionController('test', max_concurrent=2, max_queue=1)
+        controller.acquire(time.monotonic() + 1)
+        controller.acquire(time.monotonic() + 1)
+        stats = controller.stats()
+        self.assertEqual(stats['active'], 2)
+        self.assertEqual(stats['admitted'], 2)
+    
+    def test_waiter_gets_released_slot(self):
+        controller = AdmissionController('test', max_concurrent=1, max_queue=4)
+        controller.acquire(time.monotonic() + 1)
+        admitted = threading.Event()
+        
+        def waiter():
+            controller.acquire(time.monotonic() + 2)
+            admitted.set()
+        
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        time.sleep(0.05)
+        self.assertEqual(controller.stats()['queue_depth'], 1)
+        controller.release()
+        thread.join()
+        self.assertTrue(admitted.is_set())
+        self.assertEqual(controller.stats()['active'], 1)
+        self.assertGreater(controller.stats()['wait_ms_avg'], 0)
+    
+    def test_sheds_when_deadline_passes(self):
+        controller = AdmissionController('test', max_concurrent=1, max_queue=4)
+        controller.acquire(time.monotonic() + 1)
+        started = time.monotonic()
+        with self.assertRaises(AdmissionRejected):
+            controller.acquire(time.monotonic() + 0.1)
+        self.assertLess(time.monotonic() - started, 0.5)
+        stats = controller.stats()
+        self.assertEqual(stats['shed_deadline'], 1)
+        self.assertEqual(stats['queue_depth'], 0)
+    
+    def test_sheds_immediately_when_queue_full(self):
+        controller = AdmissionController('test', max_concurrent=1, max_queue=1)
+        controller.acquire(time.monotonic() + 1)
+        thread = threading.Thread(target=lambda: self.assertRaises(AdmissionRejected, controller.acquire, time.monotonic() + 0.3))
+        thread.start()
+        time.sleep(0.05)
+        with self.assertRaises(AdmissionRejected):
+            controller.check_capacity()
+        with self.assertRaises(AdmissionRejected):
+            controller.acquire(time.monotonic() + 5)
+        thread.join()
+        self.assertEqual(controller.stats()['shed_queue_full'], 2)
+    
+    def test_slot_context_releases(self):
+        controller = AdmissionController('test', max_concurrent=1, max_queue=0)
+        with controller.slot(time.monotonic() + 1):
+            self.assertEqual(controller.stats()['active'], 1)
+        self.assertEqual(controller.stats()['active'], 0)
+    
+    def test_async_waiters_share_slots_with_threads(self):
+        controller = AdmissionController('test', max_concurrent=1, max_queue=2)
+        controller.acquire(time.monotonic() + 1)
+        
+        async def main():
+            waiter = asyncio.create_task(controller.acquire_async(time.monotonic() + 2))
+            cancelled = asyncio.create_task(controller.acquire_async(time.monotonic() + 2))
+            await asyncio.sleep(0.05)
+            cancelled.cancel()
+            await asyncio.sleep(0.05)
+            self.assertEqual(controller.stats()['queue_depth'], 1)
+            # Released from another thread, handed straight to the waiting task
+            threading.Timer(0.05, controller.release).start()
+            await waiter
+        
+        asyncio.run(main())
+        stats = controller.stats()
+        self.assertEqual((stats['active'], stats['admitted'], stats['queue_depth']), (1, 2, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
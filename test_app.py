@@ -0,0 +1,478 @@
+"""
+Tests for the chat endpoints of the Flask app
+The upstream API is replaced by a mock so no network access is needed
+"""
+
+import unittest
+import os
+import sys
+import json
+import tempfile
+import shutil
+import time
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch, MagicMock
+
+import requests
+
+TEST_DIR = tempfile.mkdtemp()
+os.environ.update({
+    'DATABASE_URL': f"sqlite:///{os.path.join(TEST_DIR, 'test_chatbot.db')}",
+    'FLASK_ENV': 'development',
+    'API_PROVIDER': 'openrouter',
+    'OPENROUTER_API_KEY': 'test-key',
+    'RATE_LIMIT_BACKEND': 'off',
+})
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import app as chatbot_app
+from models import db, ChatSession, ChatMessage, ArchivedSession, ChangeCounter
+from retention import archive_idle_sessions
+from database import ReadRouter
+from history_search import install_search_index
+from sqlalchemy import create_engine, text
+from rate_limiter import MemoryRateLimiter
+from admission import AdmissionController
+from training_system import Document, TrainingExample
+
+
+def fake_upstream(*args, **kwargs):
+    """Echo the last user message back like an OpenAI-compatible server"""
+    response = MagicMock(status_code=200, headers={})
+    content = kwargs['json']['messages'][-1]['content']
+    response.json.return_value = {'choices': [{'message': {'content': f"echo: {content}"}}]}
+    return response
+
+
+class ChatAppTestCase(unittest.TestCase):
+    """Base class with a test client and a clean database"""
+    
+    def setUp(self):
+        self.client = chatbot_app.app.test_client()
+        self.upstream = patch('app.requests.post', side_effect=fake_upstream)
+        self.mock_post = self.upstream.start()
+        with chatbot_app.app.app_context():
+            ChatMessage.query.delete()
+            ChatSession.query.delete()
+            ArchivedSession.query.delete()
+            db.session.commit()
+    
+    def tearDown(self):
+        self.upstream.stop()
+
+
+class TestChat(ChatAppTestCase):
+    def test_chat_returns_response_and_server_timing(self):
+        response = self.client.post('/chat', json={'message': 'hello'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['response'], 'echo: hello')
+        self.assertIn('upstream;dur=', response.headers['Server-Timing'])
+        
+        history = self.client.get('/history').json['history']
+        self.assertEqual([msg['role'] for msg in history], ['user', 'assistant'])
+
+
+class TestRateLimit(ChatAppTestCase):
+    def test_over_limit_client_gets_fast_429(self):
+        limiter = MemoryRateLimiter(limit=2, window=3600)
+        with patch('app.rate_limiter', limiter), patch('app.RATE_LIMIT_TRUSTED_PROXIES', 1):
+            headers = {'X-Forwarded-For': '203.0.113.7'}
+            statuses = [self.client.post('/chat', json={'message': 'hi'}, headers=headers).status_code for _ in range(3)]
+            other_client = self.client.post('/chat', json={'message': 'hi'}, headers={'X-Forwarded-For': '198.51.100.1'})
+        
+        self.assertEqual(statuses, [200, 200, 429])
+        self.assertEqual(other_client.status_code, 200)
+        self.assertEqual(self.mock_post.call_count, 3)  # The rejected request never reached upstream
+    
+    def test_rejection_carries_retry_after(self):
+        limiter = MemoryRateLimiter(limit=1, window=60)
+        with patch('app.rate_limiter', limiter):
+            self.client.post('/chat', json={'message': 'one'})
+            response = self.client.post('/chat', json={'message': 'two'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers['Retry-After'], '60')
+    
+    def test_forwarded_for_is_ignored_without_trusted_proxies(self):
+        limiter = MemoryRateLimiter(limit=1, window=60)
+        with patch('app.rate_limiter', limiter):
+            self.client.post('/chat', json={'message': 'one'}, headers={'X-Forwarded-For': '203.0.113.7'})
+            spoofed = self.client.post('/chat', json={'message': 'two'}, headers={'X-Forwarded-For': '198.51.100.1'})
+        self.assertEqual(spoofed.status_code, 429)
+    
+    def test_batch_is_charged_per_prompt(self):
+        with patch('app.rate_limiter', MemoryRateLimiter(limit=1, window=3600)), \
+             patch('app.batch_rate_limiter', MemoryRateLimiter(limit=5, window=3600)):
+            first = self.client.post('/chat/batch', json={'prompts': ['a', 'b', 'c']})
+            first.get_data()
+            second = self.client.post('/chat/batch', json={'prompts': ['d', 'e', 'f']})
+            small = self.client.post('/chat/batch', json={'prompts': ['g', 'h']})
+            small.get_data()
+            chat = self.client.post('/chat', json={'message': 'hi'})  # Separate budget
+        self.assertEqual([first.status_code, second.status_code, small.status_code], [200, 429, 200])
+        self.assertEqual(chat.status_code, 200)
+        self.assertEqual(self.mock_post.call_count, 6)
+
+class TestAdmissionControl(ChatAppTestCase):
+    def test_overloaded_upstream_returns_fast_503(self):
+        controller = AdmissionController('test upstream', max_concurrent=1, max_queue=0)
+        controller.acquire(time.monotonic() + 1)  # Upstream slot held by another request
+        with patch('app.upstream_admission', controller):
+            response = self.client.post('/chat', json={'message': 'hello'})
+        
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response.headers)
+        self.mock_post.assert_not_called()
+        
+        metrics = self.client.get('/metrics').json
+        self.assertIn('queue_depth', metrics['admission'])
+
+class TestRequestDeadline(ChatAppTestCase):
+    def test_upstream_timeout_and_retries_fit_the_budget(self):
+        self.mock_post.side_effect = requests.exceptions.Timeout()
+        started = time.monotonic()
+        response = self.client.post('/chat', json={'message': 'hello'}, headers={'X-Request-Timeout': '6'})
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('timed out', response.json['response'])
+        self.assertLess(time.monotonic() - started, 6)
+        # First attempt is capped by the budget; the 2s backoff plus another
+        # attempt would not fit, so there is exactly one retry at most
+        self.assertLessEqual(self.mock_post.call_args_list[0].kwargs['timeout'], 6)
+        self.assertLessEqual(self.mock_post.call_count, 2)
+
+class TestChatBatch(ChatAppTestCase):
+    def read_ndjson(self, response):
+        return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    
+    def test_batch_streams_results_without_persisting(self):
+        response = self.client.post('/chat/batch', json={
+            'prompts': ['first', {'id': 'faq-2', 'message': 'second'}]
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        
+        lines = self.read_ndjson(response)
+        results = {line['id']: line for line in lines if 'summary' not in line}
+        self.assertEqual(results[0]['response'], 'echo: first')
+        self.assertEqual(results['faq-2']['response'], 'echo: second')
+        self.assertEqual(lines[-1]['summary']['count'], 2)
+        
+        with chatbot_app.app.app_context():
+            self.assertEqual(ChatSession.query.count(), 0)
+    
+    def test_batch_persist_creates_one_session_per_prompt(self):
+        response = self.client.post('/chat/batch', json={'prompts': ['a', 'b', 'c'], 'persist': True})
+        lines = self.read_ndjson(response)
+        self.assertEqual(len({line['session_id'] for line in lines if 'session_id' in line}), 3)
+        with chatbot_app.app.app_context():
+            self.assertEqual(ChatSession.query.count(), 3)
+    
+    def test_batch_rejects_invalid_prompts(self):
+        self.assertEqual(self.client.post('/chat/batch', json={'prompts': []}).status_code, 400)
+        self.assertEqual(self.client.post('/chat/batch', json={'prompts': ['ok', '  ']}).status_code, 400)
+
+
+class TestTrainingJobs(ChatAppTestCase):
+    def tearDown(self):
+        chatbot_app.training_manager.clear_documents()
+        chatbot_app.rag_system.clear()
+        super().tearDown()
+    
+    def test_build_job_reports_progress_until_done(self):
+        self.assertEqual(self.client.post('/train', json={}).status_code, 400)  # Nothing to index yet
+        
+        for i in range(3):
+            chatbot_app.training_manager.add_document(Document(f'refund policy {i} details', f'Policy {i}'))
+        started = self.client.post('/train', json={'job': 'build_knowledge_base'})
+        self.assertEqual(started.status_code, 202)
+        job_id = started.json['job']['id']
+        
+        deadline = time.monotonic() + 60
+        status = self.client.get(f'/train/status?job_id={job_id}').json
+        while status['status'] in ('queued', 'running') and time.monotonic() < deadline:
+            time.sleep(0.1)
+            status = self.client.get(f'/train/status?job_id={job_id}').json
+        
+        self.assertEqual(status['status'], 'succeeded')
+        self.assertEqual(status['job']['progress'], 100.0)
+        self.assertTrue(status['rag_built'])
+        self.assertEqual(self.client.get('/train/status').json['status'], 'idle')
+        self.assertEqual(self.client.post(f'/train/jobs/{job_id}/cancel').status_code, 404)
+    
+    def test_build_with_category_keeps_other_categories(self):
+        chatbot_app.training_manager.add_document(Document('refund policy details', 'Refunds', 'billing'))
+        chatbot_app.training_manager.add_document(Document('password reset steps', 'Passwords', 'account'))
+        started = self.client.post('/train', json={'job': 'build_knowledge_base', 'category': 'billing'})
+        chatbot_app.job_runner.wait(started.json['job']['id'], timeout=60)
+        
+        self.assertEqual(sorted(doc.category for doc in chatbot_app.rag_system.documents), ['account', 'billing'])
+
+
+class TestFAQShortCircuit(ChatAppTestCase):
+    def setUp(self):
+        super().setUp()
+        chatbot_app.training_manager.add_example(TrainingExample(
+            'What is your refund policy?', 'Refunds are issued within 30 days of purchase.', 'support'))
+    
+    def tearDown(self):
+        chatbot_app.training_manager.clear_examples()
+        super().tearDown()
+    
+    def test_matching_question_is_answered_without_upstream(self):
+        before = self.client.get('/metrics').json['faq']
+        response = self.client.post('/chat', json={'message': 'what is your refund policy'})
+        self.assertEqual(response.json['response'], 'Refunds are issued within 30 days of purchase.')
+        self.assertEqual(response.json['model_used'], 'faq')
+        self.mock_post.assert_not_called()
+        
+        with chatbot_app.app.app_context():
+            self.assertEqual([msg.model_used for msg in ChatMessage.query.all()], ['faq', 'faq'])
+        
+        other = self.client.post('/chat', json={'message': 'Can I pay for my order with a gift card?'})
+        self.assertEqual(other.json['response'], 'echo: Can I pay for my order with a gift card?')
+        with chatbot_app.app.app_context():
+            self.assertEqual(other.json['model_used'], ChatMessage.query.order_by(ChatMessage.id.desc()).first().model_used)
+        after = self.client.get('/metrics').json['faq']
+        self.assertEqual(after['hits'] - before['hits'], 1)
+        self.assertEqual(after['lookups'] - before['lookups'], 1)  # The follow-up is not matched
+    
+    def test_follow_up_in_a_conversation_goes_upstream(self):
+        first = self.client.post('/chat', json={'message': 'Do you ship abroad?'})
+        self.assertEqual(first.json['response'], 'echo: Do you ship abroad?')
+        
+        before = self.client.get('/metrics').json['faq']
+        follow_up = self.client.post('/chat', json={'message': 'what is your refund policy'})
+        self.assertEqual(follow_up.json['response'], 'echo: what is your refund policy')
+        self.assertEqual(self.mock_post.call_count, 2)
+        self.assertEqual(self.client.get('/metrics').json['faq']['lookups'], before['lookups'])
+    
+    def test_batch_reports_faq_answers_as_faq(self):
+        response = self.client.post('/chat/batch', json={'prompts': [
+            {'id': 'faq', 'message': 'what is your refund policy', 'model': 'some/model'},
+            {'id': 'upstream', 'message': 'Do you ship abroad?', 'model': 'some/model'}]})
+        results = {r['id']: r for r in map(json.loads, response.get_data(as_text=True).splitlines()) if 'id' in r}
+        self.assertEqual(results['faq']['model_used'], 'faq')
+        self.assertEqual(results['upstream']['model_used'], 'some/model')
+
+
+def tearDownModule():
+    chatbot_app.job_runner.shutdown()
+    with chatbot_app.app.app_context():
+        db.engine.dispose()
+    shutil.rmtree(TEST_DIR, ignore_errors=True)
+
+
+class TestHistorySearch(ChatAppTestCase):
+    def add_session(self, session_id, *contents):
+        with chatbot_app.app.app_context():
+            db.session.add(ChatSession(id=session_id, title=f'Chat {session_id}'))
+            for content in contents:
+                db.session.add(ChatMessage(session_id=session_id, role='user', content=content))
+            db.session.commit()
+    
+    def search(self, **params):
+        response = self.client.get('/history/search', query_string=params)
+        self.assertEqual(response.status_code, 200)
+        return response.json
+    
+    def test_ranked_sessions_with_snippets(self):
+        self.add_session('pasta', 'How long should I boil pasta?', 'Pasta pasta pasta, with <b>salt</b>')
+        self.add_session('tax', 'When is the tax deadline?')
+        self.add_session('mixed', 'Pasta recipes and tax returns')
+        
+        results = self.search(q='pasta')['results']
+        self.assertEqual([r['session_id'] for r in results], ['pasta', 'mixed'])
+        self.assertEqual(results[0]['matches'], 2)
+        self.assertIn('<mark>Pasta</mark>', results[0]['snippet'])
+        self.assertIn('&lt;b&gt;salt&lt;/b&gt;', results[0]['snippet'])  # Message text is escaped
+        self.assertEqual([r['session_id'] for r in self.search(q='tax ret')['results']], ['mixed'])  # Last word as prefix
+        self.assertEqual(self.search(q='"; DROP TABLE chat_messages')['results'], [])
+    
+    def test_index_follows_inserts_and_deletes(self):
+        self.add_session('one', 'quarterly report draft')
+        self.assertEqual(len(self.search(q='report')['results']), 1)
+        self.client.delete('/delete-session/one')
+        self.assertEqual(self.search(q='report')['results'], [])
+    
+    def test_keyset_pagination(self):
+        for i in range(7):
+            self.add_session(f's{i}', 'invoice ' * (i + 1))
+        page = self.search(q='invoice', limit=3)
+        seen = [r['session_id'] for r in page['results']]
+        while page['next_cursor']:
+            page = self.search(q='invoice', limit=3, cursor=page['next_cursor'])
+            seen += [r['session_id'] for r in page['results']]
+        self.assertEqual(sorted(seen), [f's{i}' for i in range(7)])
+        self.assertEqual(len(seen), 7)
+        
+        self.assertEqual(self.client.get('/history/search').status_code, 400)
+        self.assertEqual(self.client.get('/history/search?q=invoice&cursor=bogus').status_code, 400)
+    
+    def test_pages_hold_while_matching_messages_arrive(self):
+        for i in range(6):
+            self.add_session(f's{i}', ' '.join(['python'] * (i + 1) + ['notes'] * (6 - i)))
+        for i in range(30):
+            self.add_session(f'other{i}', f'gardening notes {i}')
+        first = self.search(q='python', limit=3)
+        self.assertEqual([r['session_id'] for r in first['results']], ['s5', 's4', 's3'])
+        
+        # New matches change every BM25 score; they join a new search, not this one's later pages
+        for i in range(34):
+            self.add_session(f'new{i}', f'python tips {i} ' * (i % 4 + 1))
+        second = self.search(q='python', limit=3, cursor=first['next_cursor'])
+        self.assertEqual([r['session_id'] for r in second['results']], ['s2', 's1', 's0'])
+        self.assertIsNone(second['next_cursor'])
+        self.assertEqual(len(self.search(q='python', limit=100)['results']), 40)
+    
+    def test_missing_index_is_reported_not_a_500(self):
+        with chatbot_app.app.app_context():
+            with db.engine.begin() as conn:
+                for statement in ('DROP TRIGGER chat_messages_fts_insert', 'DROP TRIGGER chat_messages_fts_delete',
+                                  'DROP TRIGGER chat_messages_fts_update', 'DROP TABLE chat_messages_fts'):
+                    conn.execute(text(statement))
+            try:
+                response = self.client.get('/history/search?q=invoice')
+            finally:
+                install_search_index(db.engine)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json['error'], 'search index not installed; run init_db')
+
+
+class TestArchivedSessions(ChatAppTestCase):
+    def archive_chat(self, message):
+        """Chat once, then archive every session"""
+        self.client.post('/chat', json={'message': message})
+        with chatbot_app.app.app_context():
+            session_id = ChatSession.query.one().id
+            archive_idle_sessions(db.engine, 1, now=datetime.now(timezone.utc) + timedelta(days=2))
+        return session_id
+    
+    def test_load_session_restores_archived_session(self):
+        session_id = self.archive_chat('remember the blue notebook')
+        with chatbot_app.app.app_context():
+            self.assertIsNone(db.session.get(ChatSession, session_id))
+        
+        response = self.client.get(f'/load-session/{session_id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([m['content'] for m in response.json['messages']],
+                         ['remember the blue notebook', 'echo: remember the blue notebook'])
+        self.assertEqual(self.client.get('/load-session/unknown').status_code, 404)
+    
+    def test_chat_continues_archived_session_with_its_history(self):
+        self.archive_chat('first question')
+        self.client.post('/chat', json={'message': 'second question'})
+        upstream_messages = self.mock_post.call_args.kwargs['json']['messages']
+        self.assertIn({'role': 'user', 'content': 'first question'}, upstream_messages)
+        with chatbot_app.app.app_context():
+            self.assertEqual(ArchivedSession.query.count(), 0)
+            self.assertEqual(ChatMessage.query.count(), 4)
+    
+    def test_delete_archived_session(self):
+        session_id = self.archive_chat('to be deleted')
+        self.assertEqual(self.client.delete(f'/delete-session/{session_id}').status_code, 200)
+        self.assertEqual(self.client.get(f'/load-session/{session_id}').status_code, 404)
+    
+    def test_archive_job_rejects_invalid_max_idle_days(self):
+        for value in (True, False, 0, -3, 1.5, '30'):
+            response = self.client.post('/train', json={'job': 'archive_sessions', 'max_idle_days': value})
+            self.assertEqual(response.status_code, 400, value)
+            self.assertEqual(response.json['error'], 'max_idle_days must be a positive integer')
+
+
+class TestDeltaSync(ChatAppTestCase):
+    def chat(self, message):
+        self.assertEqual(self.client.post('/chat', json={'message': message}).status_code, 200)
+    
+    def test_load_session_etag_and_since(self):
+        self.chat('first')
+        with chatbot_app.app.app_context():
+            session_id = ChatSession.query.one().id
+        
+        full = self.client.get(f'/load-session/{session_id}')
+        self.assertEqual(full.status_code, 200)
+        self.assertEqual(full.json['message_count'], 2)
+        self.assertEqual(full.json['last_message_id'], full.json['messages'][-1]['id'])
+        
+        unchanged = self.client.get(f'/load-session/{session_id}', headers={'If-None-Match': full.headers['ETag']})
+        self.assertEqual(unchanged.status_code, 304)
+        self.assertEqual(unchanged.data, b'')
+        
+        self.chat('second')
+        delta = self.client.get(f"/load-session/{session_id}?since={full.json['last_message_id']}",
+                                headers={'If-None-Match': full.headers['ETag']})
+        self.assertEqual(delta.status_code, 200)
+        self.assertEqual([m['content'] for m in delta.json['messages']], ['second', 'echo: second'])
+        self.assertEqual(delta.json['message_count'], 4)
+        self.assertNotEqual(delta.headers['ETag'], full.headers['ETag'])
+    
+    def test_history_etag_follows_sidebar(self):
+        self.chat('first')
+        full = self.client.get('/history')
+        self.assertEqual(len(full.json['history']), 2)
+        self.assertEqual(full.json['sessions'][0]['message_count'], 2)
+        etag = full.headers['ETag']
+        self.assertEqual(self.client.get('/history', headers={'If-None-Match': etag}).status_code, 304)
+        
+        with chatbot_app.app.app_context():  # Another session appears in the sidebar
+            db.session.add(ChatSession(id='other', title='Other'))
+            db.session.commit()
+        changed = self.client.get(f"/history?since={full.json['last_message_id']}", headers={'If-None-Match': etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.json['history'], [])
+        self.assertEqual(len(changed.json['sessions']), 2)
+        
+        # Deleting an older session changes neither the newest update nor the newest message
+        self.chat('second')
+        etag = self.client.get('/history').headers['ETag']
+        self.assertEqual(self.client.delete('/delete-session/other').status_code, 200)
+        deleted = self.client.get('/history', headers={'If-None-Match': etag})
+        self.assertEqual(deleted.status_code, 200)
+        self.assertEqual(len(deleted.json['sessions']), 1)
+
+
+class TestReadReplica(ChatAppTestCase):
+    """History reads go to a replica database (here a second SQLite file with other data)"""
+    
+    def setUp(self):
+        super().setUp()
+        self.replica_engine = create_engine(f"sqlite:///{os.path.join(TEST_DIR, 'replica.db')}")
+        db.metadata.create_all(self.replica_engine, tables=[ChatSession.__table__, ChatMessage.__table__,
+                                                            ChangeCounter.__table__])
+        install_search_index(self.replica_engine)
+        with self.replica_engine.begin() as conn:
+            conn.execute(ChatMessage.__table__.delete())
+            conn.execute(ChatSession.__table__.delete())
+            conn.execute(ChatSession.__table__.insert().values(id='replicated', title='From the replica'))
+            conn.execute(ChatMessage.__table__.insert().values(session_id='replicated', role='user',
+                                                               content='replicated walrus facts'))
+        router = ReadRouter(db.session, self.replica_engine, sticky_seconds=60)
+        self.router = patch.object(chatbot_app, 'read_router', router)
+        self.router.start()
+    
+    def tearDown(self):
+        self.router.stop()
+        self.replica_engine.dispose()
+        super().tearDown()
+    
+    def test_reads_use_replica(self):
+        response = self.client.get('/load-session/replicated')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['messages'][0]['content'], 'replicated walrus facts')
+        results = self.client.get('/history/search?q=walrus').json['results']
+        self.assertEqual([r['session_id'] for r in results], ['replicated'])
+    
+    def test_writes_go_to_primary_and_client_reads_its_writes(self):
+        self.client.post('/chat', json={'message': 'primary only'})
+        with chatbot_app.app.app_context():
+            session_id = ChatSession.query.one().id
+        history = self.client.get('/history').json  # Within sticky_seconds of the write: primary
+        self.assertEqual([s['id'] for s in history['sessions']], [session_id])
+        
+        other_client = chatbot_app.app.test_client()  # Never wrote: replica, falling back for a missing session
+        self.assertEqual(other_client.get(f'/load-session/{session_id}').status_code, 200)
+        self.assertEqual([s['id'] for s in other_client.get('/history').json['sessions']], ['replicated'])
+
+
+if __name__ == '__main__':
+    unittest.main()
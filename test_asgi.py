@@ -0,0 +1,171 @@
+"""
+Tests for the asyncio serving path in asgi.py
+The upstream API is served by an httpx mock transport
+"""
+
+import unittest
+import os
+import asyncio
+import json
+import shutil
+import time
+from unittest.mock import patch
+
+import httpx
+from flask import has_app_context
+from sqlalchemy import create_engine
+
+from test_app import ChatAppTestCase, TEST_DIR
+import app as chatbot_app
+import asgi
+from models import db, ChatSession, ChatMessage, ChangeCounter, RateLimitBucket
+from training_system import TrainingExample
+from admission import AdmissionController
+from database import ReadRouter
+from rate_limiter import DatabaseRateLimiter
+
+
+def setUpModule():
+    # test_app removes its database directory when its own module finishes
+    os.makedirs(TEST_DIR, exist_ok=True)
+    with chatbot_app.app.app_context():
+        db.create_all()
+
+
+class TestAsyncChat(ChatAppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.upstream_calls = 0
+        self.upstream_delay = 0.0
+
+    async def _upstream(self, request):
+        self.upstream_calls += 1
+        await asyncio.sleep(self.upstream_delay)
+        content = json.loads(request.content)['messages'][-1]['content']
+        return httpx.Response(200, json={'choices': [{'message': {'content': f"echo: {content}"}}]})
+
+    def run_client(self, scenario):
+        async def main():
+            upstream = httpx.AsyncClient(transport=httpx.MockTransport(self._upstream))
+            transport = httpx.ASGITransport(app=asgi.application)
+            with patch('asgi.http_client', return_value=upstream):
+                async with httpx.AsyncClient(transport=transport, base_url='http://testserver') as client:
+                    return await scenario(client)
+        return asyncio.run(main())
+
+    def test_chat_persists_and_keeps_the_session_cookie(self):
+        async def scenario(client):
+            first = await client.post('/chat', json={'message': 'hello'})
+            second = await client.post('/chat', json={'message': 'again'})
+            history = await client.get('/history')  # Served by the Flask app
+            return first, second, history
+
+        first, second, history = self.run_client(scenario)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.json()['response'], 'echo: hello')
+        self.assertIn('upstream;dur=', first.headers['Server-Timing'])
+        self.assertIn('set-cookie', first.headers)
+        self.assertNotIn('set-cookie', second.headers)
+        self.assertEqual([msg['role'] for msg in history.json()['history']], ['user', 'assistant'] * 2)
+
+    def test_chat_keeps_reads_on_primary_with_a_replica(self):
+        replica_engine = create_engine(f"sqlite:///{os.path.join(TEST_DIR, 'asgi_replica.db')}")
+        db.metadata.create_all(replica_engine, tables=[ChatSession.__table__, ChatMessage.__table__,
+                                                       ChangeCounter.__table__])
+
+        async def scenario(client):
+            chat = await client.post('/chat', json={'message': 'hello'})
+            history = await client.get('/history')
+            return chat, history
+
+        try:
+            with patch.object(chatbot_app, 'read_router', ReadRouter(db.session, replica_engine, sticky_seconds=60)):
+                chat, history = self.run_client(scenario)
+        finally:
+            replica_engine.dispose()
+        self.assertIn('set-cookie', chat.headers)
+        # The empty replica would hide the chat; the client just wrote, so it reads the primary
+        self.assertEqual([msg['content'] for msg in history.json()['history']], ['hello', 'echo: hello'])
+        self.assertEqual(len(history.json()['sessions']), 1)
+
+    def test_database_rate_limiter_rejects_over_limit_chats(self):
+        async def scenario(client):
+            return [await client.post('/chat', json={'message': f'question {i}'}) for i in range(3)]
+
+        with chatbot_app.app.app_context():
+            db.session.query(RateLimitBucket).delete()
+            db.session.commit()
+        limiter = DatabaseRateLimiter(lambda: db.engine, RateLimitBucket.__table__, limit=2, window=3600)
+        with patch.object(chatbot_app, 'rate_limiter', limiter):
+            responses = self.run_client(scenario)
+        self.assertEqual([r.status_code for r in responses], [200, 200, 429])
+        self.assertIn('Retry-After', responses[2].headers)
+        self.assertEqual(self.upstream_calls, 2)
+
+    def test_chat_syncs_job_results_like_the_flask_view(self):
+        in_app_context = []
+        job_runner = chatbot_app.job_runner
+        with patch.object(job_runner, 'sync', side_effect=lambda: in_app_context.append(has_app_context())):
+            response = self.run_client(lambda client: client.post('/chat', json={'message': 'hello'}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(in_app_context, [True])
+
+    def test_faq_answers_report_the_stored_label(self):
+        async def scenario(client):
+            faq = await client.post('/chat', json={'message': 'what is your refund policy'})
+            upstream = await client.post('/chat', json={'message': 'Do you ship abroad?'})
+            return faq, upstream
+
+        chatbot_app.training_manager.add_example(TrainingExample(
+            'What is your refund policy?', 'Refunds are issued within 30 days of purchase.', 'support'))
+        try:
+            faq, upstream = self.run_client(scenario)
+        finally:
+            chatbot_app.training_manager.clear_examples()
+        self.assertEqual(faq.json()['response'], 'Refunds are issued within 30 days of purchase.')
+        with chatbot_app.app.app_context():
+            stored = [msg.model_used for msg in ChatMessage.query.order_by(ChatMessage.id)]
+        self.assertEqual(stored[::2], ['faq', upstream.json()['model_used']])
+        self.assertEqual(faq.json()['model_used'], 'faq')
+        self.assertEqual(self.upstream_calls, 1)
+
+    def test_waiting_chats_do_not_block_each_other(self):
+        self.upstream_delay = 0.5
+
+        async def scenario(client):
+            started = time.monotonic()
+            responses = await asyncio.gather(*[
+                client.post('/chat', json={'message': f'question {i}'}, headers={'Cookie': ''})
+                for i in range(10)
+            ])
+            return responses, time.monotonic() - started
+
+        with patch('app.upstream_admission', AdmissionController('test upstream', 10, 10)):
+            responses, elapsed = self.run_client(scenario)
+        self.assertEqual([r.status_code for r in responses], [200] * 10)
+        self.assertEqual(self.upstream_calls, 10)
+        self.assertLess(elapsed, 3)  # Far below 10 x 0.5s served one at a time
+
+    def test_validation_and_overload_match_the_flask_view(self):
+        async def scenario(client):
+            empty = await client.post('/chat', json={'message': '  '})
+            with patch('app.upstream_admission', AdmissionController('test upstream', 0, 0)):
+                overloaded = await client.post('/chat', json={'message': 'hi'})
+            return empty, overloaded
+
+        empty, overloaded = self.run_client(scenario)
+        self.assertEqual(empty.status_code, 400)
+        self.assertEqual(empty.json()['error'], 'Empty message')
+        self.assertEqual(overloaded.status_code, 503)
+        self.assertIn('Retry-After', overloaded.headers)
+        self.assertEqual(self.upstream_calls, 0)
+
+
+def tearDownModule():
+    with chatbot_app.app.app_context():
+        db.engine.dispose()
+    shutil.rmtree(TEST_DIR, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
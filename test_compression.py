@@ -0,0 +1,127 @@
+"""
+Tests for transparent compression of stored chat messages
+"""
+
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from compression import CompressedText, compress_text, decompress_text, compress_existing_messages, zstandard
+from history_search import install_search_index, search_sessions
+from models import db, ChatSession, ChatMessage
+
+ANSWER = ' '.join(f"Step {i}: knead the dough, let it rest and fold it again." for i in range(40))
+
+
+class TestCompressText(unittest.TestCase):
+    def test_round_trip(self):
+        stored = compress_text(ANSWER, 'zlib', min_bytes=100)
+        self.assertIsInstance(stored, bytes)
+        self.assertLess(len(stored), len(ANSWER) / 3)
+        self.assertEqual(decompress_text(stored), ANSWER)
+        self.assertEqual(decompress_text(memoryview(stored)), ANSWER)  # As some drivers return blobs
+
+    def test_short_and_incompressible_values_stay_text(self):
+        self.assertEqual(compress_text('short answer', 'zlib', min_bytes=100), 'short answer')
+        noise = os.urandom(600).hex()[:600]
+        self.assertIsInstance(compress_text(ANSWER, 'none', min_bytes=0), str)
+        self.assertEqual(decompress_text(compress_text(noise, 'zlib', min_bytes=100)), noise)
+        self.assertEqual(decompress_text('plain'), 'plain')
+        self.assertIsNone(decompress_text(None))
+
+    def test_unknown_codec_and_format(self):
+        with self.assertRaises(ValueError):
+            CompressedText('lzma')
+        with self.assertRaises(ValueError):
+            decompress_text(b'?not compressed')
+
+    @unittest.skipIf(zstandard is None, 'zstandard not installed')
+    def test_zstd_round_trip(self):
+        stored = compress_text(ANSWER, 'zstd', min_bytes=100, level=3)
+        self.assertTrue(stored.startswith(b's'))
+        self.assertEqual(decompress_text(stored), ANSWER)
+
+    @unittest.skipIf(zstandard is not None, 'zstandard installed')
+    def test_zstd_without_package(self):
+        with self.assertRaises(RuntimeError):
+            compress_text(ANSWER, 'zstd', min_bytes=100)
+
+
+class TestCompressedMessages(unittest.TestCase):
+    """Messages stored through the model on SQLite, with the search index installed"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.test_dir, 'messages.db')}")
+        db.metadata.create_all(self.engine, tables=[ChatSession.__table__, ChatMessage.__table__])
+        install_search_index(self.engine)
+        self.column_type = ChatMessage.__table__.c.content.type
+        self.settings = patch.multiple(self.column_type, codec='zlib', min_bytes=200)
+        self.settings.start()
+
+    def tearDown(self):
+        self.settings.stop()
+        self.engine.dispose()
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def add_messages(self, *contents):
+        with Session(self.engine) as session:
+            session.add(ChatSession(id='bread', title='Bread'))
+            messages = [ChatMessage(session_id='bread', role='assistant', content=c) for c in contents]
+            session.add_all(messages)
+            session.commit()
+            return [message.id for message in messages]
+
+    def stored_types(self):
+        with self.engine.connect() as conn:
+            return conn.execute(text("SELECT typeof(content) FROM chat_messages ORDER BY id")).scalars().all()
+
+    def test_long_messages_stored_compressed_and_read_back(self):
+        long_id, short_id = self.add_messages(ANSWER, 'Thanks!')
+        self.assertEqual(self.stored_types(), ['blob', 'text'])
+        with Session(self.engine) as session:
+            self.assertEqual(session.get(ChatMessage, long_id).to_dict()['content'], ANSWER)
+            self.assertEqual(session.get(ChatMessage, short_id).content, 'Thanks!')
+
+    def test_search_reads_compressed_messages(self):
+        message_id, = self.add_messages(ANSWER)
+        with self.engine.connect() as conn:
+            results, _ = search_sessions(conn, 'knead')
+            self.assertEqual([r['message_id'] for r in results], [message_id])
+            self.assertIn('<mark>knead</mark>', results[0]['snippet'])
+        with Session(self.engine) as session:
+            session.delete(session.get(ChatMessage, message_id))
+            session.commit()
+        with self.engine.connect() as conn:
+            self.assertEqual(search_sessions(conn, 'knead')[0], [])
+
+    def test_migration_compresses_existing_rows(self):
+        with patch.object(self.column_type, 'codec', 'none'):
+            self.add_messages(ANSWER, ANSWER + ' Bake it.', 'Thanks!')
+        self.assertEqual(self.stored_types(), ['text', 'text', 'text'])
+
+        batches = []
+        stats = compress_existing_messages(self.engine, self.column_type, batch_size=1, progress=batches.append)
+        self.assertEqual(stats['rewritten'], 2)
+        self.assertEqual(len(batches), 2)  # Short messages are not even read
+        self.assertLess(stats['bytes_after'], stats['bytes_before'] / 3)
+        self.assertEqual(self.stored_types(), ['blob', 'blob', 'text'])
+        self.assertEqual(compress_existing_messages(self.engine, self.column_type)['rewritten'], 0)
+        with self.engine.connect() as conn:
+            self.assertEqual(len(search_sessions(conn, 'bake')[0]), 1)  # Index still matches the text
+
+        with patch.object(self.column_type, 'codec', 'none'):  # And back, e.g. before a downgrade
+            compress_existing_messages(self.engine, self.column_type)
+        self.assertEqual(self.stored_types(), ['text', 'text', 'text'])
+
+
+if __name__ == '__main__':
+    unittest.main()
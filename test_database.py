@@ -0,0 +1,77 @@
+"""
+Tests for database engine profiles and read routing
+"""
+
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+import time
+
+from sqlalchemy import create_engine, text
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import engine_options, tune_sqlite, ReadRouter
+
+
+class Holder(dict):
+    """Stands in for flask.g (attributes plus pop)"""
+    __getattr__ = dict.get
+    __setattr__ = dict.__setitem__
+
+
+class TestEngineOptions(unittest.TestCase):
+    def test_postgres_profile(self):
+        options = engine_options('postgresql://db/chatbot', pool_size=8, max_overflow=4, statement_timeout_ms=2500)
+        self.assertEqual((options['pool_size'], options['max_overflow']), (8, 4))
+        self.assertTrue(options['pool_pre_ping'])
+        self.assertEqual(options['connect_args'], {'options': '-c statement_timeout=2500'})
+        self.assertNotIn('connect_args', engine_options('postgresql://db/chatbot', statement_timeout_ms=0))
+
+    def test_sqlite_profile(self):
+        self.assertEqual(engine_options('sqlite:///chatbot.db', sqlite_busy_timeout_ms=2000),
+                         {'connect_args': {'timeout': 2.0}})
+
+    def test_sqlite_pragmas_on_every_connection(self):
+        test_dir = tempfile.mkdtemp()
+        engine = create_engine(f"sqlite:///{os.path.join(test_dir, 'tuned.db')}")
+        try:
+            self.assertTrue(tune_sqlite(engine, busy_timeout_ms=1234))
+            for _ in range(2):
+                with engine.connect() as conn:
+                    self.assertEqual(conn.execute(text('PRAGMA journal_mode')).scalar(), 'wal')
+                    self.assertEqual(conn.execute(text('PRAGMA synchronous')).scalar(), 1)  # NORMAL
+                    self.assertEqual(conn.execute(text('PRAGMA busy_timeout')).scalar(), 1234)
+                engine.dispose()
+        finally:
+            engine.dispose()
+            shutil.rmtree(test_dir, ignore_errors=True)
+        self.assertFalse(tune_sqlite(create_engine('sqlite://')))
+
+
+class TestReadRouter(unittest.TestCase):
+    def setUp(self):
+        self.primary = object()
+        self.replica_engine = create_engine('sqlite://')
+
+    def test_without_replica_everything_reads_from_primary(self):
+        router = ReadRouter(self.primary)
+        self.assertFalse(router.enabled)
+        self.assertIs(router.session(Holder()), self.primary)
+
+    def test_replica_session_per_request_and_sticky_after_write(self):
+        router = ReadRouter(self.primary, self.replica_engine, sticky_seconds=5)
+        holder = Holder()
+        read = router.session(holder)
+        self.assertIsNot(read, self.primary)
+        self.assertIs(read.get_bind(), self.replica_engine)
+        self.assertIs(router.session(holder, last_write=time.time() - 60), read)
+        self.assertIs(router.session(holder, last_write=time.time()), self.primary)
+        ReadRouter.close(holder)
+        self.assertNotIn('replica_session', holder)
+
+
+if __name__ == '__main__':
+    unittest.main()
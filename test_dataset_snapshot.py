@@ -0,0 +1,69 @@
+"""
+Tests for the binary snapshot of the bundled datasets
+Snapshots are compiled from the real datasets/ directory into a temporary file
+"""
+
+import unittest
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from dataset_snapshot import DATASETS_DIR, build_snapshot, compile_datasets, load_snapshot
+from training_system import TrainingDataManager, SimpleRAGSystem
+
+
+class TestDatasetSnapshot(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.temp_dir = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.temp_dir, 'bundled.snapshot')
+        with patch('builtins.print'):
+            cls.meta = build_snapshot(cls.path)
+        cls.examples, cls.documents, _ = compile_datasets(DATASETS_DIR)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.temp_dir)
+
+    def test_round_trip(self):
+        snapshot = load_snapshot(self.path)
+        self.assertEqual(list(snapshot.categories), ['business', 'education', 'healthcare', 'legal', 'technology'])
+        self.assertEqual([(e.input_text, e.output_text, e.category) for e in snapshot.examples()], self.examples)
+        self.assertEqual([doc.to_dict() for doc in snapshot.documents], [doc.to_dict() for doc in self.documents])
+
+    def test_csv_and_json_copies_are_merged(self):
+        # Every domain ships the same examples as CSV and JSON
+        self.assertEqual(self.meta['examples'], len(set(self.examples)))
+        self.assertEqual(len(self.meta['sources']), 20)
+
+    def test_seed_installs_prebuilt_index(self):
+        manager = TrainingDataManager()
+        rag_system = SimpleRAGSystem(manager)
+        load_snapshot(self.path).seed(manager, rag_system)
+        self.assertEqual(len(manager.get_examples('legal')), 5)
+        self.assertTrue(rag_system.is_trained)
+
+        rebuilt = SimpleRAGSystem(manager)
+        with patch('builtins.print'):
+            rebuilt.build_knowledge_base()
+        query = "How does legal research work?"
+        self.assertEqual([doc.title for doc in rag_system.retrieve_relevant_docs(query)],
+                         [doc.title for doc in rebuilt.retrieve_relevant_docs(query)])
+
+    def test_snapshot_without_index(self):
+        path = os.path.join(self.temp_dir, 'no_index.snapshot')
+        build_snapshot(path, include_index=False)
+        manager = TrainingDataManager()
+        rag_system = SimpleRAGSystem(manager)
+        load_snapshot(path).seed(manager, rag_system)
+        self.assertEqual(len(manager.documents), 10)
+        self.assertFalse(rag_system.is_trained)
+
+    def test_rejects_other_files(self):
+        with self.assertRaises(ValueError):
+            load_snapshot(os.path.join(DATASETS_DIR, 'legal_training.json'))
+
+
+if __name__ == '__main__':
+    unittest.main()
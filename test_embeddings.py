@@ -0,0 +1,88 @@
+"""
+Tests for hashed document embeddings and their table
+Vectors are stored in a temporary SQLite database
+"""
+
+import unittest
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from sqlalchemy import create_engine, select, update
+
+from models import DocumentEmbedding
+from embeddings import HashedEmbedder, EmbeddingStore, document_keys
+from training_system import Document
+
+_table = DocumentEmbedding.__table__
+
+
+class TestHashedEmbedder(unittest.TestCase):
+    def test_vectors_are_deterministic_and_normalised(self):
+        embedder = HashedEmbedder(dimensions=64)
+        vectors = embedder.embed(["Boiling pasta in salted water", "the of and", "Boiling pasta in salted water"])
+        self.assertEqual((vectors.shape, vectors.dtype), ((3, 64), np.float32))
+        self.assertAlmostEqual(float(np.linalg.norm(vectors[0])), 1.0, places=5)
+        self.assertFalse(vectors[1].any())  # Only stop words: no features
+        np.testing.assert_array_equal(vectors[0], vectors[2])
+
+    def test_char_ngrams_relate_word_forms(self):
+        embedder = HashedEmbedder()
+        query, related, unrelated = embedder.embed(["learning algorithms", "learned algorithm", "boiling pasta"])
+        self.assertGreater(query @ related, query @ unrelated + 0.3)
+
+
+class TestEmbeddingStore(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.temp_dir, 'embeddings.db')}")
+        _table.create(self.engine)
+        self.store = EmbeddingStore(lambda: self.engine, _table, HashedEmbedder(dimensions=128), batch_size=2)
+        self.documents = [
+            Document("Cooking pasta requires boiling water", "Cooking Doc", "food"),
+            Document("Machine learning algorithms learn from data", "ML Doc", "tech"),
+            Document("Neural networks are trained with gradient descent", "NN Doc", "tech"),
+        ]
+
+    def tearDown(self):
+        self.engine.dispose()
+        shutil.rmtree(self.temp_dir)
+
+    def test_sync_only_embeds_new_and_changed_documents(self):
+        self.assertEqual(self.store.sync(self.documents), {'embedded': 3, 'unchanged': 0, 'removed': 0})
+        self.assertEqual(self.store.sync(self.documents), {'embedded': 0, 'unchanged': 3, 'removed': 0})
+
+        self.documents[0].content = "Cooking rice requires boiling water"
+        self.assertEqual(self.store.sync(self.documents[:2]), {'embedded': 1, 'unchanged': 1, 'removed': 1})
+        with self.engine.connect() as conn:
+            self.assertEqual(len(conn.execute(select(_table.c.key)).all()), 2)
+
+    def test_other_model_is_re_embedded(self):
+        self.store.sync(self.documents)
+        with self.engine.begin() as conn:
+            conn.execute(update(_table).values(model='hash-v1-64-c34'))
+        self.assertEqual(self.store.load(), 0)
+        self.assertEqual(self.store.sync(self.documents)['embedded'], 3)
+
+    def test_duplicate_titles_get_their_own_rows(self):
+        twins = [Document("first", "Same", "general"), Document("second", "Same", "general")]
+        self.assertEqual(len(set(document_keys(twins))), 2)
+        self.assertEqual(self.store.sync(twins)['embedded'], 2)
+
+    def test_load_and_search(self):
+        self.assertEqual(self.store.search("anything"), [])
+        self.store.sync(self.documents)
+        self.assertEqual(self.store.load(), 3)
+
+        rows, matrix = self.store._loaded
+        self.assertFalse(matrix.flags.owndata or matrix.flags.writeable)  # A view of the joined blobs
+        results = self.store.search("how do machine learning algorithms learn?", top_k=2)
+        self.assertEqual(results[0]['title'], 'ML Doc')
+        self.assertEqual(results[0]['category'], 'tech')
+        self.assertEqual(self.store.search("boiling water")[0]['title'], 'Cooking Doc')
+        self.assertTrue(all(r['category'] == 'tech' for r in self.store.search("boiling water", category='tech')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,190 @@
+"""
+Tests for the background job runner
+Jobs run in real worker processes against a temporary SQLite database
+"""
+
+import unittest
+import os
+import json
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine, select
+
+from models import TrainingJob, DocumentEmbedding, ChatSession, ChatMessage, ArchivedSession, ChangeCounter
+from jobs import (
+    JobRunner, JobOutput, build_knowledge_base_job, embed_documents_job, import_examples_job, export_jsonl_job,
+    archive_sessions_job
+)
+from embeddings import HashedEmbedder, EmbeddingStore
+from training_system import TrainingDataManager, SimpleRAGSystem, TrainingExample
+
+
+def slow_job(ctx, steps):
+    for step in range(steps):
+        ctx.progress(100 * step / steps, f'Step {step}', force=True)
+        time.sleep(0.1)
+    return JobOutput({'steps': steps})
+
+
+def failing_job(ctx):
+    raise ValueError('bad input')
+
+
+class TestJobRunner(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.temp_dir = tempfile.mkdtemp()
+        cls.engine = create_engine(f"sqlite:///{os.path.join(cls.temp_dir, 'jobs.db')}")
+        TrainingJob.__table__.create(cls.engine)
+        DocumentEmbedding.__table__.create(cls.engine)
+        for model in (ChatSession, ChatMessage, ArchivedSession, ChangeCounter):
+            model.__table__.create(cls.engine)
+        cls.runner = JobRunner(lambda: cls.engine, max_workers=1,
+                               artifact_dir=os.path.join(cls.temp_dir, 'artifacts'), progress_interval=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.runner.shutdown()
+        cls.engine.dispose()
+        shutil.rmtree(cls.temp_dir, ignore_errors=True)
+
+    def job(self, job_id):
+        with self.engine.connect() as conn:
+            return conn.execute(select(TrainingJob.__table__).where(TrainingJob.__table__.c.id == job_id)).one()
+
+    def test_build_job_installs_index_in_app_process(self):
+        rag = SimpleRAGSystem(TrainingDataManager())
+        documents = [{'title': f'Doc {i}', 'content': f'topic{i} shared words', 'category': 'general'} for i in range(50)]
+        job_id = self.runner.submit('build_knowledge_base', build_knowledge_base_job,
+                                    {'documents': documents}, on_done=rag.load_index_state)
+        self.runner.wait(job_id, timeout=60)
+
+        job = self.job(job_id)
+        self.assertEqual(job.status, 'succeeded')
+        self.assertEqual(job.progress, 100.0)
+        self.assertEqual(json.loads(job.result)['documents'], 50)
+        self.assertTrue(rag.is_trained)
+        self.assertEqual(rag.retrieve_relevant_docs('topic7')[0].title, 'Doc 7')
+
+    def test_embed_job_fills_embeddings_table(self):
+        store = EmbeddingStore(lambda: self.engine, DocumentEmbedding.__table__, HashedEmbedder(128))
+        documents = [{'title': f'Doc {i}', 'content': f'topic{i} shared words', 'category': 'general'} for i in range(20)]
+        job_id = self.runner.submit('embed_documents', embed_documents_job,
+                                    {'documents': documents, 'dimensions': 128}, on_done=lambda _: store.load())
+        self.runner.wait(job_id, timeout=60)
+
+        self.assertEqual(self.job(job_id).status, 'succeeded')
+        self.assertEqual(json.loads(self.job(job_id).result), {'embedded': 20, 'unchanged': 0, 'removed': 0})
+        self.assertEqual(len(store), 20)
+        self.assertEqual(store.search('topic7')[0]['title'], 'Doc 7')
+
+    def test_export_job_writes_artifact(self):
+        examples = [{'input_text': f'q{i}', 'output_text': f'a{i}'} for i in range(5)]
+        job_id = self.runner.submit('export_jsonl', export_jsonl_job, {'examples': examples})
+        self.runner.wait(job_id, timeout=60)
+
+        job = self.job(job_id)
+        self.assertEqual(job.status, 'succeeded')
+        with open(job.artifact_path, encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), 5)
+
+    def test_archive_job_moves_idle_sessions(self):
+        with self.engine.begin() as conn:
+            for session_id, idle_days in (('old', 40), ('new', 1)):
+                last_active = datetime.now(timezone.utc) - timedelta(days=idle_days)
+                conn.execute(ChatSession.__table__.insert().values(id=session_id, title=session_id,
+                                                                   updated_at=last_active))
+                conn.execute(ChatMessage.__table__.insert().values(session_id=session_id, role='user', content='hi'))
+        job_id = self.runner.submit('archive_sessions', archive_sessions_job, {'max_idle_days': 30})
+        self.runner.wait(job_id, timeout=60)
+
+        job = self.job(job_id)
+        self.assertEqual(job.status, 'succeeded')
+        self.assertEqual(json.loads(job.result)['sessions'], 1)
+        with self.engine.connect() as conn:
+            self.assertEqual(conn.execute(select(ArchivedSession.id)).scalars().all(), ['old'])
+            self.assertEqual(conn.execute(select(ChatSession.id)).scalars().all(), ['new'])
+
+    def test_cancel_stops_running_job(self):
+        job_id = self.runner.submit('slow', slow_job, {'steps': 100})
+        deadline = time.monotonic() + 60
+        while self.job(job_id).status != 'running' and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertTrue(self.runner.cancel(job_id))
+        self.runner.wait(job_id, timeout=60)
+
+        job = self.job(job_id)
+        self.assertEqual(job.status, 'cancelled')
+        self.assertLess(job.progress, 100)
+        self.assertFalse(self.runner.cancel(job_id))
+
+    def test_other_processes_pick_up_results(self):
+        def worker():
+            # Stands in for another gunicorn worker sharing the database and artifact directory
+            runner = JobRunner(lambda: self.engine, artifact_dir=self.runner.artifact_dir)
+            rag, manager = SimpleRAGSystem(TrainingDataManager()), TrainingDataManager()
+
+            def add_examples(job):
+                with open(job.artifact_path, encoding='utf-8') as f:
+                    manager.add_examples(TrainingExample(**item) for item in json.load(f))
+
+            runner.publish('build_knowledge_base', lambda job: rag.load_index(job.artifact_path))
+            runner.publish('import_examples', add_examples, latest_only=False)
+            return runner, rag, manager
+
+        early, early_rag, early_manager = worker()
+        upload = os.path.join(self.temp_dir, 'examples.json')
+        with open(upload, 'w', encoding='utf-8') as f:
+            json.dump([{'input_text': 'q1', 'output_text': 'a1'}, {'input_text': 'q2', 'output_text': 'a2'}], f)
+        documents = [{'title': f'Doc {i}', 'content': f'topic{i} shared words', 'category': 'general'} for i in range(10)]
+        for kind, fn, params in (('import_examples', import_examples_job, {'file_path': upload}),
+                                 ('build_knowledge_base', build_knowledge_base_job, {'documents': documents})):
+            self.runner.wait(self.runner.submit(kind, fn, params), timeout=60)
+
+        self.assertEqual(early.sync(force=True), 2)
+        self.assertEqual(early_rag.retrieve_relevant_docs('topic7')[0].title, 'Doc 7')
+        self.assertEqual([example.input_text for example in early_manager.get_examples()], ['q1', 'q2'])
+        self.assertEqual(early.sync(force=True), 0)
+        self.assertEqual(early.sync(), 0)  # Throttled
+
+        late, late_rag, late_manager = worker()  # Started after the jobs: only the newest index matters
+        self.assertEqual(late.sync(force=True), 1)
+        self.assertEqual(len(late_rag.documents), 10)
+        self.assertEqual(len(late_manager.get_examples()), 0)
+
+    def test_reap_orphans_fails_jobs_of_exited_processes(self):
+        host = socket.gethostname()
+        exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+        exited.wait()
+        owners = {'exited': f'{host}:{exited.pid}', 'alive': f'{host}:{os.getppid()}',
+                  'elsewhere': 'other-host:1', 'unknown': None}
+        with self.engine.begin() as conn:
+            for job_id, owner in owners.items():
+                conn.execute(TrainingJob.__table__.insert().values(
+                    id=job_id, kind='slow', status='running', progress=10.0, cancel_requested=False, owner=owner))
+
+        self.assertEqual(self.runner.reap_orphans(), 2)
+        self.assertEqual({job_id: self.job(job_id).status for job_id in owners},
+                         {'exited': 'failed', 'alive': 'running', 'elsewhere': 'running', 'unknown': 'failed'})
+        self.assertIn('exited', self.job('exited').error)
+        with self.engine.begin() as conn:
+            conn.execute(TrainingJob.__table__.delete().where(TrainingJob.__table__.c.id.in_(list(owners))))
+
+    def test_failed_job_records_error(self):
+        job_id = self.runner.submit('failing', failing_job)
+        self.runner.wait(job_id, timeout=60)
+
+        job = self.job(job_id)
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('bad input', job.error)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+"""
+Tests for the GCRA rate limiter backends
+"""
+
+import unittest
+import os
+import tempfile
+import shutil
+import threading
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+
+from rate_limiter import MemoryRateLimiter, DatabaseRateLimiter
+from models import RateLimitBucket
+
+
+class RateLimiterContract:
+    """Behaviour shared by every backend; subclasses provide make_limiter()"""
+    
+    def test_allows_burst_up_to_limit_then_rejects(self):
+        limiter = self.make_limiter(limit=3, window=60)
+        with patch('rate_limiter.time.time', return_value=1000.0):
+            results = [limiter.check('client').allowed for _ in range(4)]
+            rejected = limiter.check('client')
+        self.assertEqual(results, [True, True, True, False])
+        self.assertFalse(rejected.allowed)
+        self.assertAlmostEqual(rejected.retry_after, 20.0)
+        self.assertEqual(rejected.retry_after_header, '20')
+    
+    def test_tokens_refill_over_time(self):
+        limiter = self.make_limiter(limit=2, window=10)
+        with patch('rate_limiter.time.time', return_value=1000.0):
+            self.assertTrue(limiter.check('client').allowed)
+            self.assertTrue(limiter.check('client').allowed)
+            self.assertFalse(limiter.check('client').allowed)
+        with patch('rate_limiter.time.time', return_value=1005.0):
+            self.assertTrue(limiter.check('client').allowed)
+            self.assertFalse(limiter.check('client').allowed)
+    
+    def test_min_interval_and_independent_keys(self):
+        limiter = self.make_limiter(limit=100, window=100, min_interval=2)
+        with patch('rate_limiter.time.time', return_value=1000.0):
+            self.assertTrue(limiter.check('a').allowed)
+            decision = limiter.check('a')
+            self.assertFalse(decision.allowed)
+            self.assertAlmostEqual(decision.retry_after, 2.0)
+            self.assertTrue(limiter.check('b').allowed)
+        with patch('rate_limiter.time.time', return_value=1002.0):
+            self.assertTrue(limiter.check('a').allowed)
+
+    
+    def test_cost_spends_several_tokens(self):
+        limiter = self.make_limiter(limit=10, window=100)
+        with patch('rate_limiter.time.time', return_value=1000.0):
+            self.assertTrue(limiter.check('client', cost=6).allowed)
+            decision = limiter.check('client', cost=6)
+            self.assertFalse(decision.allowed)
+            self.assertAlmostEqual(decision.retry_after, 20.0)  # Two more tokens to refill
+            self.assertTrue(limiter.check('client', cost=4).allowed)
+            self.assertFalse(limiter.check('client').allowed)
+            self.assertFalse(limiter.check('other', cost=11).allowed)  # More than the whole limit
+
+
+class TestMemoryRateLimiter(RateLimiterContract, unittest.TestCase):
+    def make_limiter(self, limit, window, min_interval=0):
+        return MemoryRateLimiter(limit, window, min_interval)
+
+
+class TestDatabaseRateLimiter(RateLimiterContract, unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.test_dir, 'limits.db')}")
+        RateLimitBucket.__table__.create(self.engine)
+    
+    def tearDown(self):
+        self.engine.dispose()
+        shutil.rmtree(self.test_dir)
+    
+    def make_limiter(self, limit, window, min_interval=0):
+        return DatabaseRateLimiter(lambda: self.engine, RateLimitBucket.__table__, limit, window, min_interval)
+    
+    def test_concurrent_workers_never_exceed_limit(self):
+        # Two limiter instances stand in for two gunicorn workers
+        workers = [self.make_limiter(limit=10, window=3600) for _ in range(2)]
+        allowed = []
+        
+        def hammer(limiter):
+            for _ in range(15):
+                allowed.append(limiter.check('client').allowed)
+        
+        threads = [threading.Thread(target=hammer, args=(limiter,)) for limiter in workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sum(allowed), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
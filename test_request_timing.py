@@ -0,0 +1,59 @@
+"""
+Tests for request span timing and the stack sampling profiler
+"""
+
+import unittest
+import time
+import threading
+
+from request_timing import RequestTimer, StackSampler, start_timer, stop_timer, span, current_timer
+
+
+class TestRequestTiming(unittest.TestCase):
+    def test_spans_recorded_on_current_timer(self):
+        timer, token = start_timer('/chat')
+        try:
+            self.assertIs(current_timer(), timer)
+            with span('upstream'):
+                time.sleep(0.01)
+            with span('upstream'):
+                pass
+            with span('commit'):
+                pass
+        finally:
+            stop_timer(token)
+        
+        self.assertIsNone(current_timer())
+        self.assertEqual(timer.spans['upstream'][1], 2)
+        self.assertGreaterEqual(timer.spans['upstream'][0], 10)
+        
+        header = timer.server_timing_header()
+        self.assertIn('upstream;dur=', header)
+        self.assertIn('desc="2 calls"', header)
+        self.assertIn('commit;dur=', header)
+        self.assertTrue(header.split(', ')[-1].startswith('total;dur='))
+
+    def test_span_without_timer_is_noop(self):
+        with span('rag'):
+            value = 1
+        self.assertEqual(value, 1)
+
+    def test_stack_sampler_folded_output(self):
+        def busy_wait():
+            end = time.perf_counter() + 0.1
+            while time.perf_counter() < end:
+                pass
+        
+        sampler = StackSampler(threading.get_ident(), interval=0.001).start()
+        busy_wait()
+        sampler.stop()
+        
+        lines = sampler.folded()
+        self.assertGreater(len(lines), 0)
+        stack, count = lines[0].rsplit(' ', 1)
+        self.assertGreater(int(count), 0)
+        self.assertTrue(any('busy_wait' in line for line in lines))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+"""
+Tests for archiving idle chat sessions and restoring them
+"""
+
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine, func, select
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from models import db, ChatSession, ChatMessage, ArchivedSession, ChangeCounter
+from history_search import install_search_index, search_sessions
+from retention import archive_idle_sessions, restore_session
+
+NOW = datetime(2026, 6, 1, tzinfo=timezone.utc)
+
+
+class TestRetention(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.test_dir, 'retention.db')}")
+        db.metadata.create_all(self.engine, tables=[ChatSession.__table__, ChatMessage.__table__,
+                                                    ArchivedSession.__table__, ChangeCounter.__table__])
+        install_search_index(self.engine)
+
+    def tearDown(self):
+        self.engine.dispose()
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def add_session(self, session_id, idle_days, *contents):
+        last_active = NOW - timedelta(days=idle_days)
+        with self.engine.begin() as conn:
+            conn.execute(ChatSession.__table__.insert().values(
+                id=session_id, title=f'Chat {session_id}', created_at=last_active, updated_at=last_active))
+            for i, content in enumerate(contents):
+                conn.execute(ChatMessage.__table__.insert().values(
+                    session_id=session_id, role='user' if i % 2 == 0 else 'assistant', content=content,
+                    model_used='test-model', timestamp=last_active + timedelta(seconds=i)))
+
+    def count(self, table):
+        with self.engine.connect() as conn:
+            return conn.execute(select(func.count()).select_from(table.__table__)).scalar()
+
+    def test_archives_idle_sessions_in_batches(self):
+        for i in range(5):
+            self.add_session(f'old{i}', 120, f'old question {i}', 'old answer')
+        self.add_session('recent', 3, 'recent question')
+
+        batches = []
+        summary = archive_idle_sessions(self.engine, 90, batch_size=2, now=NOW, progress=batches.append)
+        self.assertEqual((summary['sessions'], summary['messages']), (5, 10))
+        self.assertEqual(len(batches), 3)
+        self.assertEqual(self.count(ChatSession), 1)
+        self.assertEqual(self.count(ChatMessage), 1)
+        self.assertEqual(self.count(ArchivedSession), 5)
+        with self.engine.connect() as conn:
+            self.assertEqual(search_sessions(conn, 'old')[0], [])  # Search covers the hot tables only
+        self.assertEqual(archive_idle_sessions(self.engine, 90, now=NOW)['sessions'], 0)
+
+    def test_restore_brings_messages_back(self):
+        self.add_session('old', 120, 'How do I reset my password?', 'Open settings, then security.')
+        archive_idle_sessions(self.engine, 90, now=NOW)
+
+        with self.engine.begin() as conn:
+            self.assertTrue(restore_session(conn, 'old', now=NOW))
+            self.assertFalse(restore_session(conn, 'missing'))
+        self.assertEqual(self.count(ArchivedSession), 0)
+        with self.engine.connect() as conn:
+            session = conn.execute(select(ChatSession.__table__)).one()
+            self.assertEqual(session.title, 'Chat old')
+            messages = conn.execute(select(ChatMessage.__table__).order_by(ChatMessage.timestamp)).all()
+            self.assertEqual([(m.role, m.content, m.model_used) for m in messages], [
+                ('user', 'How do I reset my password?', 'test-model'),
+                ('assistant', 'Open settings, then security.', 'test-model')])
+            self.assertEqual(len(search_sessions(conn, 'password')[0]), 1)
+        self.assertEqual(archive_idle_sessions(self.engine, 90, now=NOW)['sessions'], 0)  # Active again
+
+
+if __name__ == '__main__':
+    unittest.main()
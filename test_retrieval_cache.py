@@ -0,0 +1,70 @@
+"""
+Tests for the versioned retrieval cache and its use by the RAG system
+"""
+
+import unittest
+from unittest.mock import patch
+
+from retrieval_cache import VersionedLRUCache
+from training_system import TrainingDataManager, SimpleRAGSystem, Document
+
+
+class TestVersionedLRUCache(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = VersionedLRUCache(max_entries=2)
+        cache.put('a', 1, 'A')
+        cache.put('b', 1, 'B')
+        self.assertEqual(cache.get('a', 1), 'A')  # 'b' is now the oldest
+        cache.put('c', 1, 'C')
+        self.assertIsNone(cache.get('b', 1))
+        self.assertEqual(cache.get('c', 1), 'C')
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_entries_of_other_versions_are_not_served(self):
+        cache = VersionedLRUCache()
+        cache.put('a', 1, 'A')
+        self.assertIsNone(cache.get('a', 2))
+        self.assertIsNone(cache.get('a', 1))  # Dropped on the stale lookup
+        stats = cache.stats()
+        self.assertEqual((stats['entries'], stats['stale'], stats['misses']), (0, 1, 2))
+
+    def test_bounded_by_bytes(self):
+        cache = VersionedLRUCache(max_entries=100, max_bytes=2000)
+        for i in range(10):
+            cache.put(i, 1, 'x' * 500)
+        stats = cache.stats()
+        self.assertLessEqual(stats['bytes'], 2000)
+        self.assertLess(stats['entries'], 10)
+        cache.put('huge', 1, 'x' * 5000)  # Larger than the whole cache: not stored
+        self.assertIsNone(cache.get('huge', 1))
+
+
+class TestCachedRetrieval(unittest.TestCase):
+    def setUp(self):
+        self.manager = TrainingDataManager()
+        self.manager.add_document(Document("Cooking pasta requires boiling water", "Cooking Doc", "food"))
+        self.manager.add_document(Document("Machine learning algorithms learn from data", "ML Doc", "tech"))
+        self.cache = VersionedLRUCache()
+        self.rag_system = SimpleRAGSystem(self.manager, cache=self.cache)
+        with patch('builtins.print'):
+            self.rag_system.build_knowledge_base()
+
+    def test_same_terms_hit_the_cache(self):
+        first = self.rag_system.generate_context_prompt("How do I boil pasta?")
+        second = self.rag_system.generate_context_prompt("pasta: boil")
+        self.assertIn("Cooking pasta", first)
+        self.assertTrue(second.endswith("User question: pasta: boil"))
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertEqual(self.rag_system.generate_context_prompt("pasta", category="tech"), "pasta")
+
+    def test_rebuild_invalidates(self):
+        self.assertNotIn("Pasta Guide", self.rag_system.generate_context_prompt("boil pasta"))
+        self.manager.add_document(Document("Boil pasta for ten minutes, then drain", "Pasta Guide", "food"))
+        with patch('builtins.print'):
+            self.rag_system.build_knowledge_base()
+        self.assertIn("Pasta Guide", self.rag_system.generate_context_prompt("boil pasta"))
+        self.assertEqual(self.cache.stats()['stale'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+"""
+Tests for single-flight coalescing of identical upstream requests
+"""
+
+import unittest
+import os
+import tempfile
+import shutil
+import threading
+import time
+
+from sqlalchemy import create_engine
+
+from singleflight import SingleFlight, DatabaseSingleFlight, SingleFlightTimeout, coalesce_key
+from models import InflightRequest
+
+
+class TestCoalesceKey(unittest.TestCase):
+    def test_normalizes_whitespace_and_case(self):
+        a = coalesce_key('model', [{'role': 'user', 'content': 'What  is AI?'}])
+        b = coalesce_key('model', [{'role': 'user', 'content': ' what is ai? '}])
+        c = coalesce_key('other-model', [{'role': 'user', 'content': 'What is AI?'}])
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, c)
+
+
+class TestSingleFlight(unittest.TestCase):
+    def run_concurrently(self, flight, fn, count=8, timeout=5):
+        results, errors = [], []
+        
+        def worker():
+            try:
+                results.append(flight.do('key', fn, timeout=timeout))
+            except Exception as e:
+                errors.append(e)
+        
+        threads = [threading.Thread(target=worker) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, errors
+    
+    def test_concurrent_callers_share_one_call(self):
+        calls = []
+        
+        def slow_call():
+            calls.append(1)
+            time.sleep(0.2)
+            return ('answer', None)
+        
+        flight = SingleFlight()
+        results, errors = self.run_concurrently(flight, slow_call)
+        self.assertEqual(errors, [])
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [('answer', None)] * 8)
+        self.assertEqual(flight.stats['shared'], 7)
+        self.assertEqual(flight.in_flight(), 0)
+    
+    def test_error_propagates_to_followers(self):
+        def failing_call():
+            time.sleep(0.2)
+            raise ValueError("upstream exploded")
+        
+        results, errors = self.run_concurrently(SingleFlight(), failing_call, count=4)
+        self.assertEqual(results, [])
+        self.assertEqual(len(errors), 4)
+        self.assertTrue(all(isinstance(e, ValueError) for e in errors))
+    
+    def test_follower_timeout(self):
+        def stuck_call():
+            time.sleep(0.5)
+            return 'late'
+        
+        results, errors = self.run_concurrently(SingleFlight(), stuck_call, count=3, timeout=0.1)
+        self.assertEqual(results, ['late'])
+        self.assertEqual(len(errors), 2)
+        self.assertTrue(all(isinstance(e, SingleFlightTimeout) for e in errors))
+
+
+class TestDatabaseSingleFlight(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.test_dir, 'flight.db')}")
+        InflightRequest.__table__.create(self.engine)
+    
+    def tearDown(self):
+        self.engine.dispose()
+        shutil.rmtree(self.test_dir)
+    
+    def test_workers_share_result_through_lock_table(self):
+        calls = []
+        
+        def slow_call():
+            calls.append(1)
+            time.sleep(0.3)
+            return ('shared answer', None)
+        
+        # Separate SingleFlight instances stand in for separate worker processes
+        workers = [
+            SingleFlight(DatabaseSingleFlight(lambda: self.engine, InflightRequest.__table__, poll_interval=0.02))
+            for _ in range(3)
+        ]
+        results = []
+        threads = [threading.Thread(target=lambda f=f: results.append(f.do('key', slow_call, timeout=5))) for f in workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [('shared answer', None)] * 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
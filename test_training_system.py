@@ -12,6 +12,7 @@ import sqlite3
 from unittest.mock import patch, MagicMock
 import sys
 import shutil
+import threading
 
 # Add the current directory to Python path to import our modules
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -23,7 +24,9 @@ try:
         FinetuningDataPrep, 
         DataImporter,
         TrainingExample,
-        Document
+        Document,
+        ExampleMatcher,
+        _query_vector
     )
 except ImportError as e:
     print(f"❌ Import Error: {e}")
@@ -396,6 +399,275 @@ class TestTrainingSystem(unittest.TestCase):
         
         print("✅ End-to-end workflow test passed")
 
+class TestInMemoryKnowledgeBase(unittest.TestCase):
+    """Knowledge base build and retrieval on the in-memory data manager"""
+    
+    def setUp(self):
+        self.manager = TrainingDataManager()
+        self.rag_system = SimpleRAGSystem(self.manager)
+        for doc in [
+            Document("Artificial intelligence is the future of technology", "AI Doc", "tech"),
+            Document("Machine learning algorithms learn from data", "ML Doc", "tech"),
+            Document("Cooking pasta requires boiling water", "Cooking Doc", "food")
+        ]:
+            self.manager.add_document(doc)
+    
+    def test_build_without_documents(self):
+        empty_rag = SimpleRAGSystem(TrainingDataManager())
+        with patch('builtins.print'):
+            empty_rag.build_knowledge_base()
+        self.assertFalse(empty_rag.is_trained)
+        self.assertEqual(empty_rag.retrieve_relevant_docs("anything"), [])
+    
+    def test_retrieval_ranks_matching_document_first(self):
+        with patch('builtins.print'):
+            self.rag_system.build_knowledge_base()
+        self.assertTrue(self.rag_system.is_trained)
+        self.assertEqual(len(self.rag_system.document_vectors), 3)
+        
+        relevant_docs = self.rag_system.retrieve_relevant_docs("How do I boil pasta?", top_k=2)
+        self.assertEqual(relevant_docs[0].title, "Cooking Doc")
+        self.assertEqual(self.rag_system.retrieve_relevant_docs("quantum chromodynamics"), [])
+    
+    def test_context_prompt(self):
+        with patch('builtins.print'):
+            self.rag_system.build_knowledge_base()
+        prompt = self.rag_system.generate_context_prompt("Tell me about machine learning", max_context_length=200)
+        self.assertIn("Machine learning algorithms", prompt)
+        self.assertTrue(prompt.endswith("User question: Tell me about machine learning"))
+        self.assertEqual(self.rag_system.generate_context_prompt("zzz"), "zzz")
+    
+    def test_parallel_build_matches_sequential(self):
+        for i in range(40):
+            self.manager.add_document(Document(f"shared topic{i % 7} words number{i}", f"Doc {i}", "bulk"))
+        with patch('builtins.print'):
+            self.rag_system.build_knowledge_base(workers=1)
+            parallel_rag = SimpleRAGSystem(self.manager)
+            with patch('training_system.PARALLEL_BUILD_MIN_DOCUMENTS', 10):
+                parallel_rag.build_knowledge_base(workers=2)
+        
+        self.assertEqual(parallel_rag.vocabulary, self.rag_system.vocabulary)
+        self.assertEqual(parallel_rag.idf.tolist(), self.rag_system.idf.tolist())
+        self.assertEqual(parallel_rag.document_vectors, self.rag_system.document_vectors)
+        self.assertEqual(parallel_rag.postings, self.rag_system.postings)
+    
+    def test_save_and_load_index(self):
+        with patch('builtins.print'):
+            self.rag_system.build_knowledge_base()
+        index_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(index_dir, 'index.npz')
+            self.rag_system.save_index(path)
+            loaded = SimpleRAGSystem(TrainingDataManager())
+            loaded.load_index(path)
+        finally:
+            shutil.rmtree(index_dir)
+        
+        self.assertTrue(loaded.is_trained)
+        self.assertEqual(loaded.vocabulary, self.rag_system.vocabulary)
+        self.assertEqual(loaded.postings, self.rag_system.postings)
+        self.assertEqual(loaded.documents[2].to_dict(), self.rag_system.documents[2].to_dict())
+        self.assertEqual([doc.title for doc in loaded.retrieve_relevant_docs("machine learning data")],
+                         [doc.title for doc in self.rag_system.retrieve_relevant_docs("machine learning data")])
+    
+    def test_category_shards(self):
+        topics = {"food": "pasta sauce tomato basil", "tech": "neural network training data", "law": "contract court ruling"}
+        for i in range(60):
+            category = list(topics)[i % 3]
+            self.manager.add_document(Document(f"{topics[category]} note{i % 10} data", f"Note {i}", category))
+        with patch('builtins.print'):
+            self.rag_system.build_knowledge_base()
+        shards = self.rag_system.shards
+        self.assertEqual(len(shards), 3)
+        self.assertEqual(self.rag_system.documents.categories[int(self.rag_system.documents.category_codes[0])], "food")
+        
+        food, law, tech = 0, 1, 2  # Codes of the sorted categories
+        self.assertEqual(shards.route(_query_vector("tomato basil", self.rag_system.vocabulary, self.rag_system.idf)), [food])
+        self.assertEqual(shards.route(_query_vector("court data", self.rag_system.vocabulary, self.rag_system.idf), 1), [law])
+        
+        # Searching every shard, in turn or in threads, ranks like one unsharded index
+        unsharded = SimpleRAGSystem(self.manager)
+        unsharded.load_index_state(dict(self.rag_system.index_state(), shards=None))
+        fan_out = SimpleRAGSystem(self.manager, shard_probes=0, shard_threads=3)
+        fan_out.load_index_state(self.rag_system.index_state())
+        for query in ["tomato court data", "note3 data", "machine learning pasta"]:
+            expected = [doc.title for doc in unsharded.retrieve_relevant_docs(query, top_k=8)]
+            self.assertEqual([doc.title for doc in fan_out.retrieve_relevant_docs(query, top_k=8)], expected)
+        
+        self.assertEqual({doc.category for doc in self.rag_system.retrieve_relevant_docs("data", top_k=10, category="law")},
+                         {"law"})
+        self.assertEqual(self.rag_system.retrieve_relevant_docs("data", category="missing"), [])
+    
+    def test_concurrent_first_queries_share_one_shard_pool(self):
+        rag = SimpleRAGSystem(self.manager, shard_threads=2)
+        barrier, pools = threading.Barrier(8), []
+        def first_query():
+            barrier.wait()
+            pools.append(rag._get_shard_pool())
+        threads = [threading.Thread(target=first_query) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len({id(pool) for pool in pools}), 1)
+        rag._shard_pool.shutdown()
+    
+    def test_rebuild_publishes_a_whole_new_index(self):
+        with patch('builtins.print'):
+            self.rag_system.build_knowledge_base()
+        old_index = self.rag_system.index
+        
+        # Queries running during rebuilds each see one complete index, never a mix
+        errors, stop = [], threading.Event()
+        def query():
+            while not stop.is_set():
+                try:
+                    titles = {doc.title for doc in self.rag_system.retrieve_relevant_docs("pasta data", top_k=10)}
+                    if not titles <= {"Cooking Doc", "ML Doc", "AI Doc"} | {f"Extra {i}" for i in range(20)}:
+                        errors.append(titles)
+                except Exception as e:
+                    errors.append(e)
+        reader = threading.Thread(target=query)
+        reader.start()
+        with patch('builtins.print'):
+            for i in range(20):
+                self.manager.add_document(Document(f"pasta data {i}", f"Extra {i}", "bulk"))
+                self.rag_system.build_knowledge_base()
+        stop.set()
+        reader.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(self.rag_system.index_version, old_index.version + 20)
+        self.assertEqual(len(old_index), 3)  # A reader holding the old index can still use it
+        
+        broken = dict(self.rag_system.index_state(), idf=self.rag_system.idf[:-1])
+        with self.assertRaises(ValueError):
+            self.rag_system.load_index_state(broken)
+        self.assertEqual(len(self.rag_system.documents), 23)  # Still the last good index
+        
+        self.rag_system.clear()
+        self.assertFalse(self.rag_system.is_trained)
+    
+    def test_ann_search(self):
+        topics = ["pasta sauce tomato basil", "neural network training data", "contract law court ruling"]
+        for i in range(60):
+            self.manager.add_document(Document(f"{topics[i % 3]} note{i % 10}", f"Note {i}", "bulk"))
+        with patch('builtins.print'):
+            self.rag_system.build_knowledge_base()
+            self.assertIsNone(self.rag_system.ann_index)  # 'auto' searches small corpora exactly
+            ann_rag = SimpleRAGSystem(self.manager, retrieval_mode='ann', ann_lists=4, ann_probes=4)
+            ann_rag.build_knowledge_base()
+        
+        # Probing every list scores every candidate exactly
+        for query in ["tomato basil pasta", "court ruling on a contract", "training a neural network"]:
+            self.assertEqual([doc.title for doc in ann_rag.retrieve_relevant_docs(query, top_k=5)],
+                             [doc.title for doc in self.rag_system.retrieve_relevant_docs(query, top_k=5)])
+        
+        ann_rag.ann_probes = 1
+        self.assertLessEqual(len(ann_rag.retrieve_relevant_docs("tomato court network", top_k=60)), 60)
+        
+        restored = SimpleRAGSystem(TrainingDataManager(), retrieval_mode='ann', ann_probes=4)
+        restored.load_index_arrays(ann_rag.index_arrays())
+        self.assertEqual(restored.ann_index.lists, 4)
+        self.assertEqual(restored.retrieve_relevant_docs("tomato basil pasta")[0].title,
+                         ann_rag.retrieve_relevant_docs("tomato basil pasta")[0].title)
+        
+        # Without ann_probes a fifth of the lists is searched, so recall holds as lists grow
+        with patch('builtins.print'):
+            default_rag = SimpleRAGSystem(self.manager, retrieval_mode='ann', ann_lists=10)
+            default_rag.build_knowledge_base()
+        with patch.object(default_rag.ann_index, 'search', wraps=default_rag.ann_index.search) as search:
+            default_rag.retrieve_relevant_docs("tomato basil pasta")
+        self.assertEqual(search.call_args.args[2], 2)
+    
+    def test_example_matcher(self):
+        matcher = ExampleMatcher(self.manager)
+        self.assertEqual(matcher.match("What is machine learning?"), (None, 0.0))
+        
+        self.manager.add_example(TrainingExample("What is machine learning?", "A field of AI.", "tech"))
+        self.manager.add_example(TrainingExample("How do I boil pasta?", "In salted water.", "food"))
+        example, score = matcher.match("what is machine learning")
+        self.assertEqual(example.output_text, "A field of AI.")
+        self.assertAlmostEqual(score, 1.0, places=5)
+        
+        example, score = matcher.match("Which machine learning algorithms handle images and audio?")
+        self.assertLess(score, 0.7)
+        self.assertEqual(matcher.match("quantum chromodynamics"), (None, 0.0))
+    
+    def test_example_matcher_rejects_keywords_and_narrowed_questions(self):
+        matcher = ExampleMatcher(self.manager)
+        self.manager.add_example(TrainingExample("What are the symptoms of diabetes?", "Thirst, fatigue.", "health"))
+        self.manager.add_example(TrainingExample("What is a contract?", "A binding agreement.", "law"))
+        
+        # Cosine similarity alone scores all of these 0.7 or more
+        for query in ("contract", "diabetes", "symptoms of diabetes in children"):
+            example, score = matcher.match(query)
+            self.assertLess(score, 0.6, query)
+        
+        example, score = matcher.match("what are the symptoms of diabetes")
+        self.assertEqual(example.output_text, "Thirst, fatigue.")
+        self.assertAlmostEqual(score, 1.0, places=5)
+
+class TestTrainingDataSnapshots(unittest.TestCase):
+    """Copy-on-write views of the data manager under concurrent writers"""
+    
+    def test_views_do_not_change(self):
+        manager = TrainingDataManager()
+        manager.add_example(TrainingExample("q1", "a1", "tech"))
+        snapshot = manager.snapshot()
+        examples = manager.get_examples()
+        self.assertFalse(hasattr(examples, 'append'))
+        
+        manager.add_examples([TrainingExample("q2", "a2", "tech"), TrainingExample("q3", "a3", "food")])
+        manager.clear_examples()
+        self.assertEqual([ex.input_text for ex in examples], ["q1"])
+        self.assertEqual(len(snapshot.get_examples("tech")), 1)
+        self.assertEqual(len(snapshot.get_examples("food")), 0)
+        self.assertEqual(manager.version, snapshot.version + 2)  # One version per batch
+        self.assertEqual(len(manager.get_examples()), 0)
+        self.assertIs(manager.get_examples(), manager.get_examples())  # O(1) until the next write
+    
+    def test_concurrent_readers_and_writers(self):
+        manager = TrainingDataManager()
+        writers, batches, batch_size = 4, 50, 20
+        errors, done = [], threading.Event()
+        
+        def write(writer):
+            for batch in range(batches):
+                manager.add_examples(TrainingExample(f"q{writer}-{batch}-{i}", "a", f"cat{i % 3}")
+                                     for i in range(batch_size))
+                manager.add_document(Document("content", f"doc{writer}-{batch}", "docs"))
+        
+        def read():
+            last_version = -1
+            while not done.is_set():
+                try:
+                    snapshot = manager.snapshot()
+                    examples = snapshot.get_examples()
+                    seen = sum(1 for _ in examples)
+                    by_category = sum(len(snapshot.get_examples(f"cat{c}")) for c in range(3))
+                    if seen != len(examples) or by_category != len(examples) or len(examples) % batch_size:
+                        errors.append((seen, by_category, len(examples)))
+                    if snapshot.version < last_version:
+                        errors.append(('version went back', last_version, snapshot.version))
+                    last_version = snapshot.version
+                except Exception as e:
+                    errors.append(e)
+        
+        readers = [threading.Thread(target=read) for _ in range(6)]
+        writer_threads = [threading.Thread(target=write, args=(w,)) for w in range(writers)]
+        for thread in readers + writer_threads:
+            thread.start()
+        for thread in writer_threads:
+            thread.join()
+        done.set()
+        for thread in readers:
+            thread.join()
+        
+        self.assertEqual(errors, [])
+        self.assertEqual(len(manager.get_examples()), writers * batches * batch_size)
+        self.assertEqual(len(manager.get_documents("docs")), writers * batches)
+        self.assertEqual(manager.version, writers * batches * 2)
+
 def run_comprehensive_tests():
     """Run all tests with detailed reporting"""
     print("🧪 AI Chatbot Training System - Comprehensive Test Suite")
@@ -439,3 +711,4 @@ def run_comprehensive_tests():
 if __name__ == "__main__":
     success = run_comprehensive_tests()
     sys.exit(0 if success else 1)
+
@@ -1,15 +1,124 @@
-from flask import Blueprint, request, jsonify
+import os
+import uuid
+
+from flask import Blueprint, request, jsonify, current_app, send_file
+
+from models import db, TrainingJob
+from training_system import TrainingExample
+from jobs import (
+    ACTIVE_STATUSES, build_knowledge_base_job, embed_documents_job, import_examples_job, export_jsonl_job,
+    archive_sessions_job
+)
 
 training_bp = Blueprint('training', __name__)
 
+IMPORT_FORMATS = ('json', 'csv')
+
 @training_bp.route('/train', methods=['POST'])
 def train_model():
-    # Dummy endpoint for training
-    data = request.get_json()
-    # You can add your training logic here
-    return jsonify({'message': 'Training started', 'data': data}), 200
+    """Start a background job and return it for polling at /train/status
+
+    JSON body: {"job": "build_knowledge_base" | "embed_documents" | "export_jsonl" | "archive_sessions",
+    "category": ... (export_jsonl only), "max_idle_days": ...};
+    a multipart upload with a "file" field starts an "import_examples" job.
+    """
+    runner = current_app.extensions['job_runner']
+    manager = current_app.extensions['training_manager']
+    rag_system = current_app.extensions['rag_system']
+
+    if 'file' in request.files:
+        upload = request.files['file']
+        file_format = os.path.splitext(upload.filename or '')[1].lstrip('.').lower()
+        if file_format not in IMPORT_FORMATS:
+            return jsonify({'error': f"Unsupported file type (expected {', '.join(IMPORT_FORMATS)})"}), 400
+        upload_dir = os.path.join(runner.artifact_dir, 'uploads')
+        os.makedirs(upload_dir, exist_ok=True)
+        file_path = os.path.join(upload_dir, f"{uuid.uuid4()}.{file_format}")
+        upload.save(file_path)
+
+        def add_examples(examples):
+            manager.add_examples(TrainingExample(**item) for item in examples)
+
+        job_id = runner.submit('import_examples', import_examples_job,
+                               {'file_path': file_path, 'file_format': file_format}, on_done=add_examples)
+    else:
+        data = request.get_json(silent=True) or {}
+        kind = data.get('job', 'build_knowledge_base')
+        category = data.get('category')
+        if kind == 'build_knowledge_base':
+            # Always all: the built index replaces the whole knowledge base, whatever the category
+            documents = [doc.to_dict() for doc in manager.get_documents()]
+            if not documents:
+                return jsonify({'error': 'No documents found. Please add documents to the knowledge base first.'}), 400
+            params = {'documents': documents, 'retrieval_mode': rag_system.retrieval_mode,
+                      'ann_lists': rag_system.ann_lists}
+            job_id = runner.submit(kind, build_knowledge_base_job, params, on_done=rag_system.load_index_state)
+        elif kind == 'embed_documents':
+            embedding_store = current_app.extensions['embedding_store']
+            documents = [doc.to_dict() for doc in manager.get_documents()]  # Always all: sync drops missing rows
+            params = {'documents': documents, 'dimensions': embedding_store.embedder.dimensions,
+                      'batch_size': embedding_store.batch_size}
+            job_id = runner.submit(kind, embed_documents_job, params, on_done=lambda _: embedding_store.load())
+        elif kind == 'export_jsonl':
+            examples = [example.to_dict() for example in manager.get_examples(category)]
+            if not examples:
+                return jsonify({'error': 'No training examples to export'}), 400
+            job_id = runner.submit(kind, export_jsonl_job, {'examples': examples})
+        elif kind == 'archive_sessions':
+            max_idle_days = data.get('max_idle_days', current_app.config['ARCHIVE_AFTER_DAYS'])
+            # bool is an int subclass: reject true/false explicitly
+            if isinstance(max_idle_days, bool) or not isinstance(max_idle_days, int) or max_idle_days < 1:
+                return jsonify({'error': 'max_idle_days must be a positive integer'}), 400
+            params = {'max_idle_days': max_idle_days, 'batch_size': current_app.config['ARCHIVE_BATCH_SIZE']}
+            job_id = runner.submit(kind, archive_sessions_job, params)
+        else:
+            return jsonify({'error': f'Unknown job: {kind}'}), 400
+
+    job = db.session.get(TrainingJob, job_id)
+    return jsonify({'message': 'Training started', 'job': job.to_dict()}), 202
 
 @training_bp.route('/train/status', methods=['GET'])
 def training_status():
-    # Dummy endpoint for training status
-    return jsonify({'status': 'idle'}), 200
+    """Live state of one job (?job_id=) or of the most recent jobs"""
+    rag_system = current_app.extensions['rag_system']
+    job_id = request.args.get('job_id')
+    if job_id:
+        job = db.session.get(TrainingJob, job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify({'status': job.status, 'job': job.to_dict(), 'rag_built': rag_system.is_trained}), 200
+
+    jobs = TrainingJob.query.order_by(TrainingJob.created_at.desc()).limit(10).all()
+    busy = any(job.status in ACTIVE_STATUSES for job in jobs)
+    return jsonify({
+        'status': 'running' if busy else 'idle',
+        'jobs': [job.to_dict() for job in jobs],
+        'rag_built': rag_system.is_trained
+    }), 200
+
+@training_bp.route('/train/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    if not current_app.extensions['job_runner'].cancel(job_id):
+        return jsonify({'error': 'Job not found or already finished'}), 404
+    return jsonify({'message': 'Cancellation requested', 'job': db.session.get(TrainingJob, job_id).to_dict()}), 200
+
+@training_bp.route('/train/jobs/<job_id>/artifact', methods=['GET'])
+def job_artifact(job_id):
+    job = db.session.get(TrainingJob, job_id)
+    if not job or not job.artifact_path or not os.path.exists(job.artifact_path):
+        return jsonify({'error': 'Artifact not found'}), 404
+    return send_file(job.artifact_path, as_attachment=True,
+                     download_name=f"{job.kind}_{job.id[:8]}{os.path.splitext(job.artifact_path)[1]}")
+
+@training_bp.route('/train/embeddings/search', methods=['GET'])
+def search_embeddings():
+    """Documents nearest to ?q= by embedding (run an embed_documents job first)"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Query parameter q is required'}), 400
+    top_k = min(max(request.args.get('top_k', 3, type=int), 1), 50)
+    embedding_store = current_app.extensions['embedding_store']
+    return jsonify({
+        'results': embedding_store.search(query, top_k, request.args.get('category')),
+        'embedded_documents': len(embedding_store)
+    }), 200
@@ -1,6 +1,29 @@
 import datetime
 import json
+import math
+import multiprocessing
 import os
+import re
+import threading
+from array import array
+from collections import Counter
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOP_WORDS = frozenset("""
+a an and are as at be but by can do does for from has have how i if in into is it its
+me my of on or so such that the their then there these they this to was we what when
+where which who why will with you your
+""".split())
+
+def tokenize(text):
+    """Lowercase word tokens with stop words removed"""
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in STOP_WORDS]
 
 class TrainingExample:
     def __init__(self, input_text, output_text, category="general", source="manual", created_at=None):
@@ -32,30 +55,953 @@ class Document:
             'category': self.category
         }
 
+class SnapshotView(Sequence):
+    """Read-only view of the first ``length`` items of an append-only list
+    
+    Items appended to the list later are not part of the view, so it stays the
+    same while writers carry on; making one costs O(1).
+    """
+    
+    __slots__ = ('_items', '_length')
+    
+    def __init__(self, items, length):
+        self._items = items
+        self._length = length
+    
+    def __len__(self):
+        return self._length
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._items[i] for i in range(*index.indices(self._length))]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError('snapshot index out of range')
+        return self._items[index]
+    
+    def __iter__(self):
+        return islice(self._items, self._length)
+    
+    def __repr__(self):
+        return f"SnapshotView({list(self)!r})"
+
+class TrainingDataSnapshot:
+    """Examples and documents of a TrainingDataManager as of one version"""
+    
+    def __init__(self, version, examples, documents, examples_by_category, documents_by_category):
+        self.version = version
+        self.examples = examples  # SnapshotView
+        self.documents = documents  # SnapshotView
+        self._examples_by_category = examples_by_category  # category -> SnapshotView
+        self._documents_by_category = documents_by_category
+    
+    def get_examples(self, category=None):
+        if category:
+            return self._examples_by_category.get(category, _EMPTY_VIEW)
+        return self.examples
+    
+    def get_documents(self, category=None):
+        if category:
+            return self._documents_by_category.get(category, _EMPTY_VIEW)
+        return self.documents
+
+_EMPTY_VIEW = SnapshotView([], 0)
+
+class _AppendOnlyItems:
+    """Items and their per-category subsets in append-only lists (see SnapshotView)"""
+    
+    def __init__(self):
+        self.items = []
+        self.by_category = {}
+        self._views = None
+    
+    def extend(self, items):
+        for item in items:
+            self.items.append(item)
+            self.by_category.setdefault(item.category, []).append(item)
+    
+    def views(self):
+        """(all items, {category: items}) views; the same objects until items are added"""
+        if self._views is None or len(self._views[0]) != len(self.items):
+            self._views = (SnapshotView(self.items, len(self.items)),
+                           {category: SnapshotView(items, len(items)) for category, items in self.by_category.items()})
+        return self._views
+
 class TrainingDataManager:
+    """Training examples and knowledge-base documents, shared by request threads
+    
+    Readers get a TrainingDataSnapshot (or views from it) that never changes;
+    taking it costs O(1) and no lock unless data was written since the last
+    one. Every write call (a whole batch for add_examples/add_documents)
+    produces one new version. Writes append to lists that published views
+    only read a prefix of; clearing starts new lists, so existing views keep
+    theirs.
+    """
+    
     def __init__(self):
-        self.examples = []
-        self.documents = []
+        self._lock = threading.Lock()
+        self._version = 0
+        self._examples = _AppendOnlyItems()
+        self._documents = _AppendOnlyItems()
+        self._snapshot = None  # Built on the first read after a write
+    
+    def snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None:
+                    examples, examples_by_category = self._examples.views()
+                    documents, documents_by_category = self._documents.views()
+                    snapshot = self._snapshot = TrainingDataSnapshot(
+                        self._version, examples, documents, examples_by_category, documents_by_category)
+        return snapshot
+    
+    @property
+    def version(self):
+        return self._version
+    
+    @property
+    def examples(self):
+        return self.snapshot().examples
+    
+    @property
+    def documents(self):
+        return self.snapshot().documents
+    
+    def _write(self, change):
+        with self._lock:
+            change()
+            self._version += 1
+            self._snapshot = None
     
     def add_example(self, example):
-        self.examples.append(example)
+        self.add_examples([example])
+    
+    def add_examples(self, examples):
+        """Add a batch of examples as one new version"""
+        examples = list(examples)
+        self._write(lambda: self._examples.extend(examples))
     
     def get_examples(self, category=None):
-        if category:
-            return [ex for ex in self.examples if ex.category == category]
-        return self.examples
+        return self.snapshot().get_examples(category)
     
     def add_document(self, document):
-        self.documents.append(document)
+        self.add_documents([document])
+    
+    def add_documents(self, documents):
+        """Add a batch of documents as one new version"""
+        documents = list(documents)
+        self._write(lambda: self._documents.extend(documents))
     
     def get_documents(self, category=None):
-        if category:
-            return [doc for doc in self.documents if doc.category == category]
-        return self.documents
+        return self.snapshot().get_documents(category)
+    
+    def clear_examples(self):
+        self._write(lambda: setattr(self, '_examples', _AppendOnlyItems()))
+    
+    def clear_documents(self):
+        self._write(lambda: setattr(self, '_documents', _AppendOnlyItems()))
+
+PARALLEL_BUILD_MIN_DOCUMENTS = 20000  # Smaller corpora are not worth the process startup
+PARALLEL_BUILD_SHARDS_PER_WORKER = 4
+
+# The built index lives in a handful of flat NumPy arrays rather than millions of
+# small Python objects, so it is compact, pickles quickly and, once loaded in a
+# preforking server's master, stays shared copy-on-write by the workers.
+
+class StringTable:
+    """Immutable list of strings packed into one UTF-8 arena plus an offsets array"""
+    
+    def __init__(self, arena, offsets):
+        self.arena = arena  # uint8 array
+        self.offsets = offsets  # int64 array, len(strings) + 1
+    
+    @classmethod
+    def from_strings(cls, strings):
+        encoded = [string.encode('utf-8') for string in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(data) for data in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets)
+    
+    def _bytes(self, index):
+        return self.arena[self.offsets[index]:self.offsets[index + 1]].tobytes()
+    
+    def __len__(self):
+        return len(self.offsets) - 1
+    
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self._bytes(index).decode('utf-8')
+    
+    def __iter__(self):
+        return (self[index] for index in range(len(self)))
+    
+    def __eq__(self, other):
+        return (isinstance(other, StringTable) and np.array_equal(self.offsets, other.offsets)
+                and np.array_equal(self.arena, other.arena))
+    
+    @property
+    def nbytes(self):
+        return self.arena.nbytes + self.offsets.nbytes
+
+class TermTable(StringTable):
+    """Sorted StringTable used as the vocabulary; term ids are positions"""
+    
+    def get(self, term, default=None):
+        """Term id by binary search (tokens are ASCII, so byte order is sort order)"""
+        key = term.encode('utf-8')
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self._bytes(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self) and self._bytes(low) == key:
+            return low
+        return default
+    
+    def __contains__(self, term):
+        return self.get(term) is not None
+
+class SparseRows:
+    """Rows of (column, value) pairs in CSR form: offsets, columns and values arrays"""
+    
+    def __init__(self, offsets, columns, values):
+        self.offsets = offsets  # int64, len(rows) + 1
+        self.columns = columns  # int32
+        self.values = values  # float32
+    
+    def __len__(self):
+        return len(self.offsets) - 1
+    
+    def row(self, index):
+        """(columns, values) array views of one row"""
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return self.columns[start:end], self.values[start:end]
+    
+    def __getitem__(self, index):
+        columns, values = self.row(index)
+        return dict(zip(columns.tolist(), values.tolist()))
+    
+    def row_ids(self):
+        """Row index of every stored entry"""
+        return np.repeat(np.arange(len(self), dtype=np.int32), np.diff(self.offsets))
+    
+    def transpose(self, column_count):
+        """Column-major copy; rows keep ascending order within each column"""
+        order = np.argsort(self.columns, kind='stable')
+        offsets = np.zeros(column_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.columns, minlength=column_count), out=offsets[1:])
+        return SparseRows(offsets, self.row_ids()[order], self.values[order])
+    
+    def __eq__(self, other):
+        return (isinstance(other, SparseRows) and np.array_equal(self.offsets, other.offsets)
+                and np.array_equal(self.columns, other.columns) and np.array_equal(self.values, other.values))
+    
+    @property
+    def nbytes(self):
+        return self.offsets.nbytes + self.columns.nbytes + self.values.nbytes
+
+class DocumentTable:
+    """Documents packed into string tables; indexing materialises Document objects"""
+    
+    def __init__(self, titles, contents, categories, category_codes):
+        self.titles = titles  # StringTable
+        self.contents = contents  # StringTable
+        self.categories = categories  # StringTable of distinct categories
+        self.category_codes = category_codes  # uint16 index into categories, per document
+    
+    @classmethod
+    def from_documents(cls, documents):
+        names = sorted({doc.category for doc in documents})
+        codes = {name: code for code, name in enumerate(names)}
+        return cls(
+            StringTable.from_strings([doc.title for doc in documents]),
+            StringTable.from_strings([doc.content for doc in documents]),
+            StringTable.from_strings(names),
+            np.array([codes[doc.category] for doc in documents], dtype=np.uint16)
+        )
+    
+    def __len__(self):
+        return len(self.titles)
+    
+    def __getitem__(self, index):
+        return Document(self.contents[index], self.titles[index], self.categories[int(self.category_codes[index])])
+    
+    def __iter__(self):
+        return (self[index] for index in range(len(self)))
+    
+    def category_code(self, category):
+        """Code of a category, or None if no document has it"""
+        for code, name in enumerate(self.categories):
+            if name == category:
+                return code
+        return None
+    
+    def category_mask(self, category):
+        """Boolean array marking the documents of a category"""
+        code = self.category_code(category)
+        if code is None:
+            return np.zeros(len(self), dtype=bool)
+        return self.category_codes == code
+    
+    @property
+    def nbytes(self):
+        return self.titles.nbytes + self.contents.nbytes + self.categories.nbytes + self.category_codes.nbytes
+
+def _vocabulary(document_frequency, total):
+    """Sorted vocabulary, term -> id lookup for the build and idf array"""
+    terms = sorted(document_frequency)
+    term_ids = {term: term_id for term_id, term in enumerate(terms)}
+    frequency = np.array([document_frequency[term] for term in terms], dtype=np.float64)
+    idf = (np.log((1 + total) / (1 + frequency)) + 1).astype(np.float32)
+    return TermTable.from_strings(terms), term_ids, idf
+
+def _flatten_counts(term_counts, term_ids):
+    """Per-document Counters -> (row lengths, term ids, counts) arrays"""
+    lengths = np.fromiter((len(counts) for counts in term_counts), dtype=np.int64, count=len(term_counts))
+    ids = []
+    values = []
+    for counts in term_counts:
+        ids.extend(map(term_ids.__getitem__, counts))
+        values.extend(counts.values())
+    return lengths, np.array(ids, dtype=np.int32), np.array(values, dtype=np.float32)
+
+def _tfidf_rows(lengths, ids, counts, idf):
+    """L2-normalised tf-idf document vectors as SparseRows"""
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    rows = SparseRows(offsets, ids, None)
+    weights = counts.astype(np.float64) * idf[ids]
+    norms = np.sqrt(np.bincount(rows.row_ids(), weights=weights * weights, minlength=len(lengths)))
+    norms[norms == 0] = 1.0
+    rows.values = (weights / np.repeat(norms, lengths)).astype(np.float32)
+    return rows
+
+def _build_index(texts, progress):
+    total = len(texts)
+    step = max(1, total // 100)
+    # Term ids in order of first appearance until the vocabulary is known; kept in
+    # flat typed arrays because a Counter per document costs ~100 bytes per entry
+    first_seen = {}
+    lengths = array('q')
+    ids = array('i')
+    counts = array('f')
+    for doc_index, text in enumerate(texts):
+        term_counts = Counter(tokenize(text))
+        lengths.append(len(term_counts))
+        ids.extend([first_seen.setdefault(term, len(first_seen)) for term in term_counts])
+        counts.extend(term_counts.values())
+        if doc_index % step == 0:
+            progress(0.7 * doc_index / total)
+    
+    ids = np.frombuffer(ids, dtype=np.int32)
+    frequency = np.bincount(ids, minlength=len(first_seen))
+    vocabulary, term_ids, idf = _vocabulary(dict(zip(first_seen, frequency.tolist())), total)
+    final_ids = np.array([term_ids[term] for term in first_seen], dtype=np.int32)
+    vectors = _tfidf_rows(np.frombuffer(lengths, dtype=np.int64), final_ids[ids],
+                          np.frombuffer(counts, dtype=np.float32), idf)
+    progress(0.9)
+    return vocabulary, idf, vectors, vectors.transpose(len(vocabulary))
+
+def _shard_document_frequency(texts):
+    """Parallel build, phase 1: number of documents in the shard containing each term"""
+    frequency = Counter()
+    for text in texts:
+        frequency.update(set(tokenize(text)))
+    return frequency
+
+def _shard_term_counts(texts, term_ids):
+    """Parallel build, phase 2: flattened term counts of a shard given the ids of its own terms"""
+    return _flatten_counts([Counter(tokenize(text)) for text in texts], term_ids)
+
+def _build_index_parallel(texts, workers, progress):
+    """Shard the corpus over a process pool, merge term statistics, then count terms per shard
+    
+    Shards re-tokenize their texts in phase 2 rather than shipping per-document
+    Counters between processes; they return flat arrays, and weighting,
+    normalisation and the postings transpose run vectorised in this process.
+    Each phase-2 task carries the ids of its own shard's terms only, not the
+    whole vocabulary.
+    """
+    total = len(texts)
+    shard_size = math.ceil(total / (workers * PARALLEL_BUILD_SHARDS_PER_WORKER))
+    shards = [texts[start:start + shard_size] for start in range(0, total, shard_size)]
+    
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        document_frequency = Counter()
+        shard_terms = []
+        for done, shard_frequency in enumerate(pool.map(_shard_document_frequency, shards), 1):
+            document_frequency.update(shard_frequency)
+            shard_terms.append(shard_frequency.keys())
+            progress(0.3 * done / len(shards))
+        
+        vocabulary, term_ids, idf = _vocabulary(document_frequency, total)
+        
+        futures = [pool.submit(_shard_term_counts, shard, {term: term_ids[term] for term in terms})
+                   for shard, terms in zip(shards, shard_terms)]
+        parts = []
+        for done, future in enumerate(futures, 1):
+            parts.append(future.result())
+            progress(0.3 + 0.6 * done / len(shards))
+    
+    lengths, ids, counts = (np.concatenate(arrays) for arrays in zip(*parts))
+    vectors = _tfidf_rows(lengths, ids, counts, idf)
+    return vocabulary, idf, vectors, vectors.transpose(len(vocabulary))
+
+def _query_vector(query, vocabulary, idf):
+    """L2-normalised tf-idf weights of a query's known terms, {term id: weight}
+    
+    Unknown terms count towards the norm like the rarest known term, so a query
+    that is mostly about something else scores low against every row.
+    """
+    counts = Counter()
+    unknown = Counter()
+    for term in tokenize(query):
+        term_id = vocabulary.get(term)
+        if term_id is not None:
+            counts[term_id] += 1
+        else:
+            unknown[term] += 1
+    vector = {term_id: count * float(idf[term_id]) for term_id, count in counts.items()}
+    unknown_weight = float(idf.max()) if len(idf) else 1.0
+    norm = math.sqrt(sum(weight * weight for weight in vector.values())
+                     + sum((count * unknown_weight) ** 2 for count in unknown.values())) or 1.0
+    return {term_id: weight / norm for term_id, weight in vector.items()}
+
+def _top_matches(query_vector, postings, row_count, top_k, row_mask=None, row_range=None):
+    """Best (row, cosine score) pairs with a positive score, by score then row order
+    
+    ``row_mask``, a boolean array, restricts the result to the rows it marks;
+    ``row_range``, a (start, end) pair, to those rows, and only their part of
+    each posting list is read.
+    """
+    if not query_vector:
+        return []
+    start, end = row_range or (0, row_count)
+    scores = np.zeros(end - start, dtype=np.float32)
+    touched = []
+    for term_id, query_weight in query_vector.items():
+        rows, weights = postings.row(term_id)
+        if row_range is not None:
+            lo, hi = np.searchsorted(rows, row_range)  # Posting lists are in row order
+            rows, weights = rows[lo:hi] - start, weights[lo:hi]
+        scores[rows] += query_weight * weights  # Unique within one posting list
+        touched.append(rows)
+    candidates = np.unique(np.concatenate(touched))
+    if row_mask is not None:
+        candidates = candidates[row_mask[candidates + start]]
+    return _best_rows(candidates + start, scores[candidates], top_k)
+
+def _best_rows(rows, scores, top_k):
+    """Top (row, score) pairs with a positive score, by score then row; ties at the cut go to lower rows"""
+    if top_k <= 0:
+        return []
+    if len(rows) > top_k:
+        cutoff = np.partition(scores, len(scores) - top_k)[len(scores) - top_k]
+        keep = np.flatnonzero(scores >= cutoff)
+        rows, scores = rows[keep], scores[keep]
+    best = np.lexsort((rows, -scores))[:top_k]
+    return [(int(rows[i]), float(scores[i])) for i in best if scores[i] > 0]
+
+ANN_MIN_DOCUMENTS = 50000  # retrieval_mode='auto' searches smaller corpora exactly
+ANN_PROBE_FRACTION = 0.2  # Share of the lists probed unless ann_probes is set (recall@3 0.98 at 100k and 1M)
+ANN_DIMENSIONS = 256  # Sketch used to cluster documents and route queries
+ANN_SKETCH_HASHES = 4  # Buckets each term is hashed to
+ANN_KMEANS_POINTS_PER_LIST = 64  # Sample size for k-means, per list
+ANN_KMEANS_ITERATIONS = 8
+_ANN_CHUNK_ROWS = 4096
+_SKETCH_MULTIPLIERS = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0xD6E8FEB86659FD93,
+                                0xFF51AFD7ED558CCD, 0xC4CEB9FE1A85EC53, 0x94D049BB133111EB, 0xBF58476D1CE4E5B9],
+                               dtype=np.uint64)
+
+def _sketch(term_ids):
+    """Count-sketch of term ids: (buckets, signs), each (ANN_SKETCH_HASHES, len(term_ids))
+    
+    A random projection that is computed by hashing rather than stored, so its
+    size does not grow with the vocabulary.
+    """
+    hashed = term_ids.astype(np.uint64)[None, :] * _SKETCH_MULTIPLIERS[:ANN_SKETCH_HASHES, None]
+    buckets = ((hashed >> np.uint64(40)) % np.uint64(ANN_DIMENSIONS)).astype(np.int64)
+    signs = np.where((hashed >> np.uint64(63)) == 1, -1.0, 1.0) / math.sqrt(ANN_SKETCH_HASHES)
+    return buckets, signs
+
+def _sketch_rows(rows, start, end):
+    """Dense, L2-normalised sketches of rows[start:end] of a SparseRows"""
+    first, last = rows.offsets[start], rows.offsets[end]
+    local_rows = np.repeat(np.arange(end - start, dtype=np.int64), np.diff(rows.offsets[start:end + 1]))
+    buckets, signs = _sketch(rows.columns[first:last])
+    points = np.bincount((local_rows * ANN_DIMENSIONS + buckets).ravel(),
+                         weights=(signs * rows.values[first:last]).ravel(),
+                         minlength=(end - start) * ANN_DIMENSIONS).reshape(end - start, ANN_DIMENSIONS)
+    norms = np.linalg.norm(points, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (points / norms).astype(np.float32)
+
+def _sketched_chunks(rows):
+    """(start, end, points) for consecutive row ranges"""
+    for start in range(0, len(rows), _ANN_CHUNK_ROWS):
+        end = min(len(rows), start + _ANN_CHUNK_ROWS)
+        yield start, end, _sketch_rows(rows, start, end)
+
+def _ranges(starts, ends):
+    """Concatenation of arange(start, end) for each pair"""
+    lengths = ends - starts
+    offsets = np.cumsum(lengths) - lengths
+    return np.repeat(starts - offsets, lengths) + np.arange(lengths.sum())
+
+def _nearest_centroids(points, centroids):
+    nearest = np.empty(len(points), dtype=np.int32)
+    for start in range(0, len(points), 8192):
+        nearest[start:start + 8192] = np.argmax(points[start:start + 8192] @ centroids.T, axis=1)
+    return nearest
+
+class IVFIndex:
+    """Approximate search over document vectors with an inverted-file index
+    
+    Documents are clustered into ``lists`` by spherical k-means on sketches
+    (hashed random projections) of their tf-idf vectors, and stored grouped by list, so every
+    posting list is ordered by list too. A query only scores the documents of
+    the ``probes`` lists whose centroids are closest to it; their slice of each
+    posting list is found by binary search. Scores are exact cosine similarities.
+    """
+    
+    def __init__(self, centroids, order, list_offsets, postings):
+        self.centroids = centroids  # float32 (lists, ANN_DIMENSIONS), unit length
+        self.order = order  # int32 position -> document index, documents grouped by list
+        self.list_offsets = list_offsets  # int64, positions of each list
+        self.postings = postings  # SparseRows: term id -> {position: weight}, positions ascending
+    
+    @classmethod
+    def build(cls, vectors, vocabulary_size, lists=None, seed=0):
+        """Cluster the document vectors (SparseRows) into ``lists`` (default about sqrt(documents))"""
+        count = len(vectors)
+        lists = max(1, min(count, lists or min(4096, int(math.sqrt(count)))))
+        rng = np.random.default_rng(seed)
+        
+        sample = np.sort(rng.choice(count, min(count, lists * ANN_KMEANS_POINTS_PER_LIST), replace=False))
+        points = np.concatenate([
+            chunk[sample[(sample >= start) & (sample < end)] - start]
+            for start, end, chunk in _sketched_chunks(vectors)
+        ])
+        centroids = points[rng.choice(len(points), lists, replace=False)].copy()
+        for _ in range(ANN_KMEANS_ITERATIONS):
+            nearest = _nearest_centroids(points, centroids)
+            sizes = np.bincount(nearest, minlength=lists)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, nearest, points)
+            empty = sizes == 0
+            sums[empty] = points[rng.choice(len(points), int(empty.sum()))]  # Restart empty lists
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = (sums / norms).astype(np.float32)
+        
+        assignment = np.concatenate([_nearest_centroids(chunk, centroids)
+                                     for _, _, chunk in _sketched_chunks(vectors)])
+        order = np.argsort(assignment, kind='stable').astype(np.int32)
+        list_offsets = np.zeros(lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignment, minlength=lists), out=list_offsets[1:])
+        
+        # Document vectors in list order, transposed into postings over positions
+        lengths = np.diff(vectors.offsets)[order]
+        offsets = np.zeros(count + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        entries = np.repeat(vectors.offsets[:-1][order] - offsets[:-1], lengths) + np.arange(offsets[-1])
+        grouped = SparseRows(offsets, vectors.columns[entries], vectors.values[entries])
+        return cls(centroids, order, list_offsets, grouped.transpose(vocabulary_size))
+    
+    @property
+    def lists(self):
+        return len(self.centroids)
+    
+    def search(self, query_vector, top_k, probes, row_mask=None):
+        """Best (document, cosine score) pairs among the ``probes`` nearest lists"""
+        if not query_vector:
+            return []
+        buckets, signs = _sketch(np.fromiter(query_vector, dtype=np.int64, count=len(query_vector)))
+        weights = np.fromiter(query_vector.values(), dtype=np.float64, count=len(query_vector))
+        query_point = np.bincount(buckets.ravel(), weights=(signs * weights).ravel(), minlength=ANN_DIMENSIONS)
+        probes = max(1, min(probes, self.lists))
+        probed = np.argpartition(-(self.centroids @ query_point), probes - 1)[:probes]
+        starts, ends = self.list_offsets[probed], self.list_offsets[probed + 1]
+        
+        # The probed lists are laid out back to back in one scratch score array
+        sizes = ends - starts
+        shift = (np.cumsum(sizes) - sizes) - starts  # position + shift = slot, per probed list
+        scores = np.zeros(int(sizes.sum()), dtype=np.float32)
+        for term_id, query_weight in query_vector.items():  # Same order and precision as exact search
+            term_positions, weights = self.postings.row(term_id)
+            lows, highs = np.searchsorted(term_positions, starts), np.searchsorted(term_positions, ends)
+            entries = _ranges(lows, highs)
+            if len(entries):
+                scores[term_positions[entries] + np.repeat(shift, highs - lows)] += query_weight * weights[entries]
+        slots = np.flatnonzero(scores)
+        docs = self.order[_ranges(starts, ends)[slots]]
+        scores = scores[slots]
+        if row_mask is not None:
+            keep = row_mask[docs]
+            docs, scores = docs[keep], scores[keep]
+        return _best_rows(docs, scores, top_k)
+    
+    def arrays(self):
+        return {
+            'centroids': self.centroids, 'order': self.order,
+            'list_offsets': self.list_offsets, 'posting_offsets': self.postings.offsets,
+            'posting_positions': self.postings.columns, 'posting_weights': self.postings.values
+        }
+    
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(arrays['centroids'], arrays['order'], arrays['list_offsets'],
+                   SparseRows(arrays['posting_offsets'], arrays['posting_positions'], arrays['posting_weights']))
+
+class CategoryShards:
+    """The documents of each category as a shard of contiguous rows, with a query router
+    
+    Needs an index whose documents are ordered by category, as
+    build_knowledge_base makes them. The router scores shards by the cosine
+    similarity of the query with each shard's centroid, the normalised sum of
+    its document vectors; a shard sharing no term with the query scores 0 and
+    cannot hold a match.
+    """
+    
+    def __init__(self, starts, ends, router):
+        self.starts = starts  # int64 first row, per category code
+        self.ends = ends  # int64 row after the last
+        self.router = router  # SparseRows: term id -> {shard: centroid weight}
+    
+    @classmethod
+    def from_index(cls, documents, vectors, vocabulary_size):
+        """Shards of a built index, or None if its documents are not ordered by category"""
+        codes = documents.category_codes
+        if len(codes) == 0 or np.any(codes[1:] < codes[:-1]):
+            return None
+        bounds = np.searchsorted(codes, np.arange(len(documents.categories) + 1))
+        offsets, columns, values = [0], [], []
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            lo, hi = vectors.offsets[start], vectors.offsets[end]
+            centroid = np.bincount(vectors.columns[lo:hi], weights=vectors.values[lo:hi], minlength=vocabulary_size)
+            terms = np.flatnonzero(centroid)
+            weights = centroid[terms]
+            columns.append(terms.astype(np.int32))
+            values.append((weights / (np.linalg.norm(weights) or 1.0)).astype(np.float32))
+            offsets.append(offsets[-1] + len(terms))
+        centroids = SparseRows(np.array(offsets, dtype=np.int64), np.concatenate(columns), np.concatenate(values))
+        return cls(bounds[:-1].astype(np.int64), bounds[1:].astype(np.int64), centroids.transpose(vocabulary_size))
+    
+    def __len__(self):
+        return len(self.starts)
+    
+    def route(self, query_vector, limit=None):
+        """Shards to search for a query, best first; at most ``limit`` of them (None for all)"""
+        scores = np.zeros(len(self), dtype=np.float32)
+        for term_id, query_weight in query_vector.items():
+            shards, weights = self.router.row(term_id)
+            scores[shards] += query_weight * weights
+        ranked = [shard for shard, _ in _best_rows(np.arange(len(self)), scores, len(self))]
+        return ranked[:limit] if limit else ranked
+    
+    def row_range(self, shard):
+        return int(self.starts[shard]), int(self.ends[shard])
+
+class KnowledgeBaseIndex:
+    """One built index; never modified once SimpleRAGSystem has published it
+    
+    A query reads the published instance once and uses only that, so a new
+    index goes live with one reference assignment while queries still running
+    finish on the old one, which is freed when the last of them lets go.
+    """
+    
+    def __init__(self, documents, vocabulary, idf, document_vectors, postings, ann_index=None, shards=None, version=0):
+        self.documents = documents  # DocumentTable
+        self.vocabulary = vocabulary  # TermTable: term id -> term, sorted
+        self.idf = idf  # term id -> inverse document frequency
+        self.document_vectors = document_vectors  # SparseRows: document -> {term id: L2-normalised tf-idf weight}
+        self.postings = postings  # SparseRows: term id -> {document index: weight}
+        self.ann_index = ann_index  # IVFIndex when built
+        self.shards = shards  # CategoryShards of an index ordered by category
+        self.version = version  # Position in the sequence of indexes published by a SimpleRAGSystem
+    
+    @classmethod
+    def empty(cls, version=0):
+        return cls(DocumentTable.from_documents([]), TermTable.from_strings([]), np.zeros(0, dtype=np.float32),
+                   None, None, version=version)
+    
+    def __len__(self):
+        return len(self.documents)
+    
+    def validate(self):
+        """Raise ValueError unless the parts of the index fit together"""
+        if not len(self.documents):
+            return
+        documents, terms = len(self.documents), len(self.vocabulary)
+        vectors, postings = self.document_vectors, self.postings
+        problems = []
+        if len(vectors) != documents:
+            problems.append(f"{len(vectors)} document vectors for {documents} documents")
+        if len(postings) != terms or len(self.idf) != terms:
+            problems.append(f"{len(postings)} posting lists and {len(self.idf)} idf weights for {terms} terms")
+        for name, rows, column_count in (('document vectors', vectors, terms), ('postings', postings, documents)):
+            if not len(rows.columns) == len(rows.values) == rows.offsets[-1]:
+                problems.append(f"{name} offsets do not match their entries")
+            elif len(rows.columns) and not 0 <= rows.columns.min() <= rows.columns.max() < column_count:
+                problems.append(f"{name} refer past the last {'term' if column_count == terms else 'document'}")
+        if len(vectors.columns) != len(postings.columns):
+            problems.append("postings are not the transpose of the document vectors")
+        if self.documents.category_codes.max() >= len(self.documents.categories):
+            problems.append("unknown category codes")
+        if self.ann_index is not None and len(self.ann_index.order) != documents:
+            problems.append(f"ANN index covers {len(self.ann_index.order)} of {documents} documents")
+        if self.shards is not None and self.shards.ends[-1] != documents:
+            problems.append(f"category shards cover {self.shards.ends[-1]} of {documents} documents")
+        if problems:
+            raise ValueError(f"Invalid knowledge base index: {'; '.join(problems)}")
 
 class SimpleRAGSystem:
-    def __init__(self, data_manager):
+    def __init__(self, data_manager, cache=None, retrieval_mode='auto', ann_lists=None, ann_probes=None,
+                 shard_probes=2, shard_threads=1):
         self.data_manager = data_manager
+        self.cache = cache  # Optional VersionedLRUCache for generate_context_prompt
+        self.retrieval_mode = retrieval_mode  # 'exact', 'ann', or 'auto' (ANN from ANN_MIN_DOCUMENTS)
+        self.ann_lists = ann_lists  # IVF lists built; None for about sqrt(documents)
+        self.ann_probes = ann_probes  # Lists searched per query, more is slower with higher recall; None for ANN_PROBE_FRACTION
+        self.shard_probes = shard_probes  # Category shards the router picks per query; 0 or None searches all
+        self.shard_threads = shard_threads  # Threads searching several shards at once; 1 searches them in turn
+        self._shard_pool = None  # Created on first use, so a preloading server forks no threads
+        self._shard_pool_lock = threading.Lock()  # Only taken until the pool exists
+        self._publish_lock = threading.Lock()  # Orders publishers only; queries never take it
+        self._index = KnowledgeBaseIndex.empty()  # Replaced whole, never changed in place
+    
+    # The published index; each read may see a newer one, so a query reads .index once
+    index = property(lambda self: self._index)
+    documents = property(lambda self: self._index.documents)
+    vocabulary = property(lambda self: self._index.vocabulary)
+    idf = property(lambda self: self._index.idf)
+    document_vectors = property(lambda self: self._index.document_vectors)
+    postings = property(lambda self: self._index.postings)
+    ann_index = property(lambda self: self._index.ann_index)
+    shards = property(lambda self: self._index.shards)
+    index_version = property(lambda self: self._index.version)
+    is_trained = property(lambda self: len(self._index) > 0)
+    
+    def build_knowledge_base(self, progress=None, workers=None):
+        """Build the TF-IDF index over all documents in the data manager
+        
+        The index is built aside and published when complete; queries keep
+        using the current one until then. Documents are indexed in category
+        order, so each category is a shard of contiguous rows. Corpora of
+        PARALLEL_BUILD_MIN_DOCUMENTS or more are tokenized in ``workers``
+        processes (default: all cores). An IVF index is added for approximate
+        search unless retrieval_mode rules it out. ``progress``, if given, is
+        called with the fraction done (0.0-1.0).
+        """
+        documents = sorted(self.data_manager.get_documents(), key=lambda doc: doc.category)
+        if not documents:
+            print("No documents found. Please add documents to the knowledge base first.")
+            self.clear()
+            return
+        
+        progress = progress or (lambda fraction: None)
+        workers = workers or os.cpu_count() or 1
+        texts = [f"{doc.title} {doc.content}" for doc in documents]
+        if workers > 1 and len(texts) >= PARALLEL_BUILD_MIN_DOCUMENTS:
+            vocabulary, idf, vectors, postings = _build_index_parallel(texts, workers, progress)
+        else:
+            vocabulary, idf, vectors, postings = _build_index(texts, progress)
+        del texts
+        
+        ann_index = None
+        if self.uses_ann(len(documents)):
+            ann_index = IVFIndex.build(vectors, len(vocabulary), self.ann_lists)
+        
+        self.load_index_state({
+            'documents': DocumentTable.from_documents(documents),
+            'vocabulary': vocabulary,
+            'idf': idf,
+            'document_vectors': vectors,
+            'postings': postings,
+            'ann_index': ann_index
+        })
+        progress(1.0)
+        print(f"Knowledge base built with {len(documents)} documents")
+    
+    def uses_ann(self, document_count):
+        """Whether an index of this many documents gets approximate search"""
+        if self.retrieval_mode == 'ann':
+            return True
+        return self.retrieval_mode == 'auto' and document_count >= ANN_MIN_DOCUMENTS
+    
+    def index_state(self):
+        """The built index as plain data, e.g. to hand over from a job process"""
+        index = self._index
+        return {
+            'documents': index.documents,
+            'vocabulary': index.vocabulary,
+            'idf': index.idf,
+            'document_vectors': index.document_vectors,
+            'postings': index.postings,
+            'ann_index': index.ann_index,
+            'shards': index.shards
+        }
+    
+    def load_index_state(self, state):
+        """Validate and publish an index produced by index_state()
+        
+        Category shards are derived unless the state has a 'shards' entry
+        (None for an unsharded index). Raises ValueError, leaving the current
+        index in place, if the parts do not fit together.
+        """
+        shards = state.get('shards')
+        if 'shards' not in state and len(state['documents']):
+            shards = CategoryShards.from_index(state['documents'], state['document_vectors'], len(state['vocabulary']))
+        index = KnowledgeBaseIndex(state['documents'], state['vocabulary'], state['idf'], state['document_vectors'],
+                                   state['postings'], state.get('ann_index'), shards)
+        index.validate()
+        self._publish(index)
+    
+    def clear(self):
+        """Publish an empty index"""
+        self._publish(KnowledgeBaseIndex.empty())
+    
+    def _publish(self, index):
+        with self._publish_lock:
+            index.version = self._index.version + 1  # Cached retrieval results of older indexes are now stale
+            self._index = index
+    
+    def index_arrays(self):
+        """The built index as a flat {name: array} mapping (see load_index_arrays)"""
+        index = self._index
+        docs = index.documents
+        arrays = {
+            'title_arena': docs.titles.arena, 'title_offsets': docs.titles.offsets,
+            'content_arena': docs.contents.arena, 'content_offsets': docs.contents.offsets,
+            'category_arena': docs.categories.arena, 'category_offsets': docs.categories.offsets,
+            'category_codes': docs.category_codes,
+            'term_arena': index.vocabulary.arena, 'term_offsets': index.vocabulary.offsets,
+            'idf': index.idf,
+            'vector_offsets': index.document_vectors.offsets, 'vector_terms': index.document_vectors.columns,
+            'vector_weights': index.document_vectors.values,
+            'posting_offsets': index.postings.offsets, 'posting_docs': index.postings.columns,
+            'posting_weights': index.postings.values
+        }
+        if index.ann_index is not None:
+            arrays.update({f"ann_{name}": array for name, array in index.ann_index.arrays().items()})
+        return arrays
+    
+    def load_index_arrays(self, arrays):
+        """Install an index from index_arrays() output; the arrays are used as they are, not copied"""
+        self.load_index_state({
+            'documents': DocumentTable(
+                StringTable(arrays['title_arena'], arrays['title_offsets']),
+                StringTable(arrays['content_arena'], arrays['content_offsets']),
+                StringTable(arrays['category_arena'], arrays['category_offsets']),
+                arrays['category_codes']
+            ),
+            'vocabulary': TermTable(arrays['term_arena'], arrays['term_offsets']),
+            'idf': arrays['idf'],
+            'document_vectors': SparseRows(arrays['vector_offsets'], arrays['vector_terms'], arrays['vector_weights']),
+            'postings': SparseRows(arrays['posting_offsets'], arrays['posting_docs'], arrays['posting_weights']),
+            'ann_index': IVFIndex.from_arrays({name[4:]: array for name, array in arrays.items()
+                                               if name.startswith('ann_')}) if 'ann_order' in arrays else None
+        })
+    
+    def save_index(self, path):
+        """Write the built index to an uncompressed .npz file"""
+        np.savez(path, **self.index_arrays())
+    
+    def load_index(self, path):
+        """Load an index written by save_index(); each array is one contiguous buffer"""
+        with np.load(path) as data:
+            self.load_index_arrays({name: data[name] for name in data.files})
+    
+    def _ranked_doc_ids(self, query, top_k, category=None, index=None):
+        index = index or self._index
+        query_vector = _query_vector(query, index.vocabulary, index.idf)
+        if index.ann_index is not None and self.retrieval_mode != 'exact':
+            row_mask = index.documents.category_mask(category) if category else None
+            probes = self.ann_probes or math.ceil(index.ann_index.lists * ANN_PROBE_FRACTION)
+            matches = index.ann_index.search(query_vector, top_k, probes, row_mask)
+        elif index.shards is not None:
+            if category:
+                code = index.documents.category_code(category)
+                shards = [] if code is None else [code]
+            else:
+                shards = index.shards.route(query_vector, self.shard_probes)
+            matches = self._search_shards(index, query_vector, shards, top_k)
+        else:
+            row_mask = index.documents.category_mask(category) if category else None
+            matches = _top_matches(query_vector, index.postings, len(index), top_k, row_mask)
+        return [doc_index for doc_index, _ in matches]
+    
+    def _get_shard_pool(self):
+        pool = self._shard_pool
+        if pool is None:
+            with self._shard_pool_lock:
+                # Concurrent first queries must not each start (and leak) a pool
+                if self._shard_pool is None:
+                    self._shard_pool = ThreadPoolExecutor(self.shard_threads, thread_name_prefix='rag-shard')
+                pool = self._shard_pool
+        return pool
+    
+    def _search_shards(self, index, query_vector, shards, top_k):
+        """Top matches over the given shards, merged as if they were searched together"""
+        def search(shard):
+            return _top_matches(query_vector, index.postings, len(index), top_k, row_range=index.shards.row_range(shard))
+        
+        if self.shard_threads > 1 and len(shards) > 1:
+            results = list(self._get_shard_pool().map(search, shards))
+        else:
+            results = [search(shard) for shard in shards]
+        matches = [match for result in results for match in result]
+        if len(results) < 2:
+            return matches
+        rows = np.array([row for row, _ in matches], dtype=np.int64)
+        scores = np.array([score for _, score in matches], dtype=np.float32)
+        return _best_rows(rows, scores, top_k)
+    
+    def retrieve_relevant_docs(self, query, top_k=3, category=None):
+        """Return up to top_k documents ranked by cosine similarity to the query"""
+        index = self._index
+        if not len(index):
+            return []
+        return [index.documents[doc_index] for doc_index in self._ranked_doc_ids(query, top_k, category, index)]
+    
+    def generate_context_prompt(self, query, max_context_length=1000, top_k=3, category=None):
+        """Prepend relevant knowledge base passages to the user query
+        
+        With a cache, the ranked document ids and packed context are reused for
+        queries with the same terms until the index changes.
+        """
+        index = self._index  # Ids, passages and cache version all come from this one index
+        if not len(index):
+            return query
+        key = (' '.join(sorted(tokenize(query))), top_k, category, max_context_length)
+        cached = self.cache.get(key, index.version) if self.cache is not None else None
+        if cached is None:
+            doc_ids = self._ranked_doc_ids(query, top_k, category, index)
+            context_parts = []
+            remaining = max_context_length
+            for doc_index in doc_ids:
+                doc = index.documents[doc_index]
+                passage = f"[{doc.title}]\n{doc.content}"[:remaining]
+                context_parts.append(passage)
+                remaining -= len(passage)
+                if remaining <= 0:
+                    break
+            cached = (tuple(doc_ids), "\n\n".join(context_parts))
+            if self.cache is not None:
+                self.cache.put(key, index.version, cached)
+        
+        doc_ids, context = cached
+        if not doc_ids:
+            return query
+        return f"Relevant information from the knowledge base:\n{context}\n\nUser question: {query}"
     
     def retrieve(self, query, limit=5):
         # Simple keyword-based retrieval
@@ -87,6 +1033,59 @@ class SimpleRAGSystem:
         
         return "I'm not sure about that. Could you please rephrase your question?"
 
+class ExampleMatcher:
+    """Finds the training example whose input best matches a query
+    
+    A TF-IDF index over TrainingExample.input_text, rebuilt on the next match
+    after the data manager's examples changed. A score is the lower of the
+    cosine similarity of query and input and their coverage (see
+    _match_coverage), so 1.0 means the same words. Cosine alone ignores stop
+    words and extra query terms: a bare keyword or a narrower question
+    ("... in children?") would score like the question itself.
+    """
+    
+    def __init__(self, data_manager):
+        self.data_manager = data_manager
+        self._lock = threading.Lock()
+        self._index = None  # (examples, vocabulary, idf, postings) as of the last build
+    
+    def _current_index(self):
+        examples = self.data_manager.get_examples()  # The same view until examples change
+        index = self._index
+        if index is None or index[0] is not examples:
+            with self._lock:
+                index = self._index
+                if index is None or index[0] is not examples:
+                    if examples:
+                        vocabulary, idf, _, postings = _build_index([ex.input_text for ex in examples], lambda fraction: None)
+                    else:
+                        vocabulary, idf, postings = TermTable.from_strings([]), np.zeros(0, dtype=np.float32), None
+                    index = self._index = (examples, vocabulary, idf, postings)
+        return index
+    
+    def match(self, query):
+        """Best matching example and its score, or (None, 0.0)"""
+        examples, vocabulary, idf, postings = self._current_index()
+        if not examples:
+            return None, 0.0
+        matches = _top_matches(_query_vector(query, vocabulary, idf), postings, len(examples), 5)
+        best, best_score = None, 0.0
+        for example_index, similarity in matches:
+            score = min(similarity, 1.0, _match_coverage(query, examples[example_index].input_text))
+            if score > best_score:
+                best, best_score = examples[example_index], score
+        return best, best_score
+
+def _match_coverage(query, input_text):
+    """Lower of two shares: the query's content terms found in the input, and the
+    input's words (stop words included) found in the query"""
+    query_terms = set(tokenize(query))
+    input_words = set(_TOKEN_RE.findall(input_text.lower()))
+    if not query_terms or not input_words:
+        return 0.0
+    query_words = set(_TOKEN_RE.findall(query.lower()))
+    return min(len(query_terms & input_words) / len(query_terms), len(input_words & query_words) / len(input_words))
+
 class FinetuningDataPrep:
     def __init__(self):
         pass